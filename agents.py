@@ -1,19 +1,139 @@
 # SAPG Agents - Draft, Critique, and Revision agents
 
-from langchain_core.prompts import PromptTemplate
+import asyncio
+import difflib
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from typing import Dict, Any
+from typing import Callable, Dict, Any, AsyncIterator, Iterator, List, Optional
+
+from cache import ResponseCache, describe_llm, make_key
+from compaction import PromptCompactor, approx_tokens
+from metrics import MetricsRegistry, PhaseMetricsHandler
+from pipeline import ProviderLimits, RunProgress, run_pipelined, run_sap
+from protocol import PROTOCOL_VERSION
+from resilience import PhaseFailed, RetryPolicy, RunCancelled
+from semantic_cache import SemanticCache
+from singleflight import SingleFlight
+from verdict import (VERDICT_INSTRUCTIONS, Verdict, VerdictParser, merge_verdicts,
+                     render_verdict)
+
+# threads for the configured model's speculative drafts, shared by every agent
+SLOW_DRAFTS = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sapg-slow-draft")
+
+# the protocol's audit checklist, split between focused critics
+CRITIC_FOCUSES = {
+    "logic": ("Logic errors or contradictions", "Infinite loops or loops without an exit",
+              "Requirements the draft does not address"),
+    "security": ("Security issues (injection, XSS, leaked secrets)",
+                 "Sensitive or personal data handled carelessly"),
+    "robustness": ("Missing error handling for failure modes",
+                   "Edge cases: nulls, empty inputs, boundaries"),
+    "quality": ("Unnecessary or slow operations", "Unclear, hard-to-maintain steps"),
+}
+
+
+def protocol_message(protocol_template: str, cache_marker: bool = False) -> SystemMessage:
+    """System block with the protocol, identical for every phase
+
+    Keeping it first and byte-identical lets Ollama's KV cache and the
+    OpenAI/Anthropic prompt caches reuse it across the three phases.
+    cache_marker adds Anthropic's explicit cache_control breakpoint.
+    """
+    text = f"PROTOCOL: {protocol_template}"
+    if cache_marker:
+        return SystemMessage(content=[
+            {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}])
+    return SystemMessage(content=text)
 
 
 class Agent:
     """Base class for all agents"""
 
-    def __init__(self, llm, name: str):
+    phase = "agent"
+
+    def __init__(self, llm, name: str, cache: Optional[ResponseCache] = None):
+        self.cache = cache
+        self.compactor: Optional[PromptCompactor] = None
+        self.metrics: Optional[MetricsRegistry] = None
+        self.retry: Optional[RetryPolicy] = None
+        self.flights: Optional[SingleFlight] = None
+        self._template = None
+        self._chain = None
+        self._llm = None
+        self._protocol_template = None
+        self._prompt_caching = False
         self.llm = llm
         self.name = name
 
-    def get_chain(self, template: PromptTemplate):
+    @property
+    def llm(self):
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        if llm is self._llm:
+            return
+        self._llm = llm
+        self.invalidate()
+
+    @property
+    def protocol_template(self):
+        return self._protocol_template
+
+    @protocol_template.setter
+    def protocol_template(self, protocol_template):
+        if protocol_template == self._protocol_template:
+            return
+        self._protocol_template = protocol_template
+        self.invalidate()
+
+    @property
+    def prompt_caching(self) -> bool:
+        """Whether to mark the protocol block for provider prompt caching"""
+        return self._prompt_caching
+
+    @prompt_caching.setter
+    def prompt_caching(self, enabled: bool):
+        if enabled == self._prompt_caching:
+            return
+        self._prompt_caching = enabled
+        self.invalidate()
+
+    def system_message(self) -> SystemMessage:
+        return protocol_message(self.protocol_template, self.prompt_caching)
+
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        raise NotImplementedError
+
+    @property
+    def template(self) -> ChatPromptTemplate:
+        """Prompt template, built on first use"""
+        if self._template is None:
+            self._template = self.create_prompt_template()
+        return self._template
+
+    @property
+    def chain(self):
+        """Compiled chain, built on first use and reused afterwards"""
+        if self._chain is None:
+            self._chain = self.get_chain(self.template)
+        return self._chain
+
+    def invalidate(self):
+        """Drop the cached template and chain so the next call rebuilds them
+
+        The setters only call this when a value actually changes, so
+        parents can push their settings to sub-agents before every call.
+        """
+        self._template = None
+        self._chain = None
+
+    def get_chain(self, template: ChatPromptTemplate):
         # build the chain for processing
         return (
             RunnablePassthrough()
@@ -22,47 +142,450 @@ class Agent:
             | StrOutputParser()
         )
 
+    def prepare(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Shrink the inputs to the compactor's token budget, if one is set"""
+        if self.compactor is None:
+            return inputs
+        empty_prompt = self.template.format(**{key: "" for key in inputs})
+        return self.compactor.compact(self.phase, inputs, self.compactor.count(empty_prompt),
+                                      self.metrics)
+
+    def cache_key(self, inputs: Dict[str, Any]) -> str:
+        """Key for the rendered prompt of this phase on this llm"""
+        provider, model, temperature, limits = describe_llm(self.llm)
+        prompt = self.template.format(**inputs)
+        return make_key(provider, model, temperature, self.name, prompt, PROTOCOL_VERSION,
+                        limits)
+
+    def run_config(self, **config) -> Dict[str, Any]:
+        """Runnable config for one call, with the metrics callback attached"""
+        if self.metrics is not None:
+            config["callbacks"] = [PhaseMetricsHandler(self.metrics, self.phase)]
+        return config
+
+    def _count_retry(self, error: BaseException):
+        if self.metrics is not None:
+            self.metrics.increment(self.phase, "retries")
+
+    def _count_coalesced(self):
+        if self.metrics is not None:
+            self.metrics.increment(self.phase, "coalesced")
+
+    def _call(self, fn):
+        # run one llm call under the retry policy, if there is one
+        if self.retry is None:
+            return fn()
+        return self.retry.call(fn, describe_llm(self.llm)[0], self._count_retry)
+
+    async def _acall(self, fn):
+        if self.retry is None:
+            return await fn()
+        return await self.retry.acall(fn, describe_llm(self.llm)[0], self._count_retry)
+
+    def _batch(self, inputs_list: List[Dict[str, Any]], max_concurrency: Optional[int]):
+        def run(batch):
+            return self.chain.batch(
+                batch, config=[self.run_config(max_concurrency=max_concurrency) for _ in batch],
+                return_exceptions=True)
+        if self.retry is None:
+            return run(inputs_list)
+        return self.retry.call_batch(run, inputs_list, describe_llm(self.llm)[0],
+                                     self._count_retry)
+
+    async def _abatch(self, inputs_list: List[Dict[str, Any]], max_concurrency: Optional[int]):
+        async def run(batch):
+            return await self.chain.abatch(
+                batch, config=[self.run_config(max_concurrency=max_concurrency) for _ in batch],
+                return_exceptions=True)
+        if self.retry is None:
+            return await run(inputs_list)
+        return await self.retry.acall_batch(run, inputs_list, describe_llm(self.llm)[0],
+                                            self._count_retry)
+
+    def _lookup(self, inputs: Dict[str, Any]):
+        # compact the inputs and check the cache: (inputs, key, cached output)
+        inputs = self.prepare(inputs)
+        key = self.cache_key(inputs) if self.cache is not None or self.flights is not None else None
+        output = self.cache.get(key) if self.cache is not None else None
+        if output is not None and self.metrics is not None:
+            self.metrics.increment(self.phase, "cache_hits")
+        return inputs, key, output
+
+    def _store(self, key: Optional[str], output: Any):
+        if self.cache is not None and not isinstance(output, Exception):
+            self.cache.set(key, output)
+
+    def invoke(self, inputs: Dict[str, Any]) -> str:
+        inputs, key, output = self._lookup(inputs)
+        if output is not None:
+            return output
+
+        def run():
+            output = self._call(lambda: self.chain.invoke(inputs, config=self.run_config()))
+            self._store(key, output)
+            return output
+
+        if self.flights is None:
+            return run()
+        # an identical prompt already running (e.g. from another session) is joined
+        return self.flights.call(key, run, self._count_coalesced)
+
+    def stream(self, inputs: Dict[str, Any]) -> Iterator[str]:
+        # yield text chunks as the llm produces them
+        inputs, key, output = self._lookup(inputs)
+        if output is not None:
+            yield output
+            return
+        if self.flights is None:
+            yield from self._stream_llm(inputs, key)
+        else:
+            yield from self.flights.stream(
+                key, lambda: self._stream_llm(inputs, key), self._count_coalesced)
+
+    def _stream_llm(self, inputs: Dict[str, Any], key: Optional[str]) -> Iterator[str]:
+        def start():
+            # retries only cover the wait for the first chunk; once text
+            # has been shown a failure is final
+            chunks = iter(self.chain.stream(inputs, config=self.run_config()))
+            return chunks, next(chunks, None)
+
+        chunks, first = self._call(start)
+        if first is None:
+            self._store(key, "")
+            return
+        parts = [first]
+        yield first
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self._store(key, "".join(parts))
+
+    def invoke_many(self, inputs_list: List[Dict[str, Any]],
+                    max_concurrency: Optional[int] = None) -> List[Any]:
+        """Run a wave of prompts with chain.batch, keeping input order
+
+        A failed item comes back as its exception instead of aborting
+        the rest of the wave.
+        """
+        lookups = [self._lookup(inputs) for inputs in inputs_list]
+        todo = [index for index, (_, _, output) in enumerate(lookups) if output is None]
+        outputs = [output for _, _, output in lookups]
+        if todo:
+            results = self._batch([lookups[index][0] for index in todo], max_concurrency)
+            for index, result in zip(todo, results):
+                outputs[index] = result
+                self._store(lookups[index][1], result)
+        return outputs
+
+    async def ainvoke_many(self, inputs_list: List[Dict[str, Any]],
+                           max_concurrency: Optional[int] = None) -> List[Any]:
+        """Async version of invoke_many using chain.abatch"""
+        lookups = [self._lookup(inputs) for inputs in inputs_list]
+        todo = [index for index, (_, _, output) in enumerate(lookups) if output is None]
+        outputs = [output for _, _, output in lookups]
+        if todo:
+            results = await self._abatch([lookups[index][0] for index in todo], max_concurrency)
+            for index, result in zip(todo, results):
+                outputs[index] = result
+                self._store(lookups[index][1], result)
+        return outputs
+
+    async def ainvoke(self, inputs: Dict[str, Any]) -> str:
+        inputs, key, output = self._lookup(inputs)
+        if output is not None:
+            return output
+
+        async def run():
+            output = await self._acall(
+                lambda: self.chain.ainvoke(inputs, config=self.run_config()))
+            self._store(key, output)
+            return output
+
+        if self.flights is None:
+            return await run()
+        return await self.flights.acall(key, run, self._count_coalesced)
+
+    async def astream(self, inputs: Dict[str, Any]) -> AsyncIterator[str]:
+        inputs, key, output = self._lookup(inputs)
+        if output is not None:
+            yield output
+            return
+        if self.flights is None:
+            chunks = self._astream_llm(inputs, key)
+        else:
+            chunks = self.flights.astream(
+                key, lambda: self._astream_llm(inputs, key), self._count_coalesced)
+        async for chunk in chunks:
+            yield chunk
+
+    async def _astream_llm(self, inputs: Dict[str, Any],
+                           key: Optional[str]) -> AsyncIterator[str]:
+        async def start():
+            chunks = self.chain.astream(inputs, config=self.run_config()).__aiter__()
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+
+        chunks, first = await self._acall(start)
+        if first is None:
+            self._store(key, "")
+            return
+        parts = [first]
+        yield first
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self._store(key, "".join(parts))
+
 
 class DraftAgent(Agent):
     """Generates the initial draft/solution"""
 
-    def __init__(self, llm, protocol_template: str):
-        super().__init__(llm, "Draft Agent")
-        self.protocol_template = protocol_template
+    phase = "draft"
 
-    def create_prompt_template(self) -> PromptTemplate:
-        return PromptTemplate(
-            input_variables=["user_request"],
-            template=f"""You are {self.name}.
+    def __init__(self, llm, protocol_template: str, cache: Optional[ResponseCache] = None):
+        super().__init__(llm, "Draft Agent", cache)
+        self.protocol_template = protocol_template
+        self.semantic_cache: Optional[SemanticCache] = None
+        self.semantic_threshold: Optional[float] = None  # None = the cache's own
 
-PROTOCOL: {self.protocol_template}
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            self.system_message(),
+            ("human", f"""You are {self.name}.
 
 TASK:
 {{user_request}}
 
-Provide a concise, step-by-step plan. Be specific and actionable.""",
-        )
+Provide a concise, step-by-step plan. Be specific and actionable."""),
+        ])
+
+    def semantic_scope(self) -> str:
+        """Drafts are only reused for the same llm, settings and protocol"""
+        provider, model, temperature, limits = describe_llm(self.llm)
+        return make_key(provider, model, temperature, self.name,
+                        self.protocol_template, PROTOCOL_VERSION, limits)
+
+    def _similar_draft(self, user_request: str) -> Optional[str]:
+        # a stored draft for a request worded like this one, if any
+        if self.semantic_cache is None:
+            return None
+        match = self.semantic_cache.get(user_request, self.semantic_scope(),
+                                        self.semantic_threshold)
+        if match is None:
+            return None
+        if self.metrics is not None:
+            self.metrics.increment(self.phase, "semantic_hits")
+        return match["value"]
+
+    def _remember_draft(self, user_request: str, draft: str):
+        if self.semantic_cache is not None and draft:
+            self.semantic_cache.set(user_request, draft, self.semantic_scope())
 
     def generate(self, user_request: str) -> str:
         """Generate the initial draft"""
-        template = self.create_prompt_template()
-        chain = self.get_chain(template)
-        return chain.invoke({"user_request": user_request})
+        draft = self._similar_draft(user_request)
+        if draft is None:
+            draft = self.invoke({"user_request": user_request})
+            self._remember_draft(user_request, draft)
+        return draft
+
+    async def agenerate(self, user_request: str) -> str:
+        """Generate the initial draft without blocking the event loop"""
+        draft = self._similar_draft(user_request)
+        if draft is None:
+            draft = await self.ainvoke({"user_request": user_request})
+            self._remember_draft(user_request, draft)
+        return draft
+
+    def generate_many(self, user_requests: List[str],
+                      max_concurrency: Optional[int] = None) -> List[Any]:
+        """Draft every request in one concurrent wave"""
+        drafts = [self._similar_draft(request) for request in user_requests]
+        todo = [index for index, draft in enumerate(drafts) if draft is None]
+        if todo:
+            results = self.invoke_many(
+                [{"user_request": user_requests[index]} for index in todo], max_concurrency)
+            for index, draft in zip(todo, results):
+                drafts[index] = draft
+                if not isinstance(draft, Exception):
+                    self._remember_draft(user_requests[index], draft)
+        return drafts
+
+    def generate_stream(self, user_request: str) -> Iterator[str]:
+        """Stream the initial draft as it is generated"""
+        draft = self._similar_draft(user_request)
+        if draft is not None:
+            yield draft
+            return
+        parts = []
+        for chunk in self.stream({"user_request": user_request}):
+            parts.append(chunk)
+            yield chunk
+        self._remember_draft(user_request, "".join(parts))
+
+    async def agenerate_stream(self, user_request: str) -> AsyncIterator[str]:
+        """Stream the initial draft without blocking the event loop"""
+        draft = self._similar_draft(user_request)
+        if draft is not None:
+            yield draft
+            return
+        parts = []
+        async for chunk in self.astream({"user_request": user_request}):
+            parts.append(chunk)
+            yield chunk
+        self._remember_draft(user_request, "".join(parts))
+
+
+class SpeculativeDraftAgent(DraftAgent):
+    """Races a fast model's draft against the configured model's
+
+    The fast draft streams to the caller right away. The configured
+    model's draft replaces it if it finishes within `deadline` seconds of
+    the start (None waits for it), unless accept_fast(user_request,
+    fast_draft) approves the fast draft first. A slow draft that loses
+    still finishes in the background and lands in the response cache.
+    """
+
+    def __init__(self, llm, fast_llm, protocol_template: str,
+                 cache: Optional[ResponseCache] = None, deadline: Optional[float] = None,
+                 accept_fast: Optional[Callable[[str, str], bool]] = None):
+        super().__init__(llm, protocol_template, cache)
+        self.fast_agent = DraftAgent(fast_llm, protocol_template, cache)
+        self.fast_agent.phase = "draft_fast"
+        self.deadline = deadline
+        self.accept_fast = accept_fast
+
+    def _sync_fast_agent(self) -> DraftAgent:
+        self.fast_agent.retry = self.retry
+        self.fast_agent.flights = self.flights
+        self.fast_agent.compactor = self.compactor
+        self.fast_agent.metrics = self.metrics
+        self.fast_agent.prompt_caching = self.prompt_caching
+        return self.fast_agent
+
+    def _record(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if self.metrics is not None:
+            self.metrics.increment(self.phase, f"speculative_{result['source']}")
+        return result
+
+    def _remaining(self, started: float) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - (time.perf_counter() - started), 0)
+
+    def race(self, user_request: str,
+             on_fast_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Draft with both models and pick one
+
+        Returns the chosen "draft", its "source" (fast/slow, or semantic
+        for a reused draft), the "reason" and both drafts' timings.
+        on_fast_token is called, in this thread, with every token of the
+        fast draft.
+        """
+        inputs = {"user_request": user_request}
+        started = time.perf_counter()
+        result = {"fast_draft": None, "fast_seconds": None, "slow_seconds": None}
+        similar = self._similar_draft(user_request)
+        if similar is not None:
+            return self._record(dict(result, draft=similar, source="semantic", reason="similar"))
+
+        def slow_draft():
+            # only the configured model's drafts are worth reusing
+            draft = self.invoke(inputs)
+            self._remember_draft(user_request, draft)
+            return draft, time.perf_counter() - started
+
+        slow = SLOW_DRAFTS.submit(slow_draft)
+
+        try:
+            parts = []
+            for chunk in self._sync_fast_agent().stream(inputs):
+                parts.append(chunk)
+                if on_fast_token:
+                    on_fast_token(chunk)
+            fast = "".join(parts)
+            result.update(fast_draft=fast, fast_seconds=time.perf_counter() - started)
+        except Exception:
+            draft, result["slow_seconds"] = slow.result()
+            return self._record(dict(result, draft=draft, source="slow", reason="fast_failed"))
+
+        if self.accept_fast is not None and self.accept_fast(user_request, fast):
+            return self._record(dict(result, draft=fast, source="fast", reason="accepted"))
+
+        try:
+            draft, result["slow_seconds"] = slow.result(timeout=self._remaining(started))
+        except FutureTimeout:
+            return self._record(dict(result, draft=fast, source="fast", reason="deadline"))
+        except Exception:
+            return self._record(dict(result, draft=fast, source="fast", reason="slow_failed"))
+        return self._record(dict(result, draft=draft, source="slow", reason="finished"))
+
+    def generate(self, user_request: str) -> str:
+        """Race both models and return the chosen draft"""
+        return self.race(user_request)["draft"]
+
+    async def arace(self, user_request: str) -> Dict[str, Any]:
+        """Async version of race, without the fast draft's tokens"""
+        inputs = {"user_request": user_request}
+        started = time.perf_counter()
+        result = {"fast_draft": None, "fast_seconds": None, "slow_seconds": None}
+        similar = self._similar_draft(user_request)
+        if similar is not None:
+            return self._record(dict(result, draft=similar, source="semantic", reason="similar"))
+
+        async def slow_draft():
+            draft = await self.ainvoke(inputs)
+            self._remember_draft(user_request, draft)
+            return draft, time.perf_counter() - started
+
+        slow = asyncio.ensure_future(slow_draft())
+        try:
+            fast = await self._sync_fast_agent().ainvoke(inputs)
+            result.update(fast_draft=fast, fast_seconds=time.perf_counter() - started)
+        except Exception:
+            draft, result["slow_seconds"] = await slow
+            return self._record(dict(result, draft=draft, source="slow", reason="fast_failed"))
+
+        if self.accept_fast is not None and \
+                await asyncio.to_thread(self.accept_fast, user_request, fast):
+            return self._record(dict(result, draft=fast, source="fast", reason="accepted"))
+        try:
+            draft, result["slow_seconds"] = await asyncio.wait_for(
+                asyncio.shield(slow), self._remaining(started))
+        except asyncio.TimeoutError:
+            return self._record(dict(result, draft=fast, source="fast", reason="deadline"))
+        except Exception:
+            return self._record(dict(result, draft=fast, source="fast", reason="slow_failed"))
+        return self._record(dict(result, draft=draft, source="slow", reason="finished"))
+
+    async def agenerate(self, user_request: str) -> str:
+        """Race both models without blocking the event loop"""
+        return (await self.arace(user_request))["draft"]
+
+    def generate_stream(self, user_request: str) -> Iterator[str]:
+        # the winner is only known at the end, so it arrives as one chunk
+        yield self.generate(user_request)
+
+    async def agenerate_stream(self, user_request: str) -> AsyncIterator[str]:
+        yield await self.agenerate(user_request)
 
 
 class CritiqueAgent(Agent):
     """Reviews the draft for errors and issues"""
 
-    def __init__(self, llm, protocol_template: str):
-        super().__init__(llm, "Critique Agent")
-        self.protocol_template = protocol_template
+    phase = "critique"
+    verdict_parser = VerdictParser()
 
-    def create_prompt_template(self) -> PromptTemplate:
-        return PromptTemplate(
-            input_variables=["user_request", "draft_output"],
-            template=f"""You are {self.name}.
+    def __init__(self, llm, protocol_template: str, cache: Optional[ResponseCache] = None):
+        super().__init__(llm, "Critique Agent", cache)
+        self.protocol_template = protocol_template
 
-PROTOCOL: {self.protocol_template}
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            self.system_message(),
+            ("human", f"""You are {self.name}.
 
 REQUEST: {{user_request}}
 
@@ -75,32 +598,242 @@ Find these issues:
 4. Security issues
 5. Incomplete parts
 
-List specific issues and fixes.""",
-        )
+List specific issues and fixes.
+
+{VERDICT_INSTRUCTIONS}"""),
+        ])
+
+    def verdict(self, critique_output: str) -> Verdict:
+        """Parse the severity-tagged issue list out of a critique"""
+        return self.verdict_parser.parse(critique_output)
 
     def critique(self, user_request: str, draft_output: str) -> str:
         """Review the draft"""
-        template = self.create_prompt_template()
-        chain = self.get_chain(template)
-        return chain.invoke({
+        return self.invoke({
+            "user_request": user_request,
+            "draft_output": draft_output
+        })
+
+    async def acritique(self, user_request: str, draft_output: str) -> str:
+        """Review the draft without blocking the event loop"""
+        return await self.ainvoke({
+            "user_request": user_request,
+            "draft_output": draft_output
+        })
+
+    def critique_many(self, user_requests: List[str], draft_outputs: List[str],
+                      max_concurrency: Optional[int] = None) -> List[Any]:
+        """Review every draft in one concurrent wave"""
+        return self.invoke_many(
+            [{"user_request": request, "draft_output": draft}
+             for request, draft in zip(user_requests, draft_outputs)], max_concurrency)
+
+    def critique_stream(self, user_request: str, draft_output: str) -> Iterator[str]:
+        """Stream the review as it is generated"""
+        return self.stream({
+            "user_request": user_request,
+            "draft_output": draft_output
+        })
+
+    def acritique_stream(self, user_request: str, draft_output: str) -> AsyncIterator[str]:
+        """Stream the review without blocking the event loop"""
+        return self.astream({
             "user_request": user_request,
             "draft_output": draft_output
         })
 
 
+def critique_policy(critique_agent: CritiqueAgent,
+                    max_blocking: int = 0) -> Callable[[str, str], bool]:
+    """accept_fast policy: keep the fast draft if its critique is clean enough
+
+    With a response cache the critique is reused when the orchestrator
+    critiques the chosen draft, so the check costs no extra call.
+    """
+    def accept(user_request: str, draft_output: str) -> bool:
+        verdict = critique_agent.verdict(critique_agent.critique(user_request, draft_output))
+        return verdict.parsed and len(verdict.blocking_issues()) <= max_blocking
+    return accept
+
+
+class FocusedCritiqueAgent(CritiqueAgent):
+    """Critic that checks the draft for one group of checklist items only"""
+
+    def __init__(self, llm, protocol_template: str, focus: str, checks,
+                 cache: Optional[ResponseCache] = None):
+        super().__init__(llm, protocol_template, cache)
+        self.focus = focus
+        self.checks = tuple(checks)
+        self.name = f"{focus.title()} Critic"
+
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        checks = "\n".join(f"{i}. {check}" for i, check in enumerate(self.checks, 1))
+        return ChatPromptTemplate.from_messages([
+            self.system_message(),
+            ("human", f"""You are {self.name}.
+
+REQUEST: {{user_request}}
+
+DRAFT: {{draft_output}}
+
+Check only for these issues; other critics cover the rest:
+{checks}
+
+List specific issues and fixes.
+
+{VERDICT_INSTRUCTIONS}"""),
+        ])
+
+
+class MultiCritiqueAgent(CritiqueAgent):
+    """Fans the critique out to focused critics and merges their findings
+
+    The critics run concurrently with short prompts, so the phase takes
+    about as long as the slowest one. Issues raised by more than one
+    critic are kept once, and the merged critique ends with a JSON verdict
+    so it can be used anywhere a CritiqueAgent's output is.
+    """
+
+    def __init__(self, llm, protocol_template: str, cache: Optional[ResponseCache] = None,
+                 focuses: Optional[Dict[str, Any]] = None):
+        self.focuses = dict(focuses or CRITIC_FOCUSES)
+        self._critics = None
+        super().__init__(llm, protocol_template, cache)
+
+    def invalidate(self):
+        super().invalidate()
+        self._critics = None
+
+    @property
+    def critics(self) -> List[FocusedCritiqueAgent]:
+        """One critic per focus, sharing this agent's llm, cache and settings"""
+        if self._critics is None:
+            self._critics = [FocusedCritiqueAgent(self.llm, self.protocol_template, focus, checks)
+                             for focus, checks in self.focuses.items()]
+        for critic in self._critics:
+            critic.cache = self.cache
+            critic.retry = self.retry
+            critic.flights = self.flights
+            critic.compactor = self.compactor
+            critic.metrics = self.metrics
+            critic.prompt_caching = self.prompt_caching
+        return self._critics
+
+    def merge(self, outputs: List[str]) -> str:
+        """One critique from every critic's output, duplicates removed"""
+        verdicts = []
+        unparsed = []
+        for critic, output in zip(self.critics, outputs):
+            verdict = self.verdict(output)
+            for issue in verdict.issues:
+                issue["critic"] = critic.focus
+            verdicts.append(verdict)
+            if not verdict.parsed:
+                # keep the raw text so the revision still sees those findings
+                unparsed.append(f"{critic.name}:\n{output.strip()}")
+
+        merged = merge_verdicts(verdicts)
+        lines = [f"- [{issue['severity']}] {issue.get('issue', '')}"
+                 + (f" Fix: {issue['fix']}" if issue.get("fix") else "")
+                 for issue in merged.issues] or ["No issues found."]
+        parts = ["\n".join(lines), *unparsed]
+        if merged.parsed:
+            parts.append(render_verdict(merged))
+        return "\n\n".join(parts)
+
+    def critique(self, user_request: str, draft_output: str) -> str:
+        """Run every critic at once and merge their reviews"""
+        critics = self.critics
+        with ThreadPoolExecutor(max_workers=len(critics)) as pool:
+            outputs = list(pool.map(
+                lambda critic: critic.critique(user_request, draft_output), critics))
+        return self.merge(outputs)
+
+    async def acritique(self, user_request: str, draft_output: str) -> str:
+        outputs = await asyncio.gather(
+            *(critic.acritique(user_request, draft_output) for critic in self.critics))
+        return self.merge(list(outputs))
+
+    def critique_many(self, user_requests: List[str], draft_outputs: List[str],
+                      max_concurrency: Optional[int] = None) -> List[Any]:
+        """Run each critic's wave at once; a request fails if any critic failed"""
+        critics = self.critics
+        with ThreadPoolExecutor(max_workers=len(critics)) as pool:
+            waves = list(pool.map(
+                lambda critic: critic.critique_many(user_requests, draft_outputs,
+                                                    max_concurrency), critics))
+
+        results = []
+        for outputs in zip(*waves):
+            error = next((output for output in outputs if isinstance(output, Exception)), None)
+            results.append(error if error is not None else self.merge(list(outputs)))
+        return results
+
+    def critique_stream(self, user_request: str, draft_output: str) -> Iterator[str]:
+        # the merged critique only exists once the slowest critic is done
+        yield self.critique(user_request, draft_output)
+
+    async def acritique_stream(self, user_request: str,
+                               draft_output: str) -> AsyncIterator[str]:
+        yield await self.acritique(user_request, draft_output)
+
+
+class FollowupCritiqueAgent(CritiqueAgent):
+    """Reviews only what changed since the previous round of an iterative audit"""
+
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            self.system_message(),
+            ("human", f"""You are {self.name}.
+
+REQUEST: {{user_request}}
+
+PREVIOUS ISSUES: {{previous_issues}}
+
+CHANGES SINCE YOUR LAST REVIEW (unified diff):
+{{changes}}
+
+Check the changed lines only:
+1. Were the previous issues fixed?
+2. Did the changes add logic errors, missing error handling or security issues?
+
+List specific remaining issues and fixes.
+
+{VERDICT_INSTRUCTIONS}"""),
+        ])
+
+    def critique_changes(self, user_request: str, changes: str, previous_issues: str) -> str:
+        """Review a diff between two revisions"""
+        return self.invoke({
+            "user_request": user_request,
+            "changes": changes,
+            "previous_issues": previous_issues
+        })
+
+
+def text_diff(before: str, after: str) -> str:
+    """Unified diff between two versions, with one line of context"""
+    return "\n".join(difflib.unified_diff(
+        before.splitlines(), after.splitlines(), "previous", "revised", lineterm="", n=1))
+
+
+def similarity(before: str, after: str) -> float:
+    return difflib.SequenceMatcher(None, before, after, autojunk=False).ratio()
+
+
 class RevisionAgent(Agent):
     """Incorporates critique feedback into final output"""
 
-    def __init__(self, llm, protocol_template: str):
-        super().__init__(llm, "Revision Agent")
-        self.protocol_template = protocol_template
+    phase = "revision"
 
-    def create_prompt_template(self) -> PromptTemplate:
-        return PromptTemplate(
-            input_variables=["user_request", "draft_output", "critique"],
-            template=f"""You are {self.name}.
+    def __init__(self, llm, protocol_template: str, cache: Optional[ResponseCache] = None):
+        super().__init__(llm, "Revision Agent", cache)
+        self.protocol_template = protocol_template
 
-PROTOCOL: {self.protocol_template}
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            self.system_message(),
+            ("human", f"""You are {self.name}.
 
 REQUEST: {{user_request}}
 
@@ -113,15 +846,341 @@ Create the final output that:
 2. Implements improvements
 3. Is production-ready
 
-Provide the complete corrected version.""",
-        )
+Provide the complete corrected version."""),
+        ])
 
     def revise(self, user_request: str, draft_output: str, critique: str) -> str:
         """Generate the revised final output"""
-        template = self.create_prompt_template()
-        chain = self.get_chain(template)
-        return chain.invoke({
+        return self.invoke({
             "user_request": user_request,
             "draft_output": draft_output,
             "critique": critique
         })
+
+    async def arevise(self, user_request: str, draft_output: str, critique: str) -> str:
+        """Generate the revised final output without blocking the event loop"""
+        return await self.ainvoke({
+            "user_request": user_request,
+            "draft_output": draft_output,
+            "critique": critique
+        })
+
+    def revise_many(self, user_requests: List[str], draft_outputs: List[str],
+                    critiques: List[str], max_concurrency: Optional[int] = None) -> List[Any]:
+        """Revise every draft in one concurrent wave"""
+        return self.invoke_many(
+            [{"user_request": request, "draft_output": draft, "critique": critique}
+             for request, draft, critique in zip(user_requests, draft_outputs, critiques)],
+            max_concurrency)
+
+    def revise_stream(self, user_request: str, draft_output: str, critique: str) -> Iterator[str]:
+        """Stream the revised final output as it is generated"""
+        return self.stream({
+            "user_request": user_request,
+            "draft_output": draft_output,
+            "critique": critique
+        })
+
+    def arevise_stream(self, user_request: str, draft_output: str,
+                       critique: str) -> AsyncIterator[str]:
+        """Stream the revised final output without blocking the event loop"""
+        return self.astream({
+            "user_request": user_request,
+            "draft_output": draft_output,
+            "critique": critique
+        })
+
+
+class SAPGOrchestrator:
+    """Runs the Draft → Critique → Revision cycle"""
+
+    def __init__(self, draft_agent: DraftAgent, critique_agent: CritiqueAgent,
+                 revision_agent: RevisionAgent, early_exit: bool = False):
+        self.draft_agent = draft_agent
+        self.critique_agent = critique_agent
+        self.revision_agent = revision_agent
+        self.early_exit = early_exit
+        self._followup_agent = None
+
+    @property
+    def followup_agent(self) -> FollowupCritiqueAgent:
+        """The iterative audit's diff critic, sharing the critique agent's llm and settings"""
+        critic = self.critique_agent
+        if self._followup_agent is None:
+            self._followup_agent = FollowupCritiqueAgent(critic.llm, critic.protocol_template)
+        followup = self._followup_agent
+        followup.llm = critic.llm
+        followup.protocol_template = critic.protocol_template
+        followup.cache = critic.cache
+        followup.retry = critic.retry
+        followup.flights = critic.flights
+        followup.compactor = critic.compactor
+        followup.metrics = critic.metrics
+        followup.prompt_caching = critic.prompt_caching
+        return followup
+
+    def needs_revision(self, critique_output: str) -> bool:
+        """Whether the critique found blocking issues worth a revision call
+
+        Always True unless early_exit is on. Checks and skips are counted
+        on the revision phase's metrics so the skip rate can be reported.
+        """
+        if not self.early_exit:
+            return True
+        revise = self.critique_agent.verdict(critique_output).needs_revision()
+        metrics = self.revision_agent.metrics
+        if metrics is not None:
+            metrics.increment(self.revision_agent.phase, "early_exit_checks")
+            if not revise:
+                metrics.increment(self.revision_agent.phase, "skipped")
+        return revise
+
+    def execute(self, user_request: str, pipelined: bool = False,
+                partial: Optional[Dict[str, Any]] = None, max_rounds: int = 1,
+                on_phase: Optional[Callable[[str], None]] = None,
+                on_token: Optional[Callable[[str, str], None]] = None,
+                cancel: Optional[Callable[[], bool]] = None, **budgets) -> Dict[str, Any]:
+        """Run all three phases and return every phase output
+
+        The one entry point for every mode. With pipelined=True the
+        critique and revision start on finished sections of the streaming
+        draft instead of waiting for all of it; early_exit then skips the
+        revision per section. max_rounds above 1 runs execute_iterative
+        with the given budgets. Phases already in `partial` (e.g.
+        PhaseFailed.results from an earlier attempt) are not run again.
+        Once the draft is done there is nothing left to overlap, so a
+        resume runs the remaining phases in sequence.
+
+        on_phase, on_token and cancel report progress and stop the run
+        between phases and streamed chunks (see RunProgress); a stopped
+        run raises RunCancelled.
+        """
+        if pipelined and max_rounds > 1:
+            raise ValueError("pipelined mode runs a single critique round")
+        progress = RunProgress(on_phase, on_token, cancel)
+        if max_rounds > 1:
+            return self.execute_iterative(user_request, max_rounds, partial=partial,
+                                          progress=progress, **budgets)
+        if budgets:
+            raise TypeError(f"budgets only apply to max_rounds > 1: {', '.join(budgets)}")
+        if pipelined and "draft" not in (partial or {}):
+            return run_pipelined(self.draft_agent, self.critique_agent,
+                                 self.revision_agent, user_request,
+                                 needs_revision=self.needs_revision, progress=progress)
+
+        results = dict(partial or {}, user_request=user_request)
+        phase = "draft"
+        try:
+            if "draft" not in results:
+                results.update(self._draft(user_request, progress))
+            phase = "critique"
+            if "critique" not in results:
+                results["critique"] = progress.call(
+                    "critique", lambda: self.critique_agent.critique(user_request, results["draft"]),
+                    lambda: self.critique_agent.critique_stream(user_request, results["draft"]))
+            phase = "revision"
+            if "revision" in results:
+                return results
+            if self.needs_revision(results["critique"]):
+                results["revision"] = progress.call(
+                    "revision", lambda: self.revision_agent.revise(
+                        user_request, results["draft"], results["critique"]),
+                    lambda: self.revision_agent.revise_stream(
+                        user_request, results["draft"], results["critique"]))
+            else:
+                # nothing blocking: the draft is the final output
+                results["revision"] = results["draft"]
+                results["revision_skipped"] = True
+        except RunCancelled:
+            raise
+        except Exception as e:
+            raise PhaseFailed(phase, results, e) from e
+        return results
+
+    def _draft(self, user_request: str, progress: RunProgress) -> Dict[str, Any]:
+        # a speculative draft streams the fast model's tokens, then says which draft won
+        if not isinstance(self.draft_agent, SpeculativeDraftAgent):
+            return {"draft": progress.call("draft",
+                                           lambda: self.draft_agent.generate(user_request),
+                                           lambda: self.draft_agent.generate_stream(user_request))}
+        progress.start("draft")
+        streamed = []
+
+        def on_fast_token(token):
+            streamed.append(token)
+            progress.token("draft", token)
+        race = self.draft_agent.race(user_request, on_fast_token=on_fast_token)
+        if race["draft"] != "".join(streamed):
+            # the configured model's (or a reused) draft replaces what was shown
+            progress.start("draft")
+            progress.token("draft", race["draft"])
+        return {"draft": race["draft"], "draft_source": race["source"]}
+
+    def execute_iterative(self, user_request: str, max_rounds: int = 3,
+                          similarity_threshold: float = 0.98,
+                          max_seconds: Optional[float] = None,
+                          max_tokens: Optional[int] = None,
+                          partial: Optional[Dict[str, Any]] = None,
+                          progress: Optional[RunProgress] = None) -> Dict[str, Any]:
+        """Repeat critique → revision until the output stops needing changes
+
+        Stops when the critique has no blocking issues, when two successive
+        versions are at least similarity_threshold alike, after max_rounds
+        revisions, or before a call that would start past the wall-clock or
+        estimated token budget. Rounds after the first critique only the
+        diff since the previous version plus the previous issue list. A
+        draft and first critique in `partial` are reused; progress hears
+        every call, and a revision round restarts the "revision" phase.
+        A failure raises PhaseFailed keeping the draft, first critique,
+        finished rounds and last good revision; passed back as `partial`
+        they resume the loop where it stopped.
+        """
+        progress = progress or RunProgress()
+        partial = partial or {}
+        started = time.perf_counter()
+        spent = {"tokens": 0}
+
+        def track(inputs, output):
+            spent["tokens"] += sum(approx_tokens(str(v)) for v in inputs) + approx_tokens(output)
+            return output
+
+        def over_budget():
+            if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+                return "time_budget"
+            if max_tokens is not None and spent["tokens"] >= max_tokens:
+                return "token_budget"
+            return None
+
+        followup = self.followup_agent
+
+        def followup_critique(previous, current, critique_output):
+            changes = text_diff(previous, current)
+            issues = "; ".join(issue.get("issue", "") for issue in
+                               self.critique_agent.verdict(critique_output).issues) or "none listed"
+            return track([user_request, changes, issues], progress.call(
+                "critique", lambda: followup.critique_changes(user_request, changes, issues)))
+
+        results = {"user_request": user_request}
+        rounds = list(partial.get("rounds") or [])
+        stop_reason = "max_rounds"
+        phase = "draft"
+        try:
+            draft_output = results["draft"] = partial.get("draft") or track(
+                [user_request], progress.call(
+                    "draft", lambda: self.draft_agent.generate(user_request)))
+            phase = "critique"
+            first_critique = results["critique"] = partial.get("critique") or track(
+                [user_request, draft_output], progress.call(
+                    "critique", lambda: self.critique_agent.critique(user_request,
+                                                                     draft_output)))
+            versions = [draft_output] + [done["revision"] for done in rounds]
+            current = versions[-1]
+            critique_output = partial.get("next_critique")
+            if critique_output is None:
+                critique_output = first_critique
+                if rounds and len(rounds) < max_rounds:
+                    # resuming after a failed follow-up critique redoes just that call
+                    critique_output = followup_critique(versions[-2], current,
+                                                        rounds[-1]["critique"])
+
+            for round_number in range(len(rounds) + 1, max_rounds + 1):
+                results["next_critique"] = critique_output
+                if not self.critique_agent.verdict(critique_output).needs_revision():
+                    stop_reason = "no_issues"
+                    break
+                stop_reason = over_budget()
+                if stop_reason:
+                    break
+
+                phase = "revision"
+                revised = track([user_request, current, critique_output], progress.call(
+                    "revision", lambda: self.revision_agent.revise(user_request, current,
+                                                                   critique_output)))
+                score = similarity(current, revised)
+                rounds.append({"round": round_number, "critique": critique_output,
+                               "revision": revised, "similarity": score})
+                previous, current = current, revised
+                # the last good revision survives a later failure
+                results.update(revision=current, rounds=list(rounds))
+                del results["next_critique"]
+
+                if score >= similarity_threshold:
+                    stop_reason = "converged"
+                    break
+                if round_number == max_rounds:
+                    stop_reason = "max_rounds"
+                    break
+                stop_reason = over_budget()
+                if stop_reason:
+                    break
+
+                phase = "critique"
+                critique_output = followup_critique(previous, current, critique_output)
+        except RunCancelled:
+            raise
+        except Exception as e:
+            raise PhaseFailed(phase, results, e) from e
+
+        return {
+            "user_request": user_request,
+            "draft": draft_output,
+            "critique": first_critique,
+            "revision": current,
+            "rounds": rounds,
+            "stop_reason": stop_reason,
+            "estimated_tokens": spent["tokens"],
+            "elapsed_seconds": time.perf_counter() - started,
+        }
+
+    def execute_many(self, user_requests: List[str],
+                     max_concurrency: Optional[int] = None) -> List[Dict[str, str]]:
+        """Audit many requests phase by phase: all drafts, then critiques, then revisions
+
+        Results keep the input order. A request that fails in any phase gets
+        an "error" entry and is left out of the later waves.
+        """
+        results = [{"user_request": request} for request in user_requests]
+
+        def wave(phase, run, *fields):
+            live = [result for result in results
+                    if "error" not in result and phase not in result]
+            if not live:
+                return
+            columns = [[result[field] for result in live] for field in fields]
+            outputs = run(*columns, max_concurrency=max_concurrency)
+            for result, output in zip(live, outputs):
+                if isinstance(output, Exception):
+                    result["error"] = f"{phase}: {output}"
+                else:
+                    result[phase] = output
+
+        wave("draft", self.draft_agent.generate_many, "user_request")
+        wave("critique", self.critique_agent.critique_many, "user_request", "draft")
+        for result in results:
+            if "critique" in result and not self.needs_revision(result["critique"]):
+                result["revision"] = result["draft"]
+                result["revision_skipped"] = True
+        wave("revision", self.revision_agent.revise_many,
+             "user_request", "draft", "critique")
+        return results
+
+    async def aexecute(self, user_request: str, limits: Optional[ProviderLimits] = None,
+                       partial: Optional[Dict[str, Any]] = None,
+                       on_phase: Optional[Callable[[str], None]] = None,
+                       on_token: Optional[Callable[[str, str], None]] = None,
+                       cancel: Optional[Callable[[], bool]] = None) -> Dict[str, str]:
+        """Run all three phases asynchronously, resuming from `partial` if given"""
+        return await run_sap(self.draft_agent, self.critique_agent, self.revision_agent,
+                             user_request, limits, self.needs_revision, partial,
+                             RunProgress(on_phase, on_token, cancel))
+
+    async def aexecute_many(self, user_requests: List[str],
+                            limits: Optional[ProviderLimits] = None) -> List[Dict[str, str]]:
+        """Run many audits concurrently, in input order
+
+        All runs share one set of per-provider limits so a single provider
+        is never sent more than its limit of concurrent calls.
+        """
+        limits = limits or ProviderLimits()
+        return await asyncio.gather(
+            *(self.aexecute(request, limits) for request in user_requests))
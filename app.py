@@ -1,19 +1,188 @@
 # SAPG - Self-Auditing Prompt Generator
 # Main Streamlit app
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 from protocol import get_protocol_template
-from agents import DraftAgent, CritiqueAgent, RevisionAgent
-from llm_factory import LLMFactory
+from agents import (DraftAgent, CritiqueAgent, MultiCritiqueAgent, RevisionAgent,
+                    SAPGOrchestrator, SpeculativeDraftAgent)
+from cache import ResponseCache
+from compaction import PromptCompactor
+from metrics import MetricsRegistry
+from resilience import RetryPolicy
+from semantic_cache import SemanticCache
+from singleflight import SingleFlight
+from routing import PHASES, PhaseModel, complete_routes, cost_report
+from warmup import parse_keep_alive
+from history import RunStore
+from jobs import ACTIVE_STATES, JobExecutor, audit_job, llm_label, recorded
+from llm_factory import (FAILOVER_ORDER, FAST_MODELS, OLLAMA_KEEP_ALIVE, OLLAMA_OPTIONS,
+                         LLMFactory)
 
 st.set_page_config(page_title="Self-Auditing Prompt Generator",
                    page_icon="🔍", layout="wide")
 
+MAX_ROUNDS = 5
+
+
+@st.cache_resource
+def get_response_cache():
+    """One response cache shared by every session"""
+    return ResponseCache(max_entries=256, path=".sapg_cache.sqlite",
+                         ttl=7 * 24 * 3600)
+
+
+@st.cache_resource
+def get_semantic_cache():
+    """Near-duplicate draft cache shared by every session"""
+    return SemanticCache(capacity=10000)
+
+
+@st.cache_resource
+def get_metrics_registry():
+    """Process-wide per-phase metrics"""
+    registry = MetricsRegistry()
+    LLMFactory.use_metrics(registry)
+    return registry
+
+
+@st.cache_resource
+def get_retry_policy():
+    """Retry policy shared by every session, so circuit breakers see all calls"""
+    return RetryPolicy(max_attempts=3)
+
+
+@st.cache_resource
+def get_single_flight():
+    """Shared by every session, so identical requests run once between them"""
+    return SingleFlight()
+
+
+@st.cache_resource
+def get_job_executor():
+    """Background workers shared by every session, so runs survive reruns"""
+    return JobExecutor(max_workers=8)
+
+
+@st.cache_resource
+def get_run_store():
+    """Every finished run, kept across restarts"""
+    return RunStore(".sapg_history.sqlite")
+
+
+@st.cache_resource
+def get_llm(provider, model, settings=()):
+    """Pooled LLM client that survives reruns"""
+    return LLMFactory.create_llm(provider, model, **dict(settings))
+
+
+def get_speculative_pair(provider, model, fast_model, settings=()):
+    """Pooled (configured, fast) LLM clients for speculative drafting"""
+    return LLMFactory.create_speculative_pair(provider, model, fast_model, **dict(settings))
+
+
+@st.cache_resource
+def warm_ollama(model, settings=()):
+    """Start loading the model into Ollama once per process and settings, in the background"""
+    return ThreadPoolExecutor(max_workers=1).submit(LLMFactory.warm_up, model, **dict(settings))
+
+
+@st.cache_resource
+def get_compactor(budget):
+    """One compactor per token budget, shared by every run"""
+    return PromptCompactor(budget)
+
+
+def ollama_settings():
+    """keep_alive and runtime options chosen in the sidebar, as a hashable tuple"""
+    settings = {"keep_alive": parse_keep_alive(st.session_state.get("keep_alive") or
+                                               OLLAMA_KEEP_ALIVE)}
+    for name in ("num_ctx", "num_predict", "num_thread"):
+        if name in st.session_state:
+            # 0 is passed on as None: leave it to Ollama's default
+            settings[name] = int(st.session_state[name]) or None
+    return tuple(sorted(settings.items()))
+
+
+def phase_routes(provider, model):
+    """Provider, model and limits per phase from the sidebar"""
+    default = PhaseModel(provider, model)
+    if not st.session_state.get("phase_routing"):
+        return complete_routes({}, default)
+    return {phase: PhaseModel(
+                st.session_state.get(f"{phase}_provider") or provider,
+                st.session_state.get(f"{phase}_model") or model,
+                st.session_state.get(f"{phase}_temperature"),
+                st.session_state.get(f"{phase}_max_tokens") or None)
+            for phase in PHASES}
+
+
+def route_settings(route):
+    """create_llm settings for a route, as a hashable tuple"""
+    settings = dict(ollama_settings()) if route.provider == "ollama" else {}
+    settings.update(route.settings())
+    return tuple(sorted(settings.items()))
+
+
+def setup_phase_routing(providers, provider, model):
+    """Sidebar controls for a provider/model/temperature/max_tokens per phase"""
+    with st.expander("🧭 Per-phase models"):
+        if not st.checkbox("Route phases to different models", key="phase_routing",
+                           help="e.g. a small, fast model for the critique and your "
+                                "main one for the revision (overrides failover)"):
+            return
+        # the critique only lists issues, so a small model with a short answer will do
+        suggested = {"critique": (FAST_MODELS.get(provider, model), 800)}
+        for phase in PHASES:
+            suggested_model, suggested_max = suggested.get(phase, (model, 0))
+            st.markdown(f"**{phase.title()}**")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.selectbox("Provider", providers, index=providers.index(provider),
+                             key=f"{phase}_provider")
+                st.number_input("Temperature", min_value=0.0, max_value=2.0, value=None,
+                                step=0.1, key=f"{phase}_temperature", placeholder="default")
+            with col2:
+                st.text_input("Model", value=suggested_model, key=f"{phase}_model")
+                st.number_input("Max tokens", min_value=0, value=suggested_max, step=100,
+                                key=f"{phase}_max_tokens", help="0 = no limit")
+
+
+def show_warmup(model):
+    """Preload the chosen Ollama model and say how it went"""
+    warming = warm_ollama(model, ollama_settings())
+    if not warming.done():
+        st.caption(f"🔥 Loading {model} into memory...")
+    elif warming.exception() is not None:
+        st.caption(f"🔥 Could not preload {model}: is `ollama serve` running?")
+    else:
+        result = warming.result()
+        state = f"loaded in {result['seconds']:.1f}s" if result["cold"] else "already in memory"
+        st.caption(f"🔥 {model} {state}")
+
+
+@st.cache_resource
+def get_routed_llm(provider, model, hedge):
+    """Failover LLM starting with the chosen provider, then the others"""
+    order = (provider,) + tuple(p for p in FAILOVER_ORDER if p != provider)
+    return LLMFactory.create_routed(order, {provider: model}, hedge=hedge)
+
 
 def init_state():
     """Set up session variables"""
     if 'results' not in st.session_state:
         st.session_state.results = None
+    if 'partial' not in st.session_state:
+        st.session_state.partial = None
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'job_error' not in st.session_state:
+        st.session_state.job_error = None
+    if 'history_pages' not in st.session_state:
+        # the `before` cursor of each history page seen so far
+        st.session_state.history_pages = [None]
 
 
 def show_header():
@@ -45,18 +214,82 @@ def setup_sidebar():
             st.info("💡 Tip: Use 'mistral' or 'llama2:7b' for 5x faster results!")
             model = st.text_input(
                 "Model Name", value="llama2", help="try: mistral, llama2:7b")
+            with st.expander("⚙️ Ollama settings"):
+                st.text_input("Keep loaded for", value=str(OLLAMA_KEEP_ALIVE), key="keep_alive",
+                              help="How long Ollama keeps the model in memory: 30m, 2h, "
+                                   "or -1 for as long as it runs")
+                st.number_input("Context window (num_ctx)", min_value=0, step=1024,
+                                value=OLLAMA_OPTIONS["num_ctx"] or 0, key="num_ctx",
+                                help="Smaller windows allocate a smaller KV cache (0 = Ollama's default)")
+                st.number_input("Max output tokens (num_predict)", min_value=0, step=256,
+                                value=OLLAMA_OPTIONS["num_predict"] or 0, key="num_predict",
+                                help="0 = no limit")
+                st.number_input("CPU threads (num_thread)", min_value=0, step=1,
+                                value=OLLAMA_OPTIONS["num_thread"] or 0, key="num_thread",
+                                help="0 = let Ollama decide")
+            show_warmup(model)
         elif provider == "openai":
             model = st.selectbox(
                 "Model", ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"])
         elif provider == "anthropic":
             model = st.selectbox(
                 "Model", ["claude-3-sonnet-20240229", "claude-3-opus-20240229"])
+            st.checkbox("🧊 Prompt caching", key="prompt_caching",
+                        help="Cache the shared protocol block across the three phases")
         else:
             model = "llama2"  # fallback
 
+        if st.checkbox("🛟 Fail over to other providers", key="failover",
+                       help="Retry on the next available provider if this one errors or stalls"):
+            st.checkbox("Hedge slow requests", key="hedge",
+                        help="Also ask the next provider when the first token is slower than usual")
+
+        if st.checkbox("🏎️ Speculative drafting", key="speculative",
+                       help="Show a fast model's draft first; use yours if it finishes in time"):
+            st.text_input("Fast model", value=FAST_MODELS.get(provider, ""), key="fast_model")
+            st.number_input("Wait for your model (seconds)", min_value=0.0, value=30.0,
+                            step=5.0, key="speculative_deadline")
+
+        if st.checkbox("🧲 Reuse drafts of similar requests", key="semantic",
+                       help="Skip drafting when an earlier request was worded almost the same"):
+            st.slider("Similarity needed", min_value=0.9, max_value=1.0, value=0.95,
+                      step=0.01, key="semantic_threshold")
+
+        setup_phase_routing(providers, provider, model)
+
+        st.checkbox("⚡ Pipelined mode", key="pipelined",
+                    help="Start critique and revision on finished draft sections")
+
+        st.checkbox("🧑‍⚖️ Parallel critics", key="multi_critic",
+                    help="Split the checklist between focused critics that run at once")
+
+        st.checkbox("⏭️ Skip revision when clean", key="early_exit",
+                    help="Return the draft when the critique finds no blocking issues")
+
+        if st.number_input("Critique rounds", min_value=1, max_value=MAX_ROUNDS, value=1,
+                           key="rounds",
+                           help="Critique and revise again until no blocking issues are "
+                                "left (1 = single pass)") > 1:
+            st.slider("Stop when two versions are this alike", min_value=0.8, max_value=1.0,
+                      value=0.98, step=0.01, key="rounds_similarity")
+            st.number_input("Time budget (s)", min_value=0, value=0, step=30,
+                            key="rounds_max_seconds", help="0 = no limit")
+            st.number_input("Token budget", min_value=0, value=0, step=1000,
+                            key="rounds_max_tokens", help="Estimated tokens, 0 = no limit")
+
+        st.number_input("Prompt token budget", min_value=0, value=0, step=500,
+                        key="prompt_budget",
+                        help="Trim long drafts/critiques to fit small models (0 = off)")
+
         with st.expander("📋 View Protocol"):
             st.markdown(get_protocol_template())
 
+        stats = get_response_cache().stats()
+        st.caption(f"🗄️ Response cache: {stats['hits']} hits / {stats['misses']} misses")
+        if st.session_state.get("semantic"):
+            stats = get_semantic_cache().stats()
+            st.caption(f"🧲 Similar drafts: {stats['hits']} reused / {stats['entries']} stored")
+
         st.markdown("---")
         st.markdown("📚 [Speed Tips](SPEED_TIPS.md) for faster results")
 
@@ -105,24 +338,76 @@ def get_user_input():
     return user_input
 
 
+def phase_llms(provider, model):
+    """The pooled LLM client each phase runs on, from the sidebar"""
+    if st.session_state.get("failover"):
+        llm = get_routed_llm(provider, model, st.session_state.get("hedge", False))
+    elif provider == "ollama":
+        llm = get_llm(provider, model, ollama_settings())
+    else:
+        llm = get_llm(provider, model)
+
+    if st.session_state.get("phase_routing"):
+        return {phase: get_llm(route.provider, route.model, route_settings(route))
+                for phase, route in phase_routes(provider, model).items()}
+    return dict.fromkeys(PHASES, llm)
+
+
+def current_routes(provider, model):
+    """provider:model per phase for the next run, as saved with it (None if unavailable)"""
+    try:
+        return {phase: llm_label(llm) for phase, llm in phase_llms(provider, model).items()}
+    except Exception:
+        return None
+
+
 def create_agents(provider, model):
     """Initialize the three agents"""
     try:
-        # add timeout for ollama to prevent hanging
-        if provider == "ollama":
-            llm = LLMFactory.create_llm(provider, model)
-            # reduce model size suggestion if using default
-            if model == "llama2":
-                st.warning(
-                    "⚠️ llama2 is slow. Try 'mistral' or 'llama2:7b' for faster results!")
-        else:
-            llm = LLMFactory.create_llm(provider, model)
+        # reduce model size suggestion if using default
+        if provider == "ollama" and model == "llama2":
+            st.warning("⚠️ llama2 is slow. Try 'mistral' or 'llama2:7b' for faster results!")
+
+        routes = phase_routes(provider, model)
+        llms = phase_llms(provider, model)
 
         protocol = get_protocol_template()
 
-        draft = DraftAgent(llm, protocol)
-        critique = CritiqueAgent(llm, protocol)
-        revision = RevisionAgent(llm, protocol)
+        cache = get_response_cache()
+
+        if st.session_state.get("speculative"):
+            route = routes["draft"]
+            draft_llm, fast_llm = get_speculative_pair(
+                route.provider, route.model, st.session_state.get("fast_model") or None,
+                route_settings(route))
+            if st.session_state.get("failover"):
+                # the configured draft keeps its failover route
+                draft_llm = llms["draft"]
+            draft = SpeculativeDraftAgent(draft_llm, fast_llm, protocol, cache,
+                                          deadline=st.session_state.get("speculative_deadline"))
+        else:
+            draft = DraftAgent(llms["draft"], protocol, cache)
+        if st.session_state.get("semantic"):
+            draft.semantic_cache = get_semantic_cache()
+            draft.semantic_threshold = st.session_state.get("semantic_threshold")
+        critic_class = MultiCritiqueAgent if st.session_state.get("multi_critic") else CritiqueAgent
+        critique = critic_class(llms["critique"], protocol, cache)
+        revision = RevisionAgent(llms["revision"], protocol, cache)
+
+        for agent in (draft, critique, revision):
+            agent.metrics = get_metrics_registry()
+            agent.retry = get_retry_policy()
+            agent.flights = get_single_flight()
+
+        if provider == "anthropic" and st.session_state.get("prompt_caching"):
+            for agent in (draft, critique, revision):
+                agent.prompt_caching = True
+
+        budget = st.session_state.get("prompt_budget")
+        if budget:
+            compactor = get_compactor(budget)
+            critique.compactor = compactor
+            revision.compactor = compactor
 
         return draft, critique, revision
     except Exception as e:
@@ -158,6 +443,244 @@ def show_results(results):
                      height=400, label_visibility="collapsed")
 
 
+def show_cost_report(registry, routes):
+    """Estimated cost and latency per phase, against running all on the revision model"""
+    rows = cost_report(registry, routes, baseline=routes["revision"])
+    if not rows:
+        return
+
+    def dollars(value):
+        return "?" if value is None else f"${value:.4f}"
+
+    st.caption("💰 Cost and latency per phase (estimated from list prices)")
+    st.table([{
+        "phase": row["phase"],
+        "model": row["model"],
+        "calls": row["calls"],
+        "latency p50 (s)": round(row["latency_p50"], 2),
+        "latency p95 (s)": round(row["latency_p95"], 2),
+        "tokens in/out": f"{row['prompt_tokens']:.0f} / {row['completion_tokens']:.0f}",
+        "cost/call": dollars(row["cost_per_call"]),
+        "total": dollars(row["cost"]),
+    } for row in rows])
+    costs = [(row["cost"], row["baseline_cost"]) for row in rows]
+    if all(cost is not None and base is not None for cost, base in costs):
+        saved = sum(base - cost for cost, base in costs)
+        if saved > 0:
+            st.caption(f"Routing saved {dollars(saved)} vs running every phase "
+                       f"on {routes['revision'].label}")
+
+
+def show_metrics(registry, routes):
+    """Per-phase latency and throughput panel"""
+    snapshot = registry.snapshot()
+    if not snapshot:
+        return
+
+    with st.expander("📈 Performance Metrics"):
+        rows = []
+        limiter_rows = []
+        for phase, stats in snapshot.items():
+            if ":" in phase:
+                # a provider:model (limiter queue, cold starts), not a phase
+                wait = stats.get("limiter_wait_seconds", {})
+                limiter_rows.append({
+                    "provider:model": phase,
+                    "calls": wait.get("count", 0),
+                    "throttled": int(stats["counters"].get("throttled", 0)),
+                    "wait p50 (s)": round(wait.get("p50", 0), 2),
+                    "wait p95 (s)": round(wait.get("p95", 0), 2),
+                    "cold first token p50 (s)":
+                        round(stats.get("cold_ttft_seconds", {}).get("p50", 0), 2),
+                    "warm first token p50 (s)":
+                        round(stats.get("warm_ttft_seconds", {}).get("p50", 0), 2),
+                })
+                continue
+            latency = stats.get("latency_seconds", {})
+            rows.append({
+                "phase": phase,
+                "calls": int(stats["counters"].get("calls", 0)),
+                "cache hits": int(stats["counters"].get("cache_hits", 0)),
+                "shared": int(stats["counters"].get("coalesced", 0)),
+                "queue p50 (s)": round(stats.get("queue_seconds", {}).get("p50", 0), 2),
+                "first token p50 (s)": round(stats.get("ttft_seconds", {}).get("p50", 0), 2),
+                "latency p50 (s)": round(latency.get("p50", 0), 2),
+                "latency p95 (s)": round(latency.get("p95", 0), 2),
+                "tokens/sec": round(stats.get("tokens_per_second", {}).get("mean", 0), 1),
+            })
+        st.table(rows)
+        show_cost_report(registry, routes)
+        if limiter_rows:
+            st.caption("🚦 Per model: rate limiter queue and cold/warm starts")
+            st.table(limiter_rows)
+
+        revision = snapshot.get("revision", {}).get("counters", {})
+        if revision.get("early_exit_checks"):
+            skip_rate = revision.get("skipped", 0) / revision["early_exit_checks"]
+            st.caption(f"⏭️ Revision skip rate: {skip_rate:.0%}")
+        for phase, stats in snapshot.items():
+            before, after = stats.get("prompt_tokens_before"), stats.get("prompt_tokens_after")
+            if before and after:
+                counters = stats["counters"]
+                st.caption(f"✂️ {phase} prompts: {int(counters.get('compacted', 0))} of "
+                           f"{before['count']} compacted, "
+                           f"{int(counters.get('prompt_tokens_saved', 0)):,} tokens saved "
+                           f"(mean {before['mean']:.0f} → {after['mean']:.0f})")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("⬇️ JSON", registry.to_json(), "sapg_metrics.json")
+        with col2:
+            st.download_button("⬇️ Prometheus", registry.to_prometheus(), "sapg_metrics.prom")
+
+
+PHASE_LABELS = {"draft": "📋 Draft", "critique": "🔍 Critique", "revision": "✏️ Revision"}
+
+
+def job_function(orchestrator, user_input):
+    """Pick what the background job runs from the sidebar settings
+
+    Session state is read here, on the script thread; the job itself
+    must not touch Streamlit.
+    """
+    options = {}
+    rounds = st.session_state.get("rounds", 1)
+    if st.session_state.get("pipelined"):
+        options["pipelined"] = True
+    elif rounds > 1:
+        options = {"max_rounds": rounds,
+                   "similarity_threshold": st.session_state.get("rounds_similarity", 0.98),
+                   "max_seconds": st.session_state.get("rounds_max_seconds") or None,
+                   "max_tokens": st.session_state.get("rounds_max_tokens") or None}
+
+    # phases that finished before a failure are not paid for twice
+    partial = st.session_state.partial
+    if not partial or partial.get("user_request") != user_input:
+        partial = None
+    return audit_job(orchestrator, partial, **options)
+
+
+@st.fragment(run_every=1)
+def show_job():
+    """Live view of the running audit, polled from the job registry"""
+    executor = get_job_executor()
+    job_id = st.session_state.job_id
+    job = executor.get(job_id) if job_id else None
+    if job is None:
+        st.session_state.job_id = None
+        return
+
+    if job["status"] in ACTIVE_STATES:
+        phase = job["phase"]
+        doing = f"{PHASE_LABELS.get(phase, phase)} in progress" if phase else "Waiting for a worker"
+        st.info(f"⏳ {doing} ({job['elapsed']:.0f}s). "
+                "Reruns and other tabs don't interrupt it.")
+        for name, text in job["outputs"].items():
+            with st.expander(PHASE_LABELS.get(name, name), expanded=True):
+                st.markdown(text + ("▌" if name == phase else ""))
+        if st.button("⏹️ Cancel", key=f"cancel-{job_id}"):
+            executor.cancel(job_id)
+        return
+
+    # finished: hand the outcome to the whole page
+    st.session_state.job_id = None
+    if job["status"] == "done":
+        st.session_state.results = job["result"]
+        st.session_state.partial = None
+        st.session_state.history_pages = [None]
+        if job["result"].get("run_id"):
+            st.query_params["run"] = str(job["result"]["run_id"])
+    elif job["status"] == "failed":
+        st.session_state.job_error = job["error"]
+        st.session_state.partial = job["partial"]
+    st.rerun()
+
+
+def show_error(error_msg):
+    """Error message with hints for the usual causes"""
+    st.error(f"❌ Error: {error_msg}")
+
+    # helpful error messages
+    if "timeout" in error_msg.lower() or "connection" in error_msg.lower():
+        st.warning("""
+        **Connection timeout!** 
+        - Try a faster model like 'mistral' or 'llama2:7b'
+        - Run: `ollama pull mistral` in terminal
+        - Or use OpenAI/Anthropic API for instant results
+        """)
+    elif "ollama" in error_msg.lower():
+        st.info("Make sure Ollama is running: `ollama serve`")
+    if st.session_state.partial and "draft" in st.session_state.partial:
+        st.info("🔁 Finished phases were kept: run it again to resume")
+
+
+def show_run_notes(results):
+    """One-line notes about how the run went"""
+    if results.get("draft_source") == "fast":
+        st.caption("🏎️ The fast model's draft was used")
+    elif results.get("draft_source") == "semantic":
+        st.caption("🧲 Reused the draft of a similar earlier request")
+    if results.get("timings"):
+        st.caption("⏱️ " + " · ".join(f"{phase} {seconds:.1f}s"
+                                      for phase, seconds in results["timings"].items()))
+    if results.get("revision_skipped"):
+        st.info("⏭️ No blocking issues found, so the draft is the final output")
+    if results.get("stop_reason"):
+        st.info(f"🔁 {len(results['rounds'])} round(s), "
+                f"stopped: {results['stop_reason'].replace('_', ' ')}")
+
+
+HISTORY_PAGE = 20
+
+
+def open_run(store, run_id):
+    """Show a past run as the current results"""
+    run = store.get(run_id)
+    if run is None:
+        st.warning(f"Run #{run_id} is not in the history")
+        st.query_params.pop("run", None)
+        return
+    st.session_state.results = dict(run["results"], run_id=run_id)
+    st.session_state.job_error = None
+    st.query_params["run"] = str(run_id)
+
+
+def show_history(store, provider, model):
+    """Past runs, newest first, a page at a time"""
+    with st.expander("🕘 Past runs"):
+        this_model = st.checkbox(f"Only {provider}:{model}", key="history_this_model",
+                                 on_change=lambda: st.session_state.update(history_pages=[None]))
+        pages = st.session_state.history_pages
+        filters = {"provider": provider, "model": model} if this_model else {}
+        runs = store.list(HISTORY_PAGE, before=pages[-1], **filters)
+        if not runs:
+            st.caption("No runs yet")
+        for run in runs:
+            col1, col2 = st.columns([6, 1])
+            with col1:
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["created"]))
+                took = f" · {run['seconds']:.0f}s" if run["seconds"] is not None else ""
+                models = f"{run['provider']}:{run['model']}"
+                if run["routes"] and set(run["routes"].values()) != {models}:
+                    models = " · ".join(f"{phase} {label}"
+                                        for phase, label in run["routes"].items())
+                st.markdown(f"**#{run['id']}** {when} · `{models}`{took}  \n{run['title']}")
+            with col2:
+                if st.button("Open", key=f"open-run-{run['id']}"):
+                    open_run(store, run["id"])
+                    st.rerun()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(pages) > 1 and st.button("⬅️ Newer", key="history_newer"):
+                pages.pop()
+                st.rerun()
+        with col2:
+            if len(runs) == HISTORY_PAGE and st.button("Older ➡️", key="history_older"):
+                pages.append(runs[-1]["id"])
+                st.rerun()
+
+
 def main():
     """Main app entry point"""
     init_state()
@@ -169,8 +692,23 @@ def main():
     if not provider:
         return
 
+    store = get_run_store()
+    run_param = st.query_params.get("run")
+    if st.session_state.results is None and run_param and run_param.isdigit():
+        # a reload or shared link reopens the run it points at
+        open_run(store, int(run_param))
+
     show_info()
     user_input = get_user_input()
+    if (user_input and user_input.strip() and not st.session_state.results
+            and not st.session_state.job_id):
+        # only a run made by the same model in every phase counts
+        routes = current_routes(provider, model)
+        seen = routes and store.latest(user_input, routes=routes)
+        if seen and st.button(f"🕘 Already audited with {model} (run #{seen['id']}): open it",
+                              key="open-seen-run"):
+            open_run(store, seen["id"])
+            st.rerun()
 
     # buttons
     col1, col2 = st.columns([1, 4])
@@ -181,88 +719,56 @@ def main():
         clear_btn = st.button("🗑️ Clear", use_container_width=True)
 
     if clear_btn:
+        if st.session_state.job_id:
+            get_job_executor().cancel(st.session_state.job_id)
+        st.session_state.job_id = None
+        st.session_state.job_error = None
         st.session_state.results = None
+        st.session_state.partial = None
+        st.query_params.pop("run", None)
         st.rerun()
 
     if go_btn:
         if not user_input or not user_input.strip():
             st.error("Enter a request first")
             return
-
-        # setup agents
-        with st.spinner("Setting up agents..."):
-            draft_agent, critique_agent, revision_agent = create_agents(
-                provider, model)
-
-        if not draft_agent or not critique_agent or not revision_agent:
-            return
-
-        # run the three phases
-        try:
-            # show progress
-            progress = st.progress(0)
-            status = st.empty()
-
-            # Phase 1
-            status.text("📝 Phase 1/3: Creating Draft...")
-            progress.progress(33)
-
-            # add timeout warning
-            if provider == "ollama":
-                status.text(
-                    "📝 Phase 1/3: Creating Draft... (This may take 2-5 minutes)")
-
-            draft_output = draft_agent.generate(user_input)
-
-            # Phase 2
-            status.text("🔍 Phase 2/3: Running Critique...")
-            progress.progress(66)
-            critique_output = critique_agent.critique(user_input, draft_output)
-
-            # Phase 3
-            status.text("✏️ Phase 3/3: Generating Revision...")
-            progress.progress(100)
-            final_output = revision_agent.revise(
-                user_input, draft_output, critique_output)
-
-            # cleanup
-            progress.empty()
-            status.empty()
-
-            # save results
-            st.session_state.results = {
-                "user_request": user_input,
-                "draft": draft_output,
-                "critique": critique_output,
-                "revision": final_output
-            }
-
-            st.success("✅ Done!")
-        except Exception as e:
-            error_msg = str(e)
-            st.error(f"❌ Error: {error_msg}")
-
-            # helpful error messages
-            if "timeout" in error_msg.lower() or "connection" in error_msg.lower():
-                st.warning("""
-                **Connection timeout!** 
-                - Try a faster model like 'mistral' or 'llama2:7b'
-                - Run: `ollama pull mistral` in terminal
-                - Or use OpenAI/Anthropic API for instant results
-                """)
-            elif "ollama" in error_msg.lower():
-                st.info("Make sure Ollama is running: `ollama serve`")
-
-            import traceback
-            with st.expander("🔍 See full error"):
-                st.text(traceback.format_exc())
-            return
+        if st.session_state.job_id:
+            st.warning("⏳ An audit is already running. Cancel it to start another.")
+        else:
+            # setup agents
+            with st.spinner("Setting up agents..."):
+                draft_agent, critique_agent, revision_agent = create_agents(
+                    provider, model)
+
+            if not draft_agent or not critique_agent or not revision_agent:
+                return
+
+            orchestrator = SAPGOrchestrator(
+                draft_agent, critique_agent, revision_agent,
+                early_exit=st.session_state.get("early_exit", False))
+            st.session_state.job_id = get_job_executor().submit(
+                recorded(job_function(orchestrator, user_input), store,
+                         provider=provider, model=model),
+                user_input)
+            st.session_state.job_error = None
+            st.session_state.results = None
+            st.query_params.pop("run", None)
+
+    if st.session_state.job_id:
+        show_job()
+
+    if st.session_state.job_error:
+        show_error(st.session_state.job_error)
 
     # show results if we have them
     if st.session_state.results:
         st.divider()
+        show_run_notes(st.session_state.results)
         show_results(st.session_state.results)
 
+    show_history(store, provider, model)
+    show_metrics(get_metrics_registry(), phase_routes(provider, model))
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# SAPG Batch Runner - Headless SAP audits over a JSONL/CSV file
+#
+# Usage: python batch_runner.py prompts.jsonl -o results.jsonl --workers 4
+#
+# Input rows need a "request" (or "user_request"/"prompt") field and may
+# carry an "id". Results are appended to the output file as they finish;
+# rerunning with the same output file skips requests that already succeeded
+# and resumes failed ones from the last phase that finished.
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+from metrics import LatencyStats
+from resilience import PhaseFailed
+
+REQUEST_FIELDS = ("request", "user_request", "prompt")
+PHASES = ("draft", "critique", "revision")
+
+
+def read_requests(path: str) -> Iterator[Dict[str, str]]:
+    """Stream {"id", "request"} records from a JSONL or CSV file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for index, row in enumerate(rows):
+            request = next((row[field] for field in REQUEST_FIELDS if row.get(field)), None)
+            if request is None:
+                continue
+            yield {"id": str(row.get("id") or index), "request": request}
+
+
+class Checkpoint:
+    """Where each request stood at the end of an earlier output file
+
+    One streaming pass keeps, per id, whether it ever succeeded and the
+    byte offset of its last result line. Only these go into a temporary
+    SQLite database, which lives on disk, so memory stays flat however
+    big the output file is. A failed request's finished phases are read
+    back from its line when that request comes up again.
+    """
+
+    def __init__(self, output_path: str):
+        self.path = output_path
+        # "" opens a private temporary database that spills to disk
+        self._db = sqlite3.connect("")
+        self._db.execute("CREATE TABLE last (id TEXT PRIMARY KEY, ok INTEGER, offset INTEGER)")
+        if os.path.exists(output_path):
+            self._db.executemany(
+                "INSERT INTO last VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE "
+                "SET ok = excluded.ok, offset = excluded.offset WHERE NOT last.ok",
+                self._scan())
+        self._db.commit()
+
+    def _scan(self) -> Iterator[tuple]:
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                start, offset = offset, offset + len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                yield record["id"], "error" not in record, start
+
+    def done(self, record_id: str) -> bool:
+        """The request already has a successful result"""
+        row = self._db.execute("SELECT ok FROM last WHERE id = ?", (record_id,)).fetchone()
+        return bool(row and row[0])
+
+    def partial(self, record_id: str) -> Optional[Dict[str, str]]:
+        """Finished phases of a request whose last attempt failed part-way"""
+        row = self._db.execute("SELECT offset FROM last WHERE id = ? AND NOT ok",
+                               (record_id,)).fetchone()
+        if row is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(row[0])
+            return json.loads(f.readline()).get("partial") or {}
+
+    def close(self):
+        self._db.close()
+
+
+def ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def audit(draft_agent, critique_agent, revision_agent, record: Dict[str, str],
+          partial: Optional[Dict[str, str]] = None) -> Dict:
+    """Run one request through all three phases, timing each
+
+    Phases already in partial are reused. A failure raises PhaseFailed
+    carrying the phases that finished, so a rerun resumes from there.
+    """
+    from agents import SAPGOrchestrator
+
+    timings = {}
+    running = {}
+
+    def lap():
+        if running:
+            timings[running["phase"]] = time.perf_counter() - running["start"]
+
+    def on_phase(phase):
+        lap()
+        running.update(phase=phase, start=time.perf_counter())
+
+    orchestrator = SAPGOrchestrator(draft_agent, critique_agent, revision_agent)
+    results = orchestrator.execute(
+        record["request"], on_phase=on_phase,
+        partial={phase: partial[phase] for phase in PHASES if phase in (partial or {})})
+    lap()
+    return {"id": record["id"], **results, "timings": timings}
+
+
+def run_batch(records, draft_agent, critique_agent, revision_agent, output_path: str,
+              workers: int = 4, resume: bool = True) -> Dict:
+    """Audit every record and append results to output_path
+
+    At most 2 * workers requests are in flight at once, so memory stays flat
+    no matter how large the input is.
+    """
+    checkpoint = Checkpoint(output_path) if resume else None
+    stats = {phase: LatencyStats() for phase in PHASES}
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    def collect(future, record_id, out):
+        try:
+            result = future.result()
+        except PhaseFailed as e:
+            result = {"id": record_id, "error": str(e.cause), "phase": e.phase,
+                      "partial": e.results}
+        except Exception as e:
+            result = {"id": record_id, "error": str(e)}
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        if "error" in result:
+            counts["failed"] += 1
+            return
+        counts["ok"] += 1
+        for phase, seconds in result["timings"].items():
+            stats[phase].add(seconds)
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        if resume and out.tell() and not ends_with_newline(output_path):
+            out.write("\n")  # start after a line torn by a crash
+        pending = {}
+        for record in records:
+            if checkpoint and checkpoint.done(record["id"]):
+                counts["skipped"] += 1
+                continue
+            future = pool.submit(audit, draft_agent, critique_agent, revision_agent, record,
+                                 checkpoint and checkpoint.partial(record["id"]))
+            pending[future] = record["id"]
+
+            if len(pending) >= workers * 2:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future, pending.pop(future), out)
+
+        for future in list(pending):
+            collect(future, pending.pop(future), out)
+    if checkpoint:
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    processed = counts["ok"] + counts["failed"]
+    return dict(counts, elapsed=elapsed,
+                requests_per_min=processed / elapsed * 60 if elapsed else 0.0,
+                latency={phase: stats[phase].summary() for phase in PHASES})
+
+
+def print_report(report: Dict):
+    print(f"\n✅ {report['ok']} ok, ❌ {report['failed']} failed, "
+          f"⏭️ {report['skipped']} skipped in {report['elapsed']:.1f}s "
+          f"({report['requests_per_min']:.1f} requests/min)")
+    print(f"{'phase':<10}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for phase, s in report["latency"].items():
+        print(f"{phase:<10}{s['count']:>8}{s['mean']:>9.2f}s{s['p50']:>9.2f}s"
+              f"{s['p95']:>9.2f}s{s['p99']:>9.2f}s")
+
+
+def print_cost_report(rows: List[Dict]):
+    print(f"\n{'phase':<10}{'model':<34}{'calls':>6}{'p50':>9}{'in':>7}{'out':>7}{'cost':>11}")
+    for row in rows:
+        cost = "?" if row["cost"] is None else f"${row['cost']:.4f}"
+        print(f"{row['phase']:<10}{row['model']:<34}{row['calls']:>6}"
+              f"{row['latency_p50']:>8.2f}s{row['prompt_tokens']:>7.0f}"
+              f"{row['completion_tokens']:>7.0f}{cost:>11}")
+
+
+def print_compaction_report(snapshot: Dict):
+    for phase, stats in snapshot.items():
+        before, after = stats.get("prompt_tokens_before"), stats.get("prompt_tokens_after")
+        if before and after:
+            counters = stats["counters"]
+            print(f"✂️ {phase}: {int(counters.get('compacted', 0))} of {before['count']} prompts "
+                  f"compacted, {int(counters.get('prompt_tokens_saved', 0)):,} tokens saved "
+                  f"(mean {before['mean']:.0f} → {after['mean']:.0f})")
+
+
+def main(argv: Optional[List[str]] = None):
+    from agents import DraftAgent, CritiqueAgent, MultiCritiqueAgent, RevisionAgent
+    from cache import ResponseCache
+    from compaction import PromptCompactor
+    from llm_factory import LLMFactory
+    from metrics import MetricsRegistry
+    from protocol import get_protocol_template
+    from resilience import RetryPolicy
+    from routing import PhaseModel, complete_routes, cost_report, load_routes
+    from singleflight import SingleFlight
+
+    parser = argparse.ArgumentParser(description="Run SAP audits over a JSONL/CSV file")
+    parser.add_argument("input", help="JSONL or CSV file of requests")
+    parser.add_argument("-o", "--output", default="results.jsonl")
+    parser.add_argument("--provider", default="ollama")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--cache", default=None, help="SQLite response cache path")
+    parser.add_argument("--multi-critic", action="store_true",
+                        help="run focused critics in parallel and merge their findings")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="attempts per LLM call on timeouts, 429s and 5xx errors")
+    parser.add_argument("--routes", default=None,
+                        help="JSON (or JSON file) giving a provider/model/temperature/"
+                             "max_tokens per phase; other phases use --provider/--model")
+    parser.add_argument("--prompt-budget", type=int, default=None,
+                        help="compact critique and revision prompts to about this many tokens")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="overwrite the output instead of resuming")
+    args = parser.parse_args(argv)
+
+    routes = complete_routes(load_routes(args.routes), PhaseModel(args.provider, args.model))
+    llms = LLMFactory.create_phase_llms(routes)
+    protocol = get_protocol_template()
+    cache = ResponseCache(path=args.cache) if args.cache else None
+
+    critic_class = MultiCritiqueAgent if args.multi_critic else CritiqueAgent
+    agents = (DraftAgent(llms["draft"], protocol, cache),
+              critic_class(llms["critique"], protocol, cache),
+              RevisionAgent(llms["revision"], protocol, cache))
+    retry = RetryPolicy(max_attempts=max(args.retries, 1))
+    # duplicate requests picked up by different workers share one run
+    flights = SingleFlight()
+    registry = MetricsRegistry()
+    for agent in agents:
+        agent.retry = retry
+        agent.flights = flights
+        agent.metrics = registry
+    if args.prompt_budget:
+        compactor = PromptCompactor(args.prompt_budget)
+        for agent in agents[1:]:
+            agent.compactor = compactor
+
+    report = run_batch(read_requests(args.input), *agents, args.output,
+                       workers=args.workers, resume=not args.no_resume)
+    print_report(report)
+    if args.routes:
+        print_cost_report(cost_report(registry, routes))
+    if args.prompt_budget:
+        print_compaction_report(registry.snapshot())
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-call overhead of rebuilding vs reusing the agent chain
+
+Run with: python benchmarks/bench_chain_cache.py --calls 2000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agents import CritiqueAgent  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from protocol import get_protocol_template  # noqa: E402
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    agent = CritiqueAgent(FakeChatModel(response="ok"), get_protocol_template())
+    inputs = {"user_request": "Create an ETL pipeline", "draft_output": "1. Extract"}
+
+    def rebuilt():
+        # what every call did before templates and chains were cached
+        agent.get_chain(agent.create_prompt_template()).invoke(inputs)
+
+    def cached():
+        agent.invoke(inputs)
+
+    build_only = per_call(lambda: agent.get_chain(agent.create_prompt_template()), args.calls)
+    before = per_call(rebuilt, args.calls)
+    after = per_call(cached, args.calls)
+
+    print(f"template + chain build: {build_only:8.1f} us/call")
+    print(f"invoke, rebuilt chain:  {before:8.1f} us/call")
+    print(f"invoke, cached chain:   {after:8.1f} us/call  ({before - after:.1f} us saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: run history page and lookup latency with many stored runs
+
+Run with: python benchmarks/bench_history.py --runs 200000 --lookups 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from history import RunStore  # noqa: E402
+
+MODELS = [("ollama", "mistral"), ("ollama", "phi"), ("openai", "gpt-4"),
+          ("anthropic", "claude-3-haiku-20240307")]
+PHASE_TEXT = ("1. Validate the input schema before loading.\n"
+              "2. Retry failed batches with exponential backoff.\n") * 40
+
+
+def make_run(rng, created):
+    provider, model = rng.choice(MODELS)
+    request = f"Build an ETL pipeline for dataset {rng.randrange(5000)}"
+    return {"results": {"user_request": request, "draft": PHASE_TEXT,
+                        "critique": "- [BLOCKER] no retries", "revision": PHASE_TEXT,
+                        "timings": {"draft": 3.0, "critique": 1.0, "revision": 3.0}},
+            "provider": provider, "model": model, "seconds": 7.0, "created": created}
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    fn()
+    samples.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "runs.sqlite")
+        store = RunStore(path)
+        start = time.perf_counter()
+        base = time.time() - args.runs
+        for offset in range(0, args.runs, 5000):
+            store.add_many([make_run(rng, base + i)
+                            for i in range(offset, min(offset + 5000, args.runs))])
+        fill = time.perf_counter() - start
+        size_mb = sum(os.path.getsize(os.path.join(tmp, name))
+                      for name in os.listdir(tmp)) / 2 ** 20
+
+        first, deep, by_model, by_request, window, get = [], [], [], [], [], []
+        for _ in range(args.lookups):
+            cursor = rng.randrange(1, args.runs)
+            timed(lambda: store.list(20), first)
+            timed(lambda: store.list(20, before=cursor), deep)
+            timed(lambda: store.list(20, before=cursor, provider="ollama", model="phi"),
+                  by_model)
+            timed(lambda: store.list(20, user_request=f"Build an ETL pipeline for dataset "
+                                                     f"{rng.randrange(5000)}"), by_request)
+            timed(lambda: store.list(20, since=base + cursor - 3600, until=base + cursor),
+                  window)
+            timed(lambda: store.get(cursor), get)
+        store.close()
+
+    print(f"runs: {args.runs:,}, file {size_mb:.0f} MB "
+          f"({size_mb * 2 ** 20 / args.runs / len(PHASE_TEXT * 2):.1%} of raw phase text), "
+          f"filled in {fill:.1f}s ({args.runs / fill:,.0f} runs/s)")
+    for name, samples in (("newest page", first), ("page at cursor", deep),
+                          ("page by model", by_model), ("page by request", by_request),
+                          ("page by hour", window), ("open run", get)):
+        print(f"{name:15s} p50 {np.percentile(samples, 50) * 1e3:7.3f} ms   "
+              f"p95 {np.percentile(samples, 95) * 1e3:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
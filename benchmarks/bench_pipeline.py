@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sequential vs pipelined SAP execution on a fake LLM
+
+Run with: python benchmarks/bench_pipeline.py --steps 8 --token-latency 0.005
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from protocol import get_protocol_template  # noqa: E402
+
+
+def make_agents(steps: int, words: int, token_latency: float):
+    """Build agents whose output length scales with the draft they are given"""
+    filler = " ".join(["word"] * words)
+    draft = "\n\n".join(f"{i}. STEP {filler}" for i in range(1, steps + 1))
+
+    def critique(prompt):
+        # one issue per draft step in the prompt
+        count = len(re.findall(r"\bSTEP\b", prompt.split("REQUEST:")[-1]))
+        return "\n".join(f"ISSUE {filler}" for _ in range(count))
+
+    def revise(prompt):
+        count = len(re.findall(r"\bISSUE\b", prompt.split("REQUEST:")[-1]))
+        return "\n".join(f"FIXED {filler}" for _ in range(count))
+
+    protocol = get_protocol_template()
+    return (
+        DraftAgent(FakeChatModel(response=draft, token_latency=token_latency), protocol),
+        CritiqueAgent(FakeChatModel(response=critique, token_latency=token_latency), protocol),
+        RevisionAgent(FakeChatModel(response=revise, token_latency=token_latency), protocol),
+    )
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, default=8)
+    parser.add_argument("--words", type=int, default=20)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    orchestrator = SAPGOrchestrator(*make_agents(args.steps, args.words, args.token_latency))
+    request = "Build a secure auth system with rate limiting"
+
+    sequential = timed(lambda: orchestrator.execute(request))
+    pipelined = timed(lambda: orchestrator.execute(request, pipelined=True))
+
+    print(f"steps={args.steps} words/step={args.words} token_latency={args.token_latency}s")
+    print(f"sequential: {sequential:.2f}s")
+    print(f"pipelined:  {pipelined:.2f}s  ({sequential / pipelined:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: semantic cache lookup latency with a large index
+
+Run with: python benchmarks/bench_semantic_cache.py --entries 100000 --lookups 1000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from semantic_cache import HashingEmbedder, SemanticCache  # noqa: E402
+
+VERBS = ["Build", "Create", "Design", "Write", "Implement", "Set up"]
+THINGS = ["auth system", "ETL pipeline", "REST API", "chat bot", "billing service",
+          "search index", "CI/CD pipeline", "data warehouse", "mobile app", "cron scheduler"]
+EXTRAS = ["with rate limiting", "for daily sales data", "in Python", "on Kubernetes",
+          "with retries", "for a todo app", "using Postgres", "with audit logs"]
+
+
+def make_request(rng):
+    return (f"{rng.choice(VERBS)} a {rng.choice(THINGS)} {rng.choice(EXTRAS)} "
+            f"for team {rng.randrange(10 ** 6)}")
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    cache = SemanticCache(HashingEmbedder(dim=args.dim), capacity=args.entries)
+
+    start = time.perf_counter()
+    for _ in range(args.entries):
+        cache.set(make_request(rng), "draft")
+    fill = time.perf_counter() - start
+
+    queries = [make_request(rng) for _ in range(args.lookups)]
+    embed, search, total = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        vector = cache.embedder(query)
+        embedded = time.perf_counter()
+        cache.index.search(vector, cache._scope(""), 5)
+        searched = time.perf_counter()
+        cache.get(query)
+        total.append(time.perf_counter() - searched)
+        embed.append(embedded - start)
+        search.append(searched - embedded)
+
+    index_mb = cache.index.vectors.nbytes / 2 ** 20
+    print(f"entries: {len(cache)}, dim {args.dim}, index {index_mb:.0f} MB, "
+          f"filled in {fill:.1f}s ({args.entries / fill:,.0f} inserts/s)")
+    for name, samples in (("embed", embed), ("top-5 search", search), ("get()", total)):
+        print(f"{name:13s} p50 {percentile(samples, 50):7.3f} ms   "
+              f"p95 {percentile(samples, 95):7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
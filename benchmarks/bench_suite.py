@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: the full SAP flow on a deterministic fake LLM
+
+Runs the Draft -> Critique -> Revision cycle in sequential, batched, async
+and streaming modes and reports throughput, p50/p95/p99 latency and peak
+memory. Results are saved as JSON so runs can be compared between commits.
+
+Run with: python benchmarks/bench_suite.py --requests 20 --output bench.json
+Compare:  python benchmarks/bench_suite.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator  # noqa: E402
+from fake_llm import FakeChatModel  # noqa: E402
+from metrics import LatencyStats  # noqa: E402
+from pipeline import ProviderLimits  # noqa: E402
+from protocol import get_protocol_template  # noqa: E402
+
+MODES = ("sequential", "batched", "async", "streaming")
+
+
+def make_orchestrator(args):
+    llm = FakeChatModel(
+        response="step detail fix check",
+        prefill_latency=args.prefill_latency,
+        token_latency=args.token_latency,
+        output_tokens=args.output_tokens,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    protocol = get_protocol_template()
+    return SAPGOrchestrator(DraftAgent(llm, protocol), CritiqueAgent(llm, protocol),
+                            RevisionAgent(llm, protocol))
+
+
+def run_sequential(orchestrator, requests, args, latency, ttft):
+    errors = 0
+    for request in requests:
+        start = time.perf_counter()
+        try:
+            orchestrator.execute(request)
+        except Exception:
+            errors += 1
+        latency.add(time.perf_counter() - start)
+    return errors
+
+
+def run_batched(orchestrator, requests, args, latency, ttft):
+    start = time.perf_counter()
+    results = orchestrator.execute_many(requests, max_concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start
+    # every request in a wave finishes when the slowest one does
+    for _ in results:
+        latency.add(elapsed)
+    return sum(1 for result in results if "error" in result)
+
+
+def run_async(orchestrator, requests, args, latency, ttft):
+    limits = ProviderLimits({"fake-chat": args.concurrency})
+
+    async def timed(request):
+        start = time.perf_counter()
+        try:
+            await orchestrator.aexecute(request, limits)
+            return 0
+        except Exception:
+            return 1
+        finally:
+            latency.add(time.perf_counter() - start)
+
+    async def run_all():
+        return await asyncio.gather(*(timed(request) for request in requests))
+
+    return sum(asyncio.run(run_all()))
+
+
+def run_streaming(orchestrator, requests, args, latency, ttft):
+    errors = 0
+    for request in requests:
+        start = time.perf_counter()
+        try:
+            draft = ""
+            for chunk in orchestrator.draft_agent.generate_stream(request):
+                if not draft:
+                    ttft.add(time.perf_counter() - start)
+                draft += chunk
+            critique = "".join(orchestrator.critique_agent.critique_stream(request, draft))
+            "".join(orchestrator.revision_agent.revise_stream(request, draft, critique))
+        except Exception:
+            errors += 1
+        latency.add(time.perf_counter() - start)
+    return errors
+
+
+RUNNERS = {"sequential": run_sequential, "batched": run_batched,
+           "async": run_async, "streaming": run_streaming}
+
+
+def bench_mode(mode, args):
+    orchestrator = make_orchestrator(args)
+    requests = [f"Benchmark request {i}" for i in range(args.requests)]
+    latency, ttft = LatencyStats(), LatencyStats()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    errors = RUNNERS[mode](orchestrator, requests, args, latency, ttft)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "requests": len(requests),
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "throughput_per_min": len(requests) / elapsed * 60 if elapsed else 0.0,
+        "latency_seconds": latency.summary(),
+        "peak_memory_kb": peak / 1024,
+    }
+    if ttft.count:
+        result["ttft_seconds"] = ttft.summary()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(report, baseline=None):
+    print(f"{'mode':<12}{'req/min':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'peak KB':>10}")
+    for mode, r in report["modes"].items():
+        lat = r["latency_seconds"]
+        print(f"{mode:<12}{r['throughput_per_min']:>10.1f}{lat['p50']:>8.3f}s{lat['p95']:>8.3f}s"
+              f"{lat['p99']:>8.3f}s{r['errors']:>8}{r['peak_memory_kb']:>10.0f}")
+        old = (baseline or {}).get("modes", {}).get(mode)
+        if old:
+            change = r["throughput_per_min"] / old["throughput_per_min"] - 1
+            p95 = lat["p95"] / old["latency_seconds"]["p95"] - 1 \
+                if old["latency_seconds"]["p95"] else 0.0
+            print(f"{'':<12}vs {baseline.get('commit') or 'baseline'}: "
+                  f"throughput {change:+.1%}, p95 {p95:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SAP benchmark suite")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--prefill-latency", type=float, default=0.02)
+    parser.add_argument("--token-latency", type=float, default=0.001)
+    parser.add_argument("--output-tokens", type=int, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON from an earlier run")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("output", "compare", "modes")}
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": config,
+        "modes": {mode: bench_mode(mode, args) for mode in args.modes},
+    }
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get("config") != config:
+            print("⚠️ baseline was run with a different config")
+    print_results(report, baseline)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nSaved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Response Cache - Content-addressed cache for agent phase outputs
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+# client settings that cap or shape an output, so they belong in the key
+LIMIT_FIELDS = ("max_tokens", "num_predict", "num_ctx")
+
+Limits = Tuple[Tuple[str, int], ...]
+
+
+def describe_llm(llm) -> Tuple[str, str, Optional[float], Limits]:
+    """Get (provider, model, temperature, output limits) for an LLM instance"""
+    provider = getattr(llm, "_llm_type", None) or type(llm).__name__
+    model = getattr(llm, "model", None) or getattr(llm, "model_name", None) or ""
+    temperature = getattr(llm, "temperature", None)
+    limits = tuple((name, getattr(llm, name)) for name in LIMIT_FIELDS
+                   if getattr(llm, name, None) is not None)
+    return str(provider), str(model), temperature, limits
+
+
+def make_key(provider: str, model: str, temperature: Optional[float], phase: str,
+             prompt: str, protocol_version: str, limits: Limits = ()) -> str:
+    """Hash everything that can change a phase output into a cache key"""
+    payload = json.dumps(
+        [provider, model, temperature, phase, prompt, protocol_version, list(limits)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache: in-memory LRU in front of an optional SQLite file
+
+    Entries older than ttl seconds are treated as missing. Each tier is
+    trimmed to its size limit, least recently used first.
+    """
+
+    def __init__(self, max_entries: int = 256, path: Optional[str] = None,
+                 max_disk_entries: int = 10000, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0,
+                       "memory_hits": 0, "disk_hits": 0, "evictions": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)")
+            self._db.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and not self._expired(row[1]):
+                    self._db.execute(
+                        "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, row[0], row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+                if row:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """Store a value in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (key, value, now, now))
+                count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                if count > self.max_disk_entries:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                        (count - self.max_disk_entries,))
+                    self._stats["evictions"] += count - self.max_disk_entries
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float):
+        # caller holds the lock
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters plus the current memory size"""
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
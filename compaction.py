@@ -0,0 +1,131 @@
+# Prompt Compaction - Keeps critique and revision prompts within a token budget
+
+import re
+import threading
+from typing import Any, Callable, Dict, Optional
+
+# a draft step starts with "3." / "3)" / "Step 3:" at the start of a line
+STEP_START = re.compile(r"^[ \t]*(?:step\s+)?(\d+)[.):]", re.IGNORECASE | re.MULTILINE)
+# how a critique points at a step: "step 3", "Step #3", "item 3"
+STEP_REFERENCE = re.compile(r"\b(?:step|item|point)\s*#?(\d+)", re.IGNORECASE)
+
+# only these inputs may be trimmed; the user request is always kept whole
+TRIMMABLE = ("draft_output", "critique")
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), no tokenizer needed"""
+    return (len(text) + 3) // 4
+
+
+def truncate_middle(text: str, max_tokens: int, count: Callable[[str], int] = approx_tokens) -> str:
+    """Cut the middle out of text so it fits about max_tokens
+
+    Two thirds of the kept text comes from the start and one third from
+    the end, with a marker saying how much was dropped.
+    """
+    total = count(text)
+    if total <= max_tokens:
+        return text
+    # leave ~10 tokens of room for the marker
+    keep = max(len(text) * max_tokens // total - 40, 0)
+    head = text[:keep * 2 // 3]
+    tail = text[len(text) - keep // 3:] if keep // 3 else ""
+    omitted = total - count(head) - count(tail)
+    return f"{head}\n[... {omitted} tokens omitted ...]\n{tail}"
+
+
+def select_referenced_steps(draft: str, critique: str) -> str:
+    """Keep only the numbered draft steps the critique refers to
+
+    Text before the first step is always kept. If the critique names no
+    steps, or the draft has none, the draft is returned unchanged.
+    """
+    referenced = set(STEP_REFERENCE.findall(critique))
+    starts = list(STEP_START.finditer(draft))
+    if not referenced or not starts:
+        return draft
+
+    kept = [draft[:starts[0].start()].rstrip()] if starts[0].start() else []
+    dropped = []
+    for i, match in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(draft)
+        if match.group(1) in referenced:
+            kept.append(draft[match.start():end].rstrip())
+        else:
+            dropped.append(match.group(1))
+
+    if dropped:
+        kept.append(f"[steps {', '.join(dropped)} omitted: not referenced by the critique]")
+    return "\n".join(kept)
+
+
+class PromptCompactor:
+    """Trims draft and critique inputs when a prompt would exceed its budget
+
+    Compaction is deterministic: the same inputs always give the same
+    prompt, so compacted prompts still hit the response cache. Sizes are
+    kept per phase here, and also go to a MetricsRegistry if one is passed.
+    """
+
+    def __init__(self, budget: int, count: Callable[[str], int] = approx_tokens):
+        self.budget = budget
+        self.count = count
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def compact(self, phase: str, inputs: Dict[str, Any], overhead: int = 0,
+                metrics=None) -> Dict[str, Any]:
+        """Return inputs that fit the budget; overhead is the fixed prompt text"""
+        before = overhead + sum(self.count(str(value)) for value in inputs.values())
+        compacted = dict(inputs)
+
+        if before > self.budget:
+            if "critique" in compacted and "draft_output" in compacted:
+                compacted["draft_output"] = select_referenced_steps(
+                    compacted["draft_output"], compacted["critique"])
+
+            fixed = overhead + sum(self.count(str(value)) for key, value in compacted.items()
+                                   if key not in TRIMMABLE)
+            self._fit(compacted, max(self.budget - fixed, 0))
+
+        after = overhead + sum(self.count(str(value)) for value in compacted.values())
+        self._record(phase, before, after)
+        if metrics is not None:
+            metrics.record(phase, prompt_tokens_before=before, prompt_tokens_after=after)
+            if after < before:
+                metrics.increment(phase, "compacted")
+                metrics.increment(phase, "prompt_tokens_saved", before - after)
+        return compacted
+
+    def _fit(self, inputs: Dict[str, Any], available: int):
+        # critique gets at least half the room, the draft gets the rest
+        sizes = {key: self.count(inputs[key]) for key in TRIMMABLE if key in inputs}
+        if sum(sizes.values()) <= available:
+            return
+        if "critique" in sizes:
+            critique_room = available
+            if "draft_output" in sizes:
+                critique_room = min(sizes["critique"],
+                                    max(available // 2, available - sizes["draft_output"]))
+            inputs["critique"] = truncate_middle(inputs["critique"], critique_room, self.count)
+            available -= self.count(inputs["critique"])
+        if "draft_output" in sizes:
+            inputs["draft_output"] = truncate_middle(
+                inputs["draft_output"], max(available, 0), self.count)
+
+    def _record(self, phase: str, before: int, after: int):
+        with self._lock:
+            stats = self._stats.setdefault(
+                phase, {"calls": 0, "compacted": 0, "tokens_before": 0, "tokens_after": 0})
+            stats["calls"] += 1
+            stats["compacted"] += int(after < before)
+            stats["tokens_before"] += before
+            stats["tokens_after"] += after
+
+    def stats(self, phase: Optional[str] = None) -> Dict:
+        """Prompt sizes and savings, per phase"""
+        with self._lock:
+            report = {name: dict(s, saved=s["tokens_before"] - s["tokens_after"])
+                      for name, s in self._stats.items()}
+        return report.get(phase, {}) if phase else report
@@ -0,0 +1,98 @@
+# Fake LLM - Deterministic chat model for offline tests and benchmarks
+
+import asyncio
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into word-sized tokens, keeping the whitespace"""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure"""
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that replies with a fixed response, token by token
+
+    response can also be a function of the prompt text, so benchmarks can
+    make the output length depend on the input. output_tokens repeats or
+    cuts the response to a fixed length, and failure_rate makes a seeded
+    share of calls raise FakeLLMError before any token is produced.
+    """
+
+    response: Union[str, Callable[[str], str]] = "Mock LLM Response"
+    token_latency: float = 0.0  # seconds slept per output token
+    prefill_latency: float = 0.0  # seconds slept before the first token
+    output_tokens: Optional[int] = None
+    failure_rate: float = 0.0
+    seed: int = 0
+
+    _rng: Optional[random.Random] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def respond(self, messages: List[BaseMessage]) -> str:
+        """Work out the reply text for a prompt, or raise a simulated failure"""
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise FakeLLMError("simulated provider failure")
+        if callable(self.response):
+            prompt = "\n".join(str(m.content) for m in messages)
+            text = self.response(prompt)
+        else:
+            text = self.response
+        if self.output_tokens is not None:
+            # every token carries its leading space so repeats stay separate
+            tokens = [t if t[:1].isspace() else " " + t for t in split_tokens(text)] or [" token"]
+            repeats = self.output_tokens // len(tokens) + 1
+            text = "".join((tokens * repeats)[:self.output_tokens]).lstrip()
+        return text
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self.respond(messages)
+        time.sleep(self.prefill_latency + self.token_latency * len(split_tokens(text)))
+        message = AIMessage(content=text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text = self.respond(messages)
+        time.sleep(self.prefill_latency)
+        for token in split_tokens(text):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self.respond(messages)
+        await asyncio.sleep(self.prefill_latency + self.token_latency * len(split_tokens(text)))
+        message = AIMessage(content=text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text = self.respond(messages)
+        await asyncio.sleep(self.prefill_latency)
+        for token in split_tokens(text):
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
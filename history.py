@@ -0,0 +1,163 @@
+# Run History - Durable, indexed store of finished SAP runs
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+# list views show this much of the request; the full text is in the payload
+TITLE_CHARS = 120
+
+
+def request_hash(user_request: str) -> str:
+    """Key for "the same request", ignoring surrounding whitespace"""
+    return hashlib.sha256(user_request.strip().encode("utf-8")).hexdigest()
+
+
+def pack(data: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(data).encode("utf-8"), 6)
+
+
+def unpack(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def routes_key(routes: Optional[Dict[str, str]]) -> Optional[str]:
+    """Column value for a run's provider:model per phase"""
+    return json.dumps(routes, sort_keys=True) if routes else None
+
+
+class RunStore:
+    """Append-only SQLite store of finished runs
+
+    The database runs in WAL mode, so readers don't block the writer.
+    Phase outputs and timings are kept in one zlib-compressed payload that
+    only get() reads. Listing touches just the small indexed columns and
+    pages by run id (keyset, not OFFSET). Listing a page or opening a run
+    costs the same with a hundred runs as with hundreds of thousands.
+    """
+
+    def __init__(self, path: str = ".sapg_history.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, "
+            "request_hash TEXT NOT NULL, title TEXT NOT NULL, provider TEXT, model TEXT, "
+            "status TEXT NOT NULL, seconds REAL, payload BLOB NOT NULL, routes TEXT)")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(runs)")]
+        if "routes" not in columns:
+            # databases from before routes were saved
+            self._db.execute("ALTER TABLE runs ADD COLUMN routes TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_request ON runs (request_hash, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_model ON runs (provider, model, id)")
+        self._db.commit()
+
+    def add(self, results: Dict[str, Any], provider: Optional[str] = None,
+            model: Optional[str] = None, seconds: Optional[float] = None,
+            status: str = "done", created: Optional[float] = None,
+            routes: Optional[Dict[str, str]] = None) -> int:
+        """Record a run (the orchestrator's results dict) and return its id
+
+        routes is the provider:model that produced each phase, when it
+        can differ from the run's provider and model.
+        """
+        user_request = results.get("user_request", "")
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO runs (created, request_hash, title, provider, model, status, "
+                "seconds, payload, routes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (created if created is not None else time.time(), request_hash(user_request),
+                 " ".join(user_request.split())[:TITLE_CHARS], provider, model, status,
+                 seconds, pack(results), routes_key(routes)))
+            self._db.commit()
+            return cursor.lastrowid
+
+    def add_many(self, runs: List[Dict[str, Any]]) -> int:
+        """Record many runs in one transaction; each item holds add()'s arguments"""
+        rows = [(run.get("created") or time.time(),
+                 request_hash(run["results"].get("user_request", "")),
+                 " ".join(run["results"].get("user_request", "").split())[:TITLE_CHARS],
+                 run.get("provider"), run.get("model"), run.get("status", "done"),
+                 run.get("seconds"), pack(run["results"]), routes_key(run.get("routes")))
+                for run in runs]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO runs (created, request_hash, title, provider, model, status, "
+                "seconds, payload, routes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+        return len(rows)
+
+    def get(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """A run's summary plus its "results", or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, created, title, provider, model, status, seconds, routes, payload "
+                "FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = self._summary(row[:8])
+        run["results"] = unpack(row[8])
+        return run
+
+    @staticmethod
+    def _summary(row) -> Dict[str, Any]:
+        run = dict(zip(("id", "created", "title", "provider", "model", "status", "seconds"),
+                       row))
+        run["routes"] = json.loads(row[7]) if row[7] else None
+        return run
+
+    def list(self, limit: int = 20, before: Optional[int] = None,
+             user_request: Optional[str] = None, provider: Optional[str] = None,
+             model: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None,
+             routes: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """Newest runs first, without their outputs
+
+        Pass the last id of a page as `before` to get the next page.
+        since/until filter on the time index, so backfilled runs whose
+        `created` is older than their id still show up in their window.
+        """
+        where, params = [], []
+        for clause, value in (("id < ?", before), ("request_hash = ?",
+                              request_hash(user_request) if user_request else None),
+                              ("provider = ?", provider), ("model = ?", model),
+                              ("created >= ?", since), ("created < ?", until),
+                              ("routes = ?", routes_key(routes))):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        sql = "SELECT id, created, title, provider, model, status, seconds, routes FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit]).fetchall()
+        return [self._summary(row) for row in rows]
+
+    def latest(self, user_request: str, provider: Optional[str] = None,
+               model: Optional[str] = None,
+               routes: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """Summary of the newest finished run of this request, if any"""
+        runs = self.list(1, user_request=user_request, provider=provider, model=model,
+                         routes=routes)
+        return runs[0] if runs else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            # MAX(id) is an index lookup; COUNT(*) would scan every run
+            last = self._db.execute("SELECT MAX(id) FROM runs").fetchone()[0]
+        return {"runs": last or 0, "path": self.path}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
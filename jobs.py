@@ -0,0 +1,262 @@
+# SAPG Jobs - Background SAP runs with a job registry the UI can poll
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from agents import SAPGOrchestrator
+from cache import describe_llm
+from history import RunStore
+from ratelimit import LLM_TYPES
+from resilience import PhaseFailed, RunCancelled
+from routing import PHASES
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class JobCancelled(RunCancelled):
+    """Raised inside a job function once its job has been cancelled"""
+
+
+class Job:
+    """One background run: its status, current phase and outputs so far
+
+    Job functions report progress through put/append; readers only ever
+    see copies via snapshot(), so they never race the worker thread.
+    """
+
+    def __init__(self, job_id: str, user_request: str, meta: Dict[str, Any]):
+        self.id = job_id
+        self.user_request = user_request
+        self.meta = meta
+        self.status = "queued"
+        self.phase: Optional[str] = None
+        self.outputs: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.partial: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.future = None
+        self._phase_started: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"job {self.id} was cancelled")
+
+    def start_phase(self, phase: str):
+        self.check_cancelled()
+        with self._lock:
+            self._end_phase()
+            self.phase = phase
+            self.outputs[phase] = ""
+            self._phase_started = time.perf_counter()
+
+    def end_phase(self):
+        """Stop timing the current phase; seconds per phase go to timings"""
+        with self._lock:
+            self._end_phase()
+
+    def _end_phase(self):
+        if self.phase is not None and self._phase_started is not None:
+            self.timings[self.phase] = (self.timings.get(self.phase, 0.0) +
+                                        time.perf_counter() - self._phase_started)
+        self._phase_started = None
+
+    def append(self, phase: str, text: str):
+        """Add streamed text to a phase's output"""
+        self.check_cancelled()
+        with self._lock:
+            self.outputs[phase] = self.outputs.get(phase, "") + text
+
+    def put(self, phase: str, text: str):
+        """Replace a phase's output, e.g. once the final text is known"""
+        with self._lock:
+            self.outputs[phase] = text
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished or time.time()
+            return {
+                "id": self.id,
+                "user_request": self.user_request,
+                "meta": dict(self.meta),
+                "status": self.status,
+                "phase": self.phase,
+                "outputs": dict(self.outputs),
+                "timings": dict(self.timings),
+                "result": self.result,
+                "partial": self.partial,
+                "error": self.error,
+                "created": self.created,
+                "elapsed": end - (self.started or end),
+            }
+
+
+class JobExecutor:
+    """Thread pool plus a registry of jobs that outlives page reruns
+
+    submit() returns a job id straight away; the work runs on the pool,
+    not on the caller's thread. Finished jobs are kept (oldest dropped
+    first past max_finished) so results survive reruns and reconnects.
+    Threads rather than processes: the work is waiting on LLM servers,
+    and agents hold clients that cannot be pickled.
+    """
+
+    def __init__(self, max_workers: int = 4, max_finished: int = 200):
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sapg-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[[Job], Dict[str, Any]], user_request: str, **meta) -> str:
+        """Queue fn(job) and return the new job's id"""
+        job = Job(uuid.uuid4().hex[:12], user_request, meta)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, fn)
+        return job.id
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]):
+        if job.cancelled:
+            with job._lock:
+                job.status = "cancelled"
+                job.finished = time.time()
+            return
+        with job._lock:
+            job.status = "running"
+            job.started = time.time()
+        status, result, partial, error = "done", None, None, None
+        try:
+            result = fn(job)
+        except RunCancelled:
+            status = "cancelled"
+        except PhaseFailed as e:
+            status, partial, error = "failed", e.results, str(e.cause)
+        except Exception as e:
+            status, error = "failed", str(e)
+        with job._lock:
+            job._end_phase()
+            job.status = status
+            job.result = result
+            job.partial = partial
+            job.error = error
+            job.finished = time.time()
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items()
+                        if job.status not in ACTIVE_STATES]
+            for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job, or None if it is unknown or was evicted"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a job to stop; it ends at its next progress report"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.status not in ACTIVE_STATES:
+            return False
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            with job._lock:
+                job.status = "cancelled"
+                job.finished = time.time()
+        return True
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Snapshots of every known job, newest first"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot() for job in reversed(jobs)]
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(job.status in ACTIVE_STATES for job in self._jobs.values())
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job._cancel.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def recorded(fn: Callable[[Job], Dict[str, Any]], store: RunStore,
+             **meta) -> Callable[[Job], Dict[str, Any]]:
+    """Job function that also saves each finished run to the run history
+
+    The run is saved on the worker, so it is kept even if nobody is
+    watching when it ends. The results gain its "run_id" and the
+    seconds each phase took. Runs whose results carry "routes" are saved
+    under them too.
+    """
+    def run(job: Job) -> Dict[str, Any]:
+        results = fn(job)
+        job.end_phase()
+        results = dict(results, timings=dict(job.timings))
+        started = job.started or job.created
+        run_id = store.add(results, seconds=time.time() - started,
+                           routes=results.get("routes"), **meta)
+        return dict(results, run_id=run_id)
+    return run
+
+
+def llm_label(llm) -> str:
+    """provider:model of an LLM client, as saved with each run"""
+    provider, model = describe_llm(llm)[:2]
+    return f"{LLM_TYPES.get(provider, provider)}:{model or 'default'}"
+
+
+def run_routes(orchestrator: SAPGOrchestrator,
+               results: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """provider:model per phase of the orchestrator's runs
+
+    With results, a speculative draft that came from the fast model is
+    credited to it.
+    """
+    routes = {"draft": llm_label(orchestrator.draft_agent.llm),
+              "critique": llm_label(orchestrator.critique_agent.llm),
+              "revision": llm_label(orchestrator.revision_agent.llm)}
+    if (results or {}).get("draft_source") == "fast":
+        routes["draft"] = llm_label(orchestrator.draft_agent.fast_agent.llm)
+    return routes
+
+
+def audit_job(orchestrator: SAPGOrchestrator, partial: Optional[Dict[str, Any]] = None,
+              **options) -> Callable[[Job], Dict[str, Any]]:
+    """Job function running orchestrator.execute with the job as its progress
+
+    Each phase streams into the job's outputs and Cancel stops the run at
+    the next phase or chunk, in every mode. options go to execute
+    (pipelined, max_rounds and its budgets). Phases already in partial
+    are shown straight away and not run again; a failure raises
+    PhaseFailed so the job keeps the phases that finished for a later
+    resume. The results' "routes" say which model produced each phase.
+    """
+    def run(job: Job) -> Dict[str, Any]:
+        for phase in PHASES:
+            if phase in (partial or {}):
+                job.put(phase, partial[phase])
+        results = orchestrator.execute(job.user_request, partial=partial,
+                                       on_phase=job.start_phase, on_token=job.append,
+                                       cancel=lambda: job.cancelled, **options)
+        return dict(results, routes=run_routes(orchestrator, results))
+    return run
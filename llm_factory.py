@@ -1,11 +1,29 @@
 # LLM Factory - Creates LLM instances from different providers
 
 import os
-from typing import Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+from ratelimit import RATE_LIMITS, Governor
+from router import RoutedChatModel
+from routing import PhaseModel
+from warmup import DEFAULT_KEEP_ALIVE, FirstTokenTracker, parse_keep_alive, warm_up
+
 load_dotenv()
 
+# idle HTTP connections stay open this long between phases and reruns
+KEEPALIVE_SECONDS = 600
+
+# cheap model raced against the configured one when drafting speculatively
+FAST_MODELS = {"ollama": "phi", "openai": "gpt-3.5-turbo",
+               "anthropic": "claude-3-haiku-20240307"}
+
+# providers tried in this order when failing over
+FAILOVER_ORDER = ("ollama", "openai", "anthropic")
+# seconds to wait for a first token; a cold local model loads slowly
+FIRST_TOKEN_TIMEOUTS = {"ollama": 120.0, "openai": 30.0, "anthropic": 30.0}
+
 # try importing the different providers
 try:
     from langchain_openai import ChatOpenAI
@@ -22,21 +40,88 @@ try:
 except ImportError:
     ChatAnthropic = None
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# Ollama runtime options: a context sized for the SAP prompts (protocol,
+# request, draft and critique) keeps the KV cache small; unset = Ollama's default
+OLLAMA_OPTIONS = {
+    "num_ctx": _env_int("OLLAMA_NUM_CTX") or 4096,
+    "num_predict": _env_int("OLLAMA_NUM_PREDICT"),
+    "num_thread": _env_int("OLLAMA_NUM_THREAD"),
+}
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE") or DEFAULT_KEEP_ALIVE)
+
+
+def keepalive_limits():
+    """httpx connection limits that keep idle connections around"""
+    if httpx is None:
+        return None
+    return httpx.Limits(max_keepalive_connections=10, keepalive_expiry=KEEPALIVE_SECONDS)
+
+
+def close_client(llm):
+    """Close the HTTP clients held by an LLM instance, if any"""
+    for attr in ("_client", "root_client", "http_client"):
+        client = getattr(llm, attr, None)
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
 
 class LLMFactory:
-    """Factory for creating LLMs"""
+    """Factory for creating LLMs
+
+    create_llm hands out pooled clients: the same provider, model and
+    settings always get the same instance, so HTTP connections and model
+    warm-up are reused. Use evict/close_all to drop them.
+    """
+
+    _pool: Dict[Tuple, Any] = {}
+    _pool_lock = threading.Lock()
+    _governors: Dict[Tuple, Governor] = {}
+    _trackers: Dict[Tuple, FirstTokenTracker] = {}
+    _limits: Dict[Tuple, Dict[str, Any]] = {}
+    _metrics = None
 
     @staticmethod
-    def create_ollama(model_name: str = "llama2"):
+    def create_ollama(model_name: str = "llama2", **settings):
         """Create Ollama LLM with timeout"""
         if ChatOllama is None:
             raise ImportError(
                 "langchain-ollama not installed. Run: pip install langchain-ollama")
         # lower temp for faster, more focused responses
-        return ChatOllama(model=model_name, temperature=0.3, timeout=300)
+        params = {"temperature": 0.3, "timeout": 300, "keep_alive": OLLAMA_KEEP_ALIVE}
+        # an option passed as None is left to Ollama's default
+        params.update(LLMFactory.ollama_options(**settings))
+        settings = {name: value for name, value in settings.items()
+                    if name not in OLLAMA_OPTIONS}
+        limits = keepalive_limits()
+        if limits is not None:
+            params["client_kwargs"] = {"limits": limits}
+        params.update(settings)
+        return ChatOllama(model=model_name, **params)
+
+    @staticmethod
+    def ollama_options(**settings) -> Dict[str, Any]:
+        """Runtime options a client built with these settings sends to Ollama"""
+        options = dict(OLLAMA_OPTIONS)
+        options.update({name: value for name, value in settings.items() if name in OLLAMA_OPTIONS})
+        return {name: value for name, value in options.items() if value is not None}
 
     @staticmethod
-    def create_openai(model_name: str = "gpt-3.5-turbo"):
+    def create_openai(model_name: str = "gpt-3.5-turbo", **settings):
         """Create OpenAI LLM"""
         if ChatOpenAI is None:
             raise ImportError(
@@ -46,10 +131,15 @@ class LLMFactory:
             raise ValueError("OPENAI_API_KEY not found. Set it in .env file.")
         # set the key in environment
         os.environ["OPENAI_API_KEY"] = api_key
-        return ChatOpenAI(model=model_name, temperature=0.7)
+        params = {"temperature": 0.7}
+        limits = keepalive_limits()
+        if limits is not None:
+            params["http_client"] = httpx.Client(limits=limits)
+        params.update(settings)
+        return ChatOpenAI(model=model_name, **params)
 
     @staticmethod
-    def create_anthropic(model_name: str = "claude-3-sonnet-20240229"):
+    def create_anthropic(model_name: str = "claude-3-sonnet-20240229", **settings):
         """Create Anthropic LLM"""
         if ChatAnthropic is None:
             raise ImportError(
@@ -60,23 +150,217 @@ class LLMFactory:
                 "ANTHROPIC_API_KEY not found. Set it in .env file.")
         # set the key in environment
         os.environ["ANTHROPIC_API_KEY"] = api_key
-        return ChatAnthropic(model=model_name, temperature=0.7)
+        params = {"temperature": 0.7}
+        params.update(settings)
+        return ChatAnthropic(model=model_name, **params)
 
     @staticmethod
-    def create_llm(provider: str, model_name: Optional[str] = None):
-        """Create an LLM based on provider"""
+    def build_llm(provider: str, model_name: Optional[str] = None, **settings):
+        """Create a new, unpooled LLM based on provider"""
         if provider == "ollama":
             model_name = model_name or "llama2"
-            return LLMFactory.create_ollama(model_name)
+            return LLMFactory.create_ollama(model_name, **settings)
         elif provider == "openai":
             model_name = model_name or "gpt-3.5-turbo"
-            return LLMFactory.create_openai(model_name)
+            return LLMFactory.create_openai(model_name, **settings)
         elif provider == "anthropic":
             model_name = model_name or "claude-3-sonnet-20240229"
-            return LLMFactory.create_anthropic(model_name)
+            return LLMFactory.create_anthropic(model_name, **settings)
         else:
             raise ValueError(f"Unknown provider: {provider}")
 
+    @staticmethod
+    def pool_key(provider: str, model_name: Optional[str] = None, **settings) -> Tuple:
+        return (provider, model_name, repr(sorted(settings.items())))
+
+    @staticmethod
+    def set_rate_limits(provider: str, model_name: Optional[str] = None, **limits):
+        """Override rpm/tpm/max_in_flight for a provider, or one of its models
+
+        Applies to clients created afterwards; evict existing ones to apply.
+        """
+        with LLMFactory._pool_lock:
+            LLMFactory._limits[(provider, model_name)] = limits
+            LLMFactory._governors.pop((provider, model_name), None)
+
+    @staticmethod
+    def use_metrics(registry):
+        """Record limiter queue waits in this MetricsRegistry"""
+        with LLMFactory._pool_lock:
+            LLMFactory._metrics = registry
+            for governor in LLMFactory._governors.values():
+                governor.registry = registry
+            for tracker in LLMFactory._trackers.values():
+                tracker.registry = registry
+
+    @staticmethod
+    def governor(provider: str, model_name: Optional[str] = None) -> Governor:
+        """The limiter shared by every client of this provider/model"""
+        with LLMFactory._pool_lock:
+            return LLMFactory._governor(provider, model_name)
+
+    @staticmethod
+    def _governor(provider: str, model_name: Optional[str]) -> Governor:
+        # caller holds _pool_lock
+        key = (provider, model_name)
+        if key not in LLMFactory._governors:
+            limits = LLMFactory._limits.get(key) or LLMFactory._limits.get((provider, None)) \
+                or RATE_LIMITS.get(provider, {})
+            LLMFactory._governors[key] = Governor(
+                name=f"{provider}:{model_name or 'default'}", registry=LLMFactory._metrics,
+                **limits)
+        return LLMFactory._governors[key]
+
+    @staticmethod
+    def first_token_tracker(provider: str, model_name: Optional[str] = None) -> FirstTokenTracker:
+        """Cold vs warm time-to-first-token of this provider/model's clients"""
+        with LLMFactory._pool_lock:
+            return LLMFactory._tracker(provider, model_name)
+
+    @staticmethod
+    def _tracker(provider: str, model_name: Optional[str]) -> FirstTokenTracker:
+        # caller holds _pool_lock
+        key = (provider, model_name)
+        if key not in LLMFactory._trackers:
+            LLMFactory._trackers[key] = FirstTokenTracker(
+                f"{provider}:{model_name or 'default'}", LLMFactory._metrics)
+        return LLMFactory._trackers[key]
+
+    @staticmethod
+    def warm_up(model_name: str = "llama2", base_url: Optional[str] = None,
+                keep_alive: Optional[str] = None, timeout: float = 300.0,
+                **settings) -> Dict[str, Any]:
+        """Load an Ollama model into memory before the first request needs it
+
+        settings are create_llm's; the load uses the same runtime options
+        as that pooled client, so its first request doesn't reload the
+        model. The load time is recorded as that model's load_seconds.
+        """
+        result = warm_up(model_name, base_url, keep_alive or OLLAMA_KEEP_ALIVE, timeout,
+                         LLMFactory.ollama_options(**settings))
+        LLMFactory.first_token_tracker("ollama", model_name).record_load(result["seconds"])
+        return result
+
+    @staticmethod
+    def limiter_stats() -> Dict[str, Dict[str, Any]]:
+        with LLMFactory._pool_lock:
+            governors = list(LLMFactory._governors.values())
+        return {governor.name: governor.stats() for governor in governors}
+
+    @staticmethod
+    def create_llm(provider: str, model_name: Optional[str] = None, **settings):
+        """Get the pooled LLM for provider/model/settings, creating it once
+
+        Pooled clients share their provider/model's Governor, which queues
+        calls to stay under its request, token and concurrency limits.
+        Clients are built outside the pool lock, so a slow constructor
+        never holds up lookups of other models.
+        """
+        key = LLMFactory.pool_key(provider, model_name, **settings)
+        with LLMFactory._pool_lock:
+            llm = LLMFactory._pool.get(key)
+        if llm is not None:
+            return llm
+
+        governed = dict(settings)
+        if "rate_limiter" not in governed:
+            governor = LLMFactory.governor(provider, model_name)
+            governed["rate_limiter"] = governor
+            governed["callbacks"] = list(governed.get("callbacks") or []) + [governor]
+        if provider == "ollama":
+            # cold starts are an Ollama thing: hosted APIs keep models loaded
+            governed["callbacks"] = list(governed.get("callbacks") or []) + [
+                LLMFactory.first_token_tracker(provider, model_name)]
+        built = LLMFactory.build_llm(provider, model_name, **governed)
+        with LLMFactory._pool_lock:
+            llm = LLMFactory._pool.setdefault(key, built)
+        if llm is not built:
+            close_client(built)  # another thread pooled one first
+        return llm
+
+    @staticmethod
+    def create_phase_llms(routes: Dict[str, PhaseModel],
+                          provider_settings: Optional[Dict[str, Dict[str, Any]]] = None
+                          ) -> Dict[str, Any]:
+        """Pooled LLM per phase, e.g. a small model for the critique
+
+        provider_settings adds settings to every route of that provider
+        (such as Ollama's num_ctx); a route's own settings win.
+        """
+        provider_settings = provider_settings or {}
+        return {phase: LLMFactory.create_llm(
+                    route.provider, route.model,
+                    **dict(provider_settings.get(route.provider, {}), **route.settings()))
+                for phase, route in routes.items()}
+
+    @staticmethod
+    def create_speculative_pair(provider: str, model_name: Optional[str] = None,
+                                fast_model: Optional[str] = None, **settings) -> Tuple:
+        """Pooled (configured, fast) LLMs for speculative drafting"""
+        fast_model = fast_model or FAST_MODELS.get(provider)
+        return (LLMFactory.create_llm(provider, model_name, **settings),
+                LLMFactory.create_llm(provider, fast_model, **settings))
+
+    @staticmethod
+    def create_routed(providers=FAILOVER_ORDER, models: Optional[Dict[str, str]] = None,
+                      hedge: bool = False, timeouts: Optional[Dict[str, float]] = None,
+                      **settings) -> RoutedChatModel:
+        """Pooled failover LLM over every provider in the list that can be built
+
+        Providers whose package or API key is missing are left out of the
+        route. Members are the normal pooled clients, so they share
+        connections with create_llm.
+        """
+        models = models or {}
+        timeouts = dict(FIRST_TOKEN_TIMEOUTS, **(timeouts or {}))
+        key = ("routed", tuple(providers), repr(sorted(models.items())), hedge,
+               repr(sorted(timeouts.items())), repr(sorted(settings.items())))
+        with LLMFactory._pool_lock:
+            routed = LLMFactory._pool.get(key)
+        if routed is not None:
+            return routed
+
+        members = []
+        for provider in providers:
+            try:
+                members.append(
+                    (provider, LLMFactory.create_llm(provider, models.get(provider), **settings)))
+            except (ImportError, ValueError):
+                continue
+        if not members:
+            raise ValueError(f"No provider in {list(providers)} is available")
+
+        routed = RoutedChatModel(providers=members, timeouts=timeouts, hedge=hedge)
+        with LLMFactory._pool_lock:
+            return LLMFactory._pool.setdefault(key, routed)
+
+    @staticmethod
+    def evict(provider: str, model_name: Optional[str] = None, **settings) -> bool:
+        """Drop a pooled LLM and close its connections"""
+        key = LLMFactory.pool_key(provider, model_name, **settings)
+        with LLMFactory._pool_lock:
+            llm = LLMFactory._pool.pop(key, None)
+        if llm is None:
+            return False
+        close_client(llm)
+        return True
+
+    @staticmethod
+    def close_all():
+        """Drop every pooled LLM and its limiters"""
+        with LLMFactory._pool_lock:
+            clients = list(LLMFactory._pool.values())
+            LLMFactory._pool.clear()
+            LLMFactory._governors.clear()
+            LLMFactory._trackers.clear()
+        for llm in clients:
+            close_client(llm)
+
+    @staticmethod
+    def pool_size() -> int:
+        with LLMFactory._pool_lock:
+            return len(LLMFactory._pool)
+
     @staticmethod
     def get_available_providers():
         """Get list of available providers"""
@@ -0,0 +1,205 @@
+# SAPG Metrics - Per-phase latency, token and throughput instrumentation
+
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from compaction import approx_tokens
+
+# per-call measurements recorded for every phase (and, per model, limiter
+# waits and cold/warm first-token times)
+FIELDS = ("queue_seconds", "ttft_seconds", "latency_seconds",
+          "prompt_tokens", "completion_tokens", "tokens_per_second", "limiter_wait_seconds",
+          "cold_ttft_seconds", "warm_ttft_seconds", "load_seconds")
+
+
+class LatencyStats:
+    """Count, mean and percentiles over a fixed-size reservoir sample"""
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.samples: List[float] = []
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.size:
+                self.samples[slot] = value
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """In-process store of per-phase measurements and counters"""
+
+    def __init__(self, reservoir_size: int = 2000):
+        self.reservoir_size = reservoir_size
+        self._stats: Dict[str, Dict[str, LatencyStats]] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, **values: float):
+        """Add one sample per named measurement, e.g. latency_seconds=1.2"""
+        with self._lock:
+            stats = self._stats.setdefault(phase, {})
+            for name, value in values.items():
+                if value is None:
+                    continue
+                if name not in stats:
+                    stats[name] = LatencyStats(self.reservoir_size)
+                stats[name].add(value)
+
+    def increment(self, phase: str, name: str, amount: float = 1):
+        """Bump a counter such as cache_hits or errors"""
+        with self._lock:
+            counters = self._counters.setdefault(phase, {})
+            counters[name] = counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries and counters per phase"""
+        with self._lock:
+            phases = set(self._stats) | set(self._counters)
+            return {
+                phase: {
+                    "counters": dict(self._counters.get(phase, {})),
+                    **{name: s.summary() for name, s in self._stats.get(phase, {}).items()},
+                }
+                for phase in sorted(phases)
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "sapg") -> str:
+        """Prometheus text exposition: a summary per measurement, a counter per count"""
+        lines = []
+        snapshot = self.snapshot()
+        names = sorted({n for s in snapshot.values() for n in s if n != "counters"},
+                       key=lambda n: (FIELDS.index(n) if n in FIELDS else len(FIELDS), n))
+        for name in names:
+            metric = f"{prefix}_{name}"
+            rows = [(phase, s[name]) for phase, s in snapshot.items() if name in s]
+            if not rows:
+                continue
+            lines.append(f"# TYPE {metric} summary")
+            for phase, summary in rows:
+                for quantile in ("p50", "p95", "p99"):
+                    q = int(quantile[1:]) / 100
+                    lines.append(f'{metric}{{phase="{phase}",quantile="{q}"}} {summary[quantile]}')
+                lines.append(f'{metric}_sum{{phase="{phase}"}} {summary["mean"] * summary["count"]}')
+                lines.append(f'{metric}_count{{phase="{phase}"}} {summary["count"]}')
+
+        counter_names = sorted({n for s in snapshot.values() for n in s["counters"]})
+        for name in counter_names:
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for phase, s in snapshot.items():
+                if name in s["counters"]:
+                    lines.append(f'{metric}{{phase="{phase}"}} {s["counters"][name]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._counters.clear()
+
+
+def token_usage(response) -> Dict[str, Optional[int]]:
+    """Prompt/completion token counts reported by the provider, if any"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return {"prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens")}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return {"prompt_tokens": metadata.get("input_tokens"),
+                        "completion_tokens": metadata.get("output_tokens")}
+    return {"prompt_tokens": None, "completion_tokens": None}
+
+
+class PhaseMetricsHandler(BaseCallbackHandler):
+    """Callback that times one LLM call and records it under a phase
+
+    Queue time runs from when the handler is created (the agent call) to
+    when the model starts; time-to-first-token is measured from the start.
+    """
+
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry, phase: str):
+        self.registry = registry
+        self.phase = phase
+        self.created = time.perf_counter()
+        self.started: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.streamed_tokens = 0
+        self.prompt_estimate = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.started = time.perf_counter()
+        self.prompt_estimate = sum(approx_tokens(str(m.content)) for batch in messages
+                                   for m in batch)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.started = time.perf_counter()
+        self.prompt_estimate = sum(approx_tokens(prompt) for prompt in prompts)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if not token:
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.streamed_tokens += 1
+
+    def on_llm_end(self, response, **kwargs):
+        ended = time.perf_counter()
+        started = self.started or self.created
+        latency = ended - started
+
+        usage = token_usage(response)
+        completion = usage["completion_tokens"]
+        if completion is None:
+            text = "".join(g.text for batch in response.generations for g in batch)
+            completion = self.streamed_tokens or approx_tokens(text)
+        prompt = usage["prompt_tokens"]
+        if prompt is None:
+            prompt = self.prompt_estimate
+
+        self.registry.record(
+            self.phase,
+            queue_seconds=started - self.created,
+            ttft_seconds=(self.first_token or ended) - started,
+            latency_seconds=latency,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            tokens_per_second=completion / latency if latency > 0 else None,
+        )
+        self.registry.increment(self.phase, "calls")
+
+    def on_llm_error(self, error, **kwargs):
+        self.registry.increment(self.phase, "errors")
@@ -0,0 +1,238 @@
+# SAPG Pipeline - Overlapped Draft → Critique → Revision execution
+
+import asyncio
+import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from cache import describe_llm
+from ratelimit import LLM_TYPES, RATE_LIMITS
+from resilience import PhaseFailed, RunCancelled
+
+# a section ends at a blank line or right before a new numbered step
+SECTION_BREAK = re.compile(
+    r"\n[ \t]*\n|\n(?=[ \t]*(?:\d+[.)]|step\s+\d+[:.)]?)\s)", re.IGNORECASE)
+
+
+class RunProgress:
+    """Where a run reports its phases, and how it learns it should stop
+
+    on_phase(phase) is called as each phase starts, on_token(phase, text)
+    with its output as it streams (in one piece for calls that don't
+    stream), and cancel() is checked between phases and streamed chunks;
+    once it returns True the run raises RunCancelled. All are optional.
+    """
+
+    def __init__(self, on_phase: Optional[Callable[[str], None]] = None,
+                 on_token: Optional[Callable[[str, str], None]] = None,
+                 cancel: Optional[Callable[[], bool]] = None):
+        self.on_phase = on_phase
+        self.on_token = on_token
+        self.cancel = cancel
+
+    def check(self):
+        if self.cancel is not None and self.cancel():
+            raise RunCancelled("run was cancelled")
+
+    def start(self, phase: str):
+        self.check()
+        if self.on_phase is not None:
+            self.on_phase(phase)
+
+    def token(self, phase: str, text: str):
+        self.check()
+        if self.on_token is not None:
+            self.on_token(phase, text)
+
+    def call(self, phase: str, call: Callable[[], str],
+             stream: Optional[Callable[[], Iterable[str]]] = None) -> str:
+        """Run one phase, streaming it when someone listens for tokens"""
+        self.start(phase)
+        if stream is not None and self.on_token is not None:
+            parts = []
+            for chunk in stream():
+                self.token(phase, chunk)
+                parts.append(chunk)
+            return "".join(parts)
+        output = call()
+        self.token(phase, output)
+        return output
+
+
+def split_sections(chunks: Iterable[str], min_chars: int = 40) -> Iterator[str]:
+    """Yield finished sections of a token stream as soon as they close
+
+    Sections shorter than min_chars (headers, stray lines) are merged into
+    the next one so the critique is not wasted on them.
+    """
+    buffer = ""
+    pending = ""
+    for chunk in chunks:
+        buffer += chunk
+        match = SECTION_BREAK.search(buffer)
+        while match:
+            section = buffer[:match.start()].strip()
+            buffer = buffer[match.end():]
+            if section:
+                pending = f"{pending}\n{section}" if pending else section
+                if len(pending) >= min_chars:
+                    yield pending
+                    pending = ""
+            match = SECTION_BREAK.search(buffer)
+
+    rest = buffer.strip()
+    if pending and rest:
+        yield f"{pending}\n{rest}"
+    elif pending or rest:
+        yield pending or rest
+
+
+def run_pipelined(draft_agent, critique_agent, revision_agent, user_request: str,
+                  max_workers: int = 4,
+                  on_draft_token: Optional[Callable[[str], None]] = None,
+                  needs_revision: Optional[Callable[[str], bool]] = None,
+                  progress: Optional[RunProgress] = None) -> Dict[str, str]:
+    """Run the SAP cycle with the phases overlapped
+
+    Each draft section is critiqued as soon as it has finished streaming,
+    and each section is revised as soon as its critique is done, so the
+    later phases run while the draft is still being written.
+    needs_revision, if given, decides per section whether its revision
+    call is made; a section it skips is kept as drafted. progress hears
+    the draft's tokens; once the draft is done it moves to "critique" and
+    gets each section's critique in order, then the whole revision. A
+    failure raises PhaseFailed with the draft once it has finished, and
+    the critique too if only a revision failed.
+    """
+    progress = progress or RunProgress()
+    draft_parts = []
+
+    def tee(chunks):
+        # keep the full draft and forward tokens to the caller
+        for chunk in chunks:
+            draft_parts.append(chunk)
+            progress.token("draft", chunk)
+            if on_draft_token:
+                on_draft_token(chunk)
+            yield chunk
+
+    critiques = {}
+
+    def audit(index, section):
+        progress.check()
+        critique = critiques[index] = critique_agent.critique(user_request, section)
+        if needs_revision is not None and not needs_revision(critique):
+            return critique, section, True
+        progress.check()
+        return critique, revision_agent.revise(user_request, section, critique), False
+
+    results = {"user_request": user_request}
+    phase = "draft"
+    try:
+        progress.start("draft")
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            draft_stream = tee(draft_agent.generate_stream(user_request))
+            futures = [pool.submit(audit, index, section)
+                       for index, section in enumerate(split_sections(draft_stream))]
+            results["draft"] = "".join(draft_parts)
+            phase = "critique"
+            progress.start("critique")
+            audited = []
+            for future in futures:
+                audited.append(future.result())
+                progress.token("critique",
+                               ("\n\n" if len(audited) > 1 else "") + audited[-1][0])
+    except RunCancelled:
+        raise
+    except Exception as e:
+        # the pool has drained, so every section that was critiqued is in critiques
+        if phase == "critique" and len(critiques) == len(futures):
+            results["critique"] = "\n\n".join(critiques[index] for index in range(len(futures)))
+            phase = "revision"
+        raise PhaseFailed(phase, results, e) from e
+
+    results.update(critique="\n\n".join(critique for critique, _, _ in audited),
+                   revision="\n\n".join(revision for _, revision, _ in audited))
+    if audited and all(skipped for _, _, skipped in audited):
+        results["revision_skipped"] = True
+    progress.start("revision")
+    progress.token("revision", results["revision"])
+    return results
+
+
+class ProviderLimits:
+    """Per-provider asyncio semaphores bounding concurrent LLM calls
+
+    Semaphores are created per event loop, so one instance can be reused
+    across asyncio.run() calls.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default: int = 4):
+        # the same concurrency caps as the pooled clients' Governors
+        self.limits = {llm_type: RATE_LIMITS[provider]["max_in_flight"]
+                       for llm_type, provider in LLM_TYPES.items()}
+        self.limits.update(limits or {})
+        self.default = default
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self, llm) -> asyncio.Semaphore:
+        provider = describe_llm(llm)[0]
+        per_loop = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if provider not in per_loop:
+            per_loop[provider] = asyncio.Semaphore(self.limits.get(provider, self.default))
+        return per_loop[provider]
+
+
+async def run_sap(draft_agent, critique_agent, revision_agent, user_request: str,
+                  limits: Optional[ProviderLimits] = None,
+                  needs_revision: Optional[Callable[[str], bool]] = None,
+                  partial: Optional[Dict[str, str]] = None,
+                  progress: Optional[RunProgress] = None) -> Dict[str, str]:
+    """Run the SAP cycle on the event loop, one phase after another
+
+    The async twin of SAPGOrchestrator.execute. needs_revision, if given,
+    decides from the critique whether the revision call is made; when it
+    says no the draft is the final output. Phases already in partial are
+    kept; a failure raises PhaseFailed with the phases that did finish.
+    """
+    limits = limits or ProviderLimits()
+    progress = progress or RunProgress()
+    results = dict(partial or {}, user_request=user_request)
+    phase = "draft"
+    try:
+        if "draft" not in results:
+            progress.start(phase)
+            async with limits.semaphore(draft_agent.llm):
+                if hasattr(draft_agent, "arace"):
+                    # a speculative draft also says which model's draft won
+                    race = await draft_agent.arace(user_request)
+                    results.update(draft=race["draft"], draft_source=race["source"])
+                else:
+                    results["draft"] = await draft_agent.agenerate(user_request)
+            progress.token(phase, results["draft"])
+        phase = "critique"
+        if "critique" not in results:
+            progress.start(phase)
+            async with limits.semaphore(critique_agent.llm):
+                results["critique"] = await critique_agent.acritique(
+                    user_request, results["draft"])
+            progress.token(phase, results["critique"])
+        phase = "revision"
+        if "revision" in results:
+            return results
+        if needs_revision is not None and not needs_revision(results["critique"]):
+            results["revision"] = results["draft"]
+            results["revision_skipped"] = True
+            return results
+
+        progress.start(phase)
+        async with limits.semaphore(revision_agent.llm):
+            results["revision"] = await revision_agent.arevise(
+                user_request, results["draft"], results["critique"])
+        progress.token(phase, results["revision"])
+    except RunCancelled:
+        raise
+    except Exception as e:
+        raise PhaseFailed(phase, results, e) from e
+    return results
@@ -1,5 +1,8 @@
 # Self-Auditing Protocol Template
 
+# bump when the protocol text changes so cached outputs are not reused
+PROTOCOL_VERSION = "1.0"
+
 PROTOCOL_TEMPLATE = """SELF-AUDITING PROTOCOL (SAP)
 
 PRINCIPLE: All AI outputs must go through systematic self-correction before delivery.
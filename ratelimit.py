@@ -0,0 +1,293 @@
+# Rate Limiting - Per provider/model request, token and concurrency limits
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from compaction import approx_tokens
+from metrics import LatencyStats, MetricsRegistry, token_usage
+
+# client-side limits per provider: requests/min, tokens/min, concurrent calls;
+# a single Ollama server slows down for everyone past a couple of generations
+RATE_LIMITS = {
+    "ollama": {"max_in_flight": 2},
+    "openai": {"rpm": 500, "tpm": 200000, "max_in_flight": 16},
+    "anthropic": {"rpm": 50, "tpm": 40000, "max_in_flight": 8},
+}
+# the provider behind each LangChain chat model's _llm_type
+LLM_TYPES = {"chat-ollama": "ollama", "openai-chat": "openai", "anthropic-chat": "anthropic"}
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 units a second, up to per_minute
+
+    The level may go negative when usage is charged after the fact;
+    nothing is admitted again until it has refilled.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until the level reaches amount"""
+        self.refill()
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate else math.inf
+
+    def take(self, amount: float):
+        self.refill()
+        self.level -= amount
+
+
+class _Waiter:
+    # a queued caller, the tokens it reserves, and how to wake it from another thread
+    __slots__ = ("wake", "tokens")
+
+    def __init__(self, wake: Callable[[], None], tokens: float = 0):
+        self.wake = wake
+        self.tokens = tokens
+
+
+class _Calls:
+    # model calls started together in one context, and the slots they hold
+    __slots__ = ("started", "ended", "held", "waiting", "reserved")
+
+    def __init__(self):
+        self.started = self.ended = self.held = 0
+        self.waiting: Dict[Any, int] = {}  # run id -> prompt estimate, not yet admitted
+        self.reserved: List[float] = []  # tokens reserved by each held slot
+
+
+class Governor(BaseRateLimiter, BaseCallbackHandler):
+    """Requests/min, tokens/min and max in-flight limits for one provider/model
+
+    Attach it to a chat model as both rate_limiter and callback: the model
+    calls acquire() before each request, and on_llm_end/on_llm_error free
+    the in-flight slot. A call is admitted once the tokens/min budget
+    covers its prompt estimate, which is reserved then; on_llm_end settles
+    the difference to the tokens it really used. A call only frees a
+    slot that its own context acquired, so one that skipped acquire (an
+    llm-cache hit) frees nothing. Outside a model, hold a slot with
+    `with governor.slot() as usage:`. Callers are admitted in arrival
+    order, from threads and asyncio tasks alike, and wait rather than
+    fail. Time spent waiting is recorded as limiter_wait_seconds.
+    """
+
+    run_inline = True
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, name: str = "llm",
+                 registry: Optional[MetricsRegistry] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.name = name
+        self.registry = registry
+        self.requests = TokenBucket(rpm, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, clock) if tpm else None
+        self.in_flight = 0
+        self.waits = LatencyStats(2000)
+        self._queue: deque = deque()
+        self._estimates: Dict[Any, int] = {}
+        self._runs: Dict[Any, _Calls] = {}  # run id -> the calls it started with
+        self._calls: ContextVar[Optional[_Calls]] = ContextVar(f"governor_{id(self)}",
+                                                               default=None)
+        self._lock = threading.Lock()
+
+    def _admit(self, waiter: _Waiter) -> Optional[float]:
+        # under the lock: None if admitted, else how long to wait (inf = until woken)
+        if self._queue[0] is not waiter:
+            return math.inf
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return math.inf
+        # a prompt bigger than the whole budget waits for a full bucket, not forever
+        tokens = min(waiter.tokens, self.tokens.capacity) if self.tokens else 0.0
+        delay = max(self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(max(tokens, 1e-9)) if self.tokens else 0.0)
+        if delay > 0:
+            return delay
+        self._queue.popleft()
+        self.in_flight += 1
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(waiter.tokens)
+        self._wake_head()
+        return None
+
+    def _wake_head(self):
+        if self._queue:
+            self._queue[0].wake()
+
+    def _leave(self, waiter: _Waiter):
+        with self._lock:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+            self._wake_head()
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self.waits.add(seconds)
+        if self.registry is not None:
+            self.registry.record(self.name, limiter_wait_seconds=seconds)
+            if seconds > 0.001:
+                self.registry.increment(self.name, "throttled")
+
+    def _next_call(self):
+        # the calls in this context and the next of them to be admitted
+        calls = self._calls.get()
+        with self._lock:
+            if calls is None or calls.ended == calls.started or not calls.waiting:
+                return calls, None, 0
+            run_id = next(iter(calls.waiting))
+            return calls, run_id, calls.waiting[run_id]
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        calls, run_id, tokens = self._next_call()
+        if not self._wait(blocking, tokens):
+            return False
+        self._hold(calls, run_id, tokens)
+        return True
+
+    def _wait(self, blocking: bool, tokens: float = 0) -> bool:
+        event = threading.Event()
+        waiter = _Waiter(event.set, tokens)
+        started = time.perf_counter()
+        with self._lock:
+            self._queue.append(waiter)
+        while True:
+            event.clear()
+            with self._lock:
+                delay = self._admit(waiter)
+            if delay is None:
+                break
+            if not blocking:
+                self._leave(waiter)
+                return False
+            event.wait(None if delay == math.inf else delay)
+        self._record_wait(time.perf_counter() - started)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        calls, run_id, tokens = self._next_call()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = _Waiter(lambda: loop.call_soon_threadsafe(event.set), tokens)
+        started = time.perf_counter()
+        with self._lock:
+            self._queue.append(waiter)
+        try:
+            while True:
+                event.clear()
+                with self._lock:
+                    delay = self._admit(waiter)
+                if delay is None:
+                    break
+                if not blocking:
+                    self._leave(waiter)
+                    return False
+                try:
+                    await asyncio.wait_for(event.wait(), None if delay == math.inf else delay)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            self._leave(waiter)
+            raise
+        self._record_wait(time.perf_counter() - started)
+        self._hold(calls, run_id, tokens)
+        return True
+
+    def _hold(self, calls: Optional[_Calls], run_id, tokens: float):
+        # credit the slot just taken, and its reservation, to this context's calls
+        with self._lock:
+            if calls is not None and calls.ended < calls.started:
+                calls.held += 1
+                calls.waiting.pop(run_id, None)
+                calls.reserved.append(tokens)
+
+    def _free(self, tokens: float = 0):
+        # tokens: what the call used beyond its reservation (negative hands some back)
+        with self._lock:
+            self.in_flight -= 1
+            if self.tokens and tokens:
+                self.tokens.take(tokens)
+            self._wake_head()
+
+    @contextmanager
+    def slot(self, tokens: int = 0) -> Iterator[Dict[str, int]]:
+        """Hold an in-flight slot around a call made by hand
+
+        `tokens` are reserved up front. Set "tokens" in the yielded dict
+        to what the call really used, and the difference is settled.
+        """
+        self._wait(True, tokens)
+        usage = {"tokens": tokens}
+        try:
+            yield usage
+        finally:
+            self._free(usage["tokens"] - tokens)
+
+    def _end(self, run_id, tokens: int = 0):
+        # a model call finished: free a slot if its context holds one
+        with self._lock:
+            calls = self._runs.pop(run_id, None)
+            if calls is None:
+                return
+            calls.ended += 1
+            calls.waiting.pop(run_id, None)  # it never needed a slot
+            if not calls.held:
+                return
+            calls.held -= 1
+            reserved = calls.reserved.pop(0)
+        self._free(tokens - reserved)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        estimate = self._estimates[run_id] = sum(approx_tokens(str(m.content))
+                                                 for batch in messages for m in batch)
+        calls = self._calls.get()
+        with self._lock:
+            if calls is None or calls.ended == calls.started:
+                calls = _Calls()
+            calls.started += 1
+            calls.waiting[run_id] = estimate
+            self._runs[run_id] = calls
+        self._calls.set(calls)
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        estimate = self._estimates.pop(run_id, 0)
+        usage = token_usage(response)
+        prompt = usage["prompt_tokens"] if usage["prompt_tokens"] is not None else estimate
+        completion = usage["completion_tokens"]
+        if completion is None:
+            completion = approx_tokens(
+                "".join(g.text for batch in response.generations for g in batch))
+        self._end(run_id, prompt + completion)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._estimates.pop(run_id, None)
+        self._end(run_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"rpm": self.rpm, "tpm": self.tpm, "max_in_flight": self.max_in_flight,
+                    "in_flight": self.in_flight, "queued": len(self._queue),
+                    "wait_seconds": self.waits.summary()}
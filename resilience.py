@@ -0,0 +1,274 @@
+# Resilience - Retries with backoff, Retry-After and per-provider circuit breakers
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# HTTP statuses worth retrying: timeouts, rate limits, overload, 5xx
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+# transient client errors, matched by class name so no SDK has to be imported
+TRANSIENT_ERRORS = {"TimeoutException", "ConnectError", "ReadError", "RemoteProtocolError",
+                    "APITimeoutError", "APIConnectionError", "RateLimitError"}
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider's circuit breaker is open, so the call was not made"""
+
+    retryable = False
+
+
+class PhaseFailed(RuntimeError):
+    """A phase failed for good; results holds every phase that finished
+
+    Pass results back as `partial` to resume from the failed phase.
+    """
+
+    def __init__(self, phase: str, results: Dict[str, Any], cause: BaseException):
+        self.phase = phase
+        self.results = results
+        self.cause = cause
+        super().__init__(f"{phase} failed: {cause}")
+
+
+class RunCancelled(RuntimeError):
+    """Raised inside a run once its cancel callback says stop"""
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient: a timeout, dropped connection, 429 or 5xx"""
+    flag = getattr(error, "retryable", None)
+    if flag is not None:
+        return bool(flag)
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a Retry-After header"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        # HTTP-date form
+        return max(parsedate_to_datetime(str(value)).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Fails fast after repeated transient failures of one provider
+
+    closed → open after failure_threshold failures in a row; after
+    reset_timeout one trial call is let through (half-open) and its
+    outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class RetryPolicy:
+    """Retries transient failures with jittered exponential backoff
+
+    Waits honour a provider's Retry-After (up to max_retry_after seconds).
+    Each provider gets its own circuit breaker, so share one policy
+    between agents to share what it learns about a provider. A batch round
+    counts as one call: a failure when at least batch_failure_ratio of its
+    items failed transiently, otherwise a success.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 20.0,
+                 max_retry_after: float = 60.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, sleep: Callable[[float], None] = time.sleep,
+                 seed: Optional[int] = None, batch_failure_ratio: float = 0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.batch_failure_ratio = batch_failure_ratio
+        self.sleep = sleep
+        self._rng = random.Random(seed)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(self.failure_threshold,
+                                                          self.reset_timeout)
+            return self._breakers[provider]
+
+    def delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Seconds to wait before retry number `attempt` (1-based)"""
+        asked = retry_after(error) if error is not None else None
+        if asked is not None:
+            return min(asked, self.max_retry_after)
+        # full jitter: anywhere between zero and the exponential cap
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _outcome(self, breaker: CircuitBreaker, error: Optional[BaseException]) -> bool:
+        # record a call's result; True if it should be retried
+        if error is None or not is_retryable(error):
+            # the provider answered, even if the request itself was bad
+            breaker.record_success()
+            return False
+        breaker.record_failure()
+        return True
+
+    def call(self, fn: Callable[[], Any], provider: str,
+             on_retry: Optional[Callable[[BaseException], None]] = None) -> Any:
+        breaker = self.breaker(provider)
+        for attempt in range(1, self.max_attempts + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuit open for {provider}")
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._outcome(breaker, e) or attempt == self.max_attempts:
+                    raise
+                if on_retry:
+                    on_retry(e)
+                self.sleep(self.delay(attempt, e))
+                continue
+            self._outcome(breaker, None)
+            return result
+
+    async def acall(self, fn: Callable[[], Any], provider: str,
+                    on_retry: Optional[Callable[[BaseException], None]] = None) -> Any:
+        """Like call, for a coroutine function; waits without blocking the loop"""
+        breaker = self.breaker(provider)
+        for attempt in range(1, self.max_attempts + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuit open for {provider}")
+            try:
+                result = await fn()
+            except Exception as e:
+                if not self._outcome(breaker, e) or attempt == self.max_attempts:
+                    raise
+                if on_retry:
+                    on_retry(e)
+                await asyncio.sleep(self.delay(attempt, e))
+                continue
+            self._outcome(breaker, None)
+            return result
+
+    def _retry_round(self, breaker, results, pending, attempt, on_retry) -> List[int]:
+        # which of the pending items failed transiently and get another go
+        retry = [index for index in pending if isinstance(results[index], Exception)
+                 and is_retryable(results[index])]
+        if len(retry) >= self.batch_failure_ratio * len(pending):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if not retry or attempt == self.max_attempts or not breaker.allow():
+            return []
+        for index in retry:
+            if on_retry:
+                on_retry(results[index])
+        return retry
+
+    def call_batch(self, run: Callable[[List[Any]], List[Any]], inputs_list: List[Any],
+                   provider: str,
+                   on_retry: Optional[Callable[[BaseException], None]] = None) -> List[Any]:
+        """Run a batch whose failures come back as exceptions, retrying those"""
+        breaker = self.breaker(provider)
+        if not breaker.allow():
+            return [CircuitOpenError(f"circuit open for {provider}") for _ in inputs_list]
+        results = list(run(inputs_list))
+        pending = list(range(len(results)))
+        for attempt in range(1, self.max_attempts + 1):
+            pending = self._retry_round(breaker, results, pending, attempt, on_retry)
+            if not pending:
+                break
+            self.sleep(max(self.delay(attempt, results[index]) for index in pending))
+            for index, result in zip(pending, run([inputs_list[i] for i in pending])):
+                results[index] = result
+        return results
+
+    async def acall_batch(self, run, inputs_list: List[Any], provider: str,
+                          on_retry: Optional[Callable[[BaseException], None]] = None) -> List[Any]:
+        """Like call_batch, for a coroutine function"""
+        breaker = self.breaker(provider)
+        if not breaker.allow():
+            return [CircuitOpenError(f"circuit open for {provider}") for _ in inputs_list]
+        results = list(await run(inputs_list))
+        pending = list(range(len(results)))
+        for attempt in range(1, self.max_attempts + 1):
+            pending = self._retry_round(breaker, results, pending, attempt, on_retry)
+            if not pending:
+                break
+            await asyncio.sleep(max(self.delay(attempt, results[index]) for index in pending))
+            for index, result in zip(pending, await run([inputs_list[i] for i in pending])):
+                results[index] = result
+        return results
+
+    def states(self) -> Dict[str, str]:
+        """Circuit state per provider seen so far"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {provider: breaker.state for provider, breaker in breakers.items()}
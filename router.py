@@ -0,0 +1,251 @@
+# Provider Router - Failover and hedged requests across LLM providers
+
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field
+
+from metrics import LatencyStats
+
+# seconds to wait for the first token before giving up on a provider
+DEFAULT_FIRST_TOKEN_TIMEOUT = 60.0
+# seconds to wait for each later token before handing over to the next provider
+DEFAULT_CHUNK_TIMEOUT = 30.0
+
+
+class AllProvidersFailed(RuntimeError):
+    """Every provider in the route failed or timed out"""
+
+    def __init__(self, errors: Dict[str, BaseException]):
+        self.errors = errors
+        detail = "; ".join(f"{name}: {error}" for name, error in errors.items())
+        super().__init__(f"all providers failed ({detail})")
+
+
+class ProviderTimeout(TimeoutError):
+    """A provider produced no first token, or no next token, within its timeout"""
+
+
+class ProviderHealth:
+    """Per-provider failure streaks and time-to-first-token history
+
+    After failure_threshold failures in a row a provider is benched for
+    cooldown seconds: it is tried last until then, not dropped.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0,
+                 min_samples: int = 5):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self._failures: Dict[str, int] = {}
+        self._down_until: Dict[str, float] = {}
+        self._ttft: Dict[str, LatencyStats] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, field: str):
+        counts = self._counts.setdefault(name, {"ok": 0, "failed": 0, "hedged": 0})
+        counts[field] += 1
+
+    def record_success(self, name: str, ttft: float):
+        with self._lock:
+            self._failures[name] = 0
+            self._down_until.pop(name, None)
+            self._ttft.setdefault(name, LatencyStats(1000)).add(ttft)
+            self._count(name, "ok")
+
+    def record_failure(self, name: str):
+        with self._lock:
+            self._failures[name] = self._failures.get(name, 0) + 1
+            if self._failures[name] >= self.failure_threshold:
+                self._down_until[name] = time.monotonic() + self.cooldown
+            self._count(name, "failed")
+
+    def record_hedge(self, name: str):
+        with self._lock:
+            self._count(name, "hedged")
+
+    def healthy(self, name: str) -> bool:
+        with self._lock:
+            return time.monotonic() >= self._down_until.get(name, 0.0)
+
+    def order(self, names: List[str]) -> List[str]:
+        """Healthy providers first, each group in the configured order"""
+        return sorted(names, key=lambda name: not self.healthy(name))
+
+    def p95_ttft(self, name: str) -> Optional[float]:
+        """p95 time-to-first-token, once there are enough samples"""
+        with self._lock:
+            stats = self._ttft.get(name)
+            if stats is None or stats.count < self.min_samples:
+                return None
+            return stats.percentile(95)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            names = set(self._counts) | set(self._ttft)
+            now = time.monotonic()
+            return {name: dict(self._counts.get(name, {}),
+                               healthy=now >= self._down_until.get(name, 0.0),
+                               ttft_seconds=self._ttft[name].summary()
+                               if name in self._ttft else None)
+                    for name in sorted(names)}
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that fails over along an ordered list of providers
+
+    A provider that errors or gives no first token within its timeout is
+    abandoned for the next one. With hedge=True a second provider is also
+    started when the current one is slower than its usual p95 time to
+    first token (or hedge_after seconds); the first to produce a token wins.
+    If the winner then errors or stalls for chunk_timeout seconds, the next
+    provider is asked to continue from the text already sent, with that
+    text as a trailing assistant message.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    providers: List[Tuple[str, Any]]  # (name, chat model) in failover order
+    timeouts: Dict[str, float] = Field(default_factory=dict)
+    chunk_timeout: float = DEFAULT_CHUNK_TIMEOUT
+    hedge: bool = False
+    hedge_after: Optional[float] = None  # fixed hedge delay instead of the p95
+    health: ProviderHealth = Field(default_factory=ProviderHealth)
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat"
+
+    @property
+    def model_name(self) -> str:
+        return ">".join(name for name, _ in self.providers)
+
+    def timeout(self, name: str) -> float:
+        return self.timeouts.get(name, DEFAULT_FIRST_TOKEN_TIMEOUT)
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        return self.health.p95_ttft(name)
+
+    @staticmethod
+    def _pump(name, model, messages, stop, kwargs, events, abandoned):
+        # runs in a worker thread; output is dropped once abandoned
+        try:
+            for chunk in model.stream(messages, stop=stop, **kwargs):
+                if name in abandoned:
+                    return
+                events.put((name, "token", chunk))
+            events.put((name, "done", None))
+        except Exception as e:
+            events.put((name, "error", e))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        models = dict(self.providers)
+        waiting = self.health.order([name for name, _ in self.providers])
+        events: queue.Queue = queue.Queue()
+        abandoned = set()
+        running: Dict[str, float] = {}  # name -> start time, no token yet
+        errors: Dict[str, BaseException] = {}
+        sent: List[str] = []  # text already yielded, for a mid-answer handover
+        prompt = messages
+
+        def launch():
+            name = waiting.pop(0)
+            running[name] = time.perf_counter()
+            threading.Thread(target=self._pump, daemon=True, args=(
+                name, models[name], prompt, stop, kwargs, events, abandoned)).start()
+
+        def fail(name, error):
+            running.pop(name, None)
+            abandoned.add(name)
+            errors[name] = error
+            self.health.record_failure(name)
+
+        while True:
+            launch()
+            winner = None
+            while winner is None:
+                if not running:
+                    if not waiting:
+                        raise AllProvidersFailed(errors)
+                    launch()
+
+                now = time.perf_counter()
+                deadlines = [start + self.timeout(name) for name, start in running.items()]
+                hedge_at = None
+                if waiting and len(running) == 1:
+                    name, start = next(iter(running.items()))
+                    delay = self.hedge_delay(name)
+                    if delay is not None:
+                        hedge_at = start + delay
+                        deadlines.append(hedge_at)
+
+                try:
+                    name, kind, payload = events.get(timeout=max(min(deadlines) - now, 0))
+                except queue.Empty:
+                    now = time.perf_counter()
+                    for name, start in list(running.items()):
+                        if now >= start + self.timeout(name):
+                            fail(name, ProviderTimeout(
+                                f"no first token after {self.timeout(name)}s"))
+                    if hedge_at is not None and now >= hedge_at and running and waiting:
+                        self.health.record_hedge(next(iter(running)))
+                        launch()
+                    continue
+
+                if name not in running:
+                    continue  # late output from an abandoned provider
+                if kind == "error":
+                    fail(name, payload)
+                    continue
+                winner = name
+                self.health.record_success(name, time.perf_counter() - running.pop(name))
+                abandoned.update(running)
+                running.clear()
+                if kind == "done":
+                    return  # finished without any output
+                sent.append(str(payload.content))
+                yield self._emit(payload, run_manager)
+
+            while True:
+                try:
+                    name, kind, payload = events.get(timeout=self.chunk_timeout)
+                except queue.Empty:
+                    fail(winner, ProviderTimeout(f"stalled for {self.chunk_timeout}s mid-answer"))
+                    break
+                if name != winner:
+                    continue
+                if kind == "done":
+                    return
+                if kind == "error":
+                    fail(winner, payload)
+                    break
+                sent.append(str(payload.content))
+                yield self._emit(payload, run_manager)
+
+            if not waiting:
+                raise AllProvidersFailed(errors)
+            # the next provider continues the answer from what was already sent
+            prompt = list(messages) + [AIMessage(content="".join(sent))]
+
+    @staticmethod
+    def _emit(message, run_manager) -> ChatGenerationChunk:
+        chunk = ChatGenerationChunk(message=message)
+        if run_manager:
+            run_manager.on_llm_new_token(str(message.content), chunk=chunk)
+        return chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
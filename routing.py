@@ -0,0 +1,133 @@
+# Phase Routing - Which provider, model and output limit each SAP phase uses
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from metrics import MetricsRegistry
+
+PHASES = ("draft", "critique", "revision")
+
+# USD per million (input, output) tokens; local models cost nothing
+PRICES = {
+    ("openai", "gpt-3.5-turbo"): (0.50, 1.50),
+    ("openai", "gpt-4"): (30.00, 60.00),
+    ("openai", "gpt-4-turbo"): (10.00, 30.00),
+    ("anthropic", "claude-3-haiku-20240307"): (0.25, 1.25),
+    ("anthropic", "claude-3-sonnet-20240229"): (3.00, 15.00),
+    ("anthropic", "claude-3-opus-20240229"): (15.00, 75.00),
+}
+FREE_PROVIDERS = ("ollama",)
+
+# the client setting that caps output length, per provider
+MAX_TOKENS_SETTING = {"ollama": "num_predict", "openai": "max_tokens",
+                      "anthropic": "max_tokens"}
+
+
+@dataclass
+class PhaseModel:
+    """Provider, model and generation settings for one phase
+
+    None means the provider's default (and no output cap for max_tokens).
+    """
+
+    provider: str
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+
+    def settings(self) -> Dict[str, Any]:
+        """Keyword settings for LLMFactory.create_llm"""
+        settings: Dict[str, Any] = {}
+        if self.temperature is not None:
+            settings["temperature"] = self.temperature
+        if self.max_tokens:
+            settings[MAX_TOKENS_SETTING.get(self.provider, "max_tokens")] = self.max_tokens
+        return settings
+
+    @property
+    def label(self) -> str:
+        return f"{self.provider}:{self.model or 'default'}"
+
+
+def load_routes(source: Union[str, Dict[str, Any], None]) -> Dict[str, PhaseModel]:
+    """Phase routes from a dict, a JSON string or a JSON file
+
+    e.g. {"critique": {"provider": "openai", "model": "gpt-3.5-turbo",
+    "max_tokens": 600}, "revision": {"provider": "openai", "model": "gpt-4"}}
+    """
+    if not source:
+        return {}
+    if isinstance(source, str):
+        if os.path.exists(source):
+            with open(source, encoding="utf-8") as f:
+                source = json.load(f)
+        else:
+            source = json.loads(source)
+    unknown = set(source) - set(PHASES)
+    if unknown:
+        raise ValueError(f"Unknown phase(s) in routes: {', '.join(sorted(unknown))}")
+    return {phase: route if isinstance(route, PhaseModel) else PhaseModel(**route)
+            for phase, route in source.items()}
+
+
+def complete_routes(routes: Dict[str, PhaseModel], default: PhaseModel) -> Dict[str, PhaseModel]:
+    """A route for every phase, falling back to default"""
+    return {phase: routes.get(phase, default) for phase in PHASES}
+
+
+def price(provider: str, model: Optional[str]) -> Optional[Tuple[float, float]]:
+    """USD per million (input, output) tokens, or None if unknown"""
+    if provider in FREE_PROVIDERS:
+        return (0.0, 0.0)
+    return PRICES.get((provider, model))
+
+
+def estimate_cost(route: PhaseModel, prompt_tokens: float,
+                  completion_tokens: float) -> Optional[float]:
+    rates = price(route.provider, route.model)
+    if rates is None:
+        return None
+    return (prompt_tokens * rates[0] + completion_tokens * rates[1]) / 1e6
+
+
+def cost_report(registry: MetricsRegistry, routes: Dict[str, PhaseModel],
+                baseline: Optional[PhaseModel] = None) -> List[Dict[str, Any]]:
+    """Calls, latency, tokens and estimated cost per phase
+
+    With a baseline, each row also prices the same tokens on that model,
+    i.e. what the phase would have cost without routing.
+    """
+    snapshot = registry.snapshot()
+    rows = []
+    for phase, route in routes.items():
+        stats = snapshot.get(phase)
+        if not stats:
+            continue
+        prompt = stats.get("prompt_tokens", {})
+        completion = stats.get("completion_tokens", {})
+        latency = stats.get("latency_seconds", {})
+        calls = int(stats["counters"].get("calls", 0))
+        row = {
+            "phase": phase,
+            "model": route.label,
+            "calls": calls,
+            "latency_p50": latency.get("p50", 0.0),
+            "latency_p95": latency.get("p95", 0.0),
+            "prompt_tokens": prompt.get("mean", 0.0),
+            "completion_tokens": completion.get("mean", 0.0),
+        }
+        cost = estimate_cost(route, prompt.get("mean", 0.0), completion.get("mean", 0.0))
+        row["cost_per_call"] = cost
+        row["cost"] = cost * calls if cost is not None else None
+        if baseline is not None:
+            base = estimate_cost(baseline, prompt.get("mean", 0.0),
+                                 completion.get("mean", 0.0))
+            row["baseline_cost"] = base * calls if base is not None else None
+        rows.append(row)
+    return rows
+
+
+def routes_to_json(routes: Dict[str, PhaseModel]) -> str:
+    return json.dumps({phase: asdict(route) for phase, route in routes.items()}, indent=2)
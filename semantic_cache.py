@@ -0,0 +1,278 @@
+# Semantic Cache - Reuses drafts for requests that differ only in wording
+
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# optional local embedding model
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an the and or of for to with in on into from by at as is are be "
+                      "that this it its my our your me we i please can you".split())
+# the verb a request opens with rarely changes what is being asked for
+TASK_VERBS = frozenset("build create make write design implement develop set setup "
+                       "add generate produce".split())
+SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "es", "s", "ed", "ly")
+# short forms people swap freely with the full word
+ALIASES = {"auth": "authentication", "authn": "authentication", "db": "database",
+           "repo": "repository", "config": "configuration", "env": "environment",
+           "app": "application", "k8s": "kubernetes", "golang": "go", "js": "javascript",
+           "ts": "typescript", "py": "python", "postgresql": "postgres"}
+# words that flip or narrow what is asked for; two requests must agree on them
+NEGATIONS = frozenset("no not without never non except excluding".split())
+LANGUAGES = frozenset("python go java javascript typescript rust ruby php kotlin swift scala "
+                      "c cpp csharp elixir haskell perl bash shell powershell sql r lua dart "
+                      "julia".split())
+
+
+def stem(word: str) -> str:
+    word = ALIASES.get(word, word)
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def normalise(text: str) -> List[str]:
+    """Content words of a request, lightly stemmed"""
+    words = []
+    for word in TOKEN.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if word in TASK_VERBS:
+            words.append("<task>")
+            continue
+        words.append(stem(word))
+    return words
+
+
+def key_terms(text: str) -> frozenset:
+    """Programming languages named and words negated in a request
+
+    "without error handling" gives "not:error". Requests that differ in
+    these ask for something else however alike their wording is.
+    """
+    terms = set()
+    negated = False
+    for word in TOKEN.findall(text.lower()):
+        word = ALIASES.get(word, word)
+        if word in NEGATIONS:
+            negated = True
+            continue
+        if word in LANGUAGES:
+            terms.add("lang:" + word)
+        if negated and word not in STOPWORDS:
+            terms.add("not:" + stem(word))
+            negated = False
+    return frozenset(terms)
+
+
+class HashingEmbedder:
+    """CPU-only embeddings from hashed word, prefix and character n-gram features
+
+    No model to download: each feature is hashed into one of `dim` signed
+    buckets and the vector is L2-normalised. Prefixes and character
+    trigrams let "auth" and "authentication", or "limits" and "limiting",
+    share weight, and key terms (languages, negated words) weigh extra. It
+    is lexical, so requests that differ in one key noun still score fairly
+    high; keep the threshold at 0.95 or above.
+    """
+
+    def __init__(self, dim: int = 256, word_weight: float = 1.0, prefix_weight: float = 1.0,
+                 char_weight: float = 0.2, bigram_weight: float = 0.3, key_weight: float = 2.0):
+        self.dim = dim
+        self.word_weight = word_weight
+        self.prefix_weight = prefix_weight
+        self.char_weight = char_weight
+        self.bigram_weight = bigram_weight
+        self.key_weight = key_weight
+
+    def features(self, text: str) -> Dict[str, float]:
+        words = normalise(text)
+        features: Dict[str, float] = {}
+
+        def add(feature, weight):
+            features[feature] = features.get(feature, 0.0) + weight
+
+        for word in words:
+            add("w:" + word, self.word_weight)
+            if len(word) >= 4:
+                add("p:" + word[:4], self.prefix_weight)
+            padded = f"<{word}>"
+            for start in range(len(padded) - 2):
+                add("c:" + padded[start:start + 3], self.char_weight)
+        for first, second in zip(words, words[1:]):
+            add(f"b:{first} {second}", self.bigram_weight)
+        for term in key_terms(text):
+            add("k:" + term, self.key_weight)
+        return features
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(text).items():
+            bucket = zlib.crc32(feature.encode("utf-8"))
+            # the top bit picks the sign so collisions tend to cancel out
+            vector[bucket % self.dim] += weight if bucket & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceEmbedder:
+    """Local sentence-transformers model, run on the CPU"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        if SentenceTransformer is None:
+            raise ImportError(
+                "sentence-transformers not installed. Run: pip install sentence-transformers")
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def __call__(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+class VectorIndex:
+    """Fixed-capacity matrix of unit vectors with cosine top-k search
+
+    Rows are preallocated; once full, the least recently used row is
+    overwritten. Each row belongs to a scope and searches only look at
+    rows of the scope they ask for.
+    """
+
+    def __init__(self, dim: int, capacity: int = 10000):
+        self.dim = dim
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.scopes = np.full(capacity, -1, dtype=np.int64)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.payloads: List[Any] = [None] * capacity
+        self.scope_sizes: Dict[int, int] = {}
+        self.size = 0
+        self.evictions = 0
+        self._tick = 0
+
+    def touch(self, row: int):
+        self._tick += 1
+        self.last_used[row] = self._tick
+
+    def add(self, vector: np.ndarray, scope: int, payload: Any) -> int:
+        """Store a vector and return its row"""
+        if self.size < self.capacity:
+            row = self.size
+            self.size += 1
+        else:
+            row = int(np.argmin(self.last_used))
+            self.evictions += 1
+            old = int(self.scopes[row])
+            self.scope_sizes[old] -= 1
+            if not self.scope_sizes[old]:
+                del self.scope_sizes[old]
+        self.scope_sizes[scope] = self.scope_sizes.get(scope, 0) + 1
+        self.vectors[row] = vector
+        self.scopes[row] = scope
+        self.payloads[row] = payload
+        self.touch(row)
+        return row
+
+    def search(self, vector: np.ndarray, scope: int, k: int = 1) -> List[tuple]:
+        """Up to k (row, cosine similarity) pairs, best first"""
+        if not self.size:
+            return []
+        scores = self.vectors[:self.size] @ vector
+        scores[self.scopes[:self.size] != scope] = -np.inf
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self.size else np.arange(self.size)
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if scores[row] > -np.inf]
+
+
+class SemanticCache:
+    """Finds a stored output for a request worded like an earlier one
+
+    get() returns the value stored for the most similar earlier text in
+    the same scope when their cosine similarity reaches `threshold` and
+    both name the same key terms (languages, negated words). Scopes keep
+    outputs of different models or prompts apart. Without an embedder the
+    CPU-only HashingEmbedder is used.
+    """
+
+    def __init__(self, embedder: Optional[Callable[[str], np.ndarray]] = None,
+                 capacity: int = 10000, threshold: float = 0.95):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.index = VectorIndex(self.embedder.dim, capacity)
+        self._scope_ids: Dict[str, int] = {}
+        self._next_scope = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _scope(self, scope: str, create: bool = False) -> Optional[int]:
+        # caller holds the lock; lookups never add a scope
+        if scope not in self._scope_ids and create:
+            self._scope_ids[scope] = self._next_scope
+            self._next_scope += 1
+        return self._scope_ids.get(scope)
+
+    def search(self, text: str, scope: str = "", k: int = 5) -> List[Dict[str, Any]]:
+        """The k most similar stored texts, whatever their similarity"""
+        vector = self.embedder(text)
+        with self._lock:
+            scope_id = self._scope(scope)
+            if scope_id is None:
+                return []
+            matches = self.index.search(vector, scope_id, k)
+            return [dict(self.index.payloads[row], score=score) for row, score in matches]
+
+    def get(self, text: str, scope: str = "", threshold: Optional[float] = None,
+            k: int = 5) -> Optional[Dict[str, Any]]:
+        """{"text", "value", "score"} of the closest match above the threshold, or None
+
+        The closest of the top k that agrees on key terms wins, so "...in
+        Python" never returns the draft stored for "...in Go".
+        """
+        threshold = self.threshold if threshold is None else threshold
+        vector = self.embedder(text)
+        keys = key_terms(text)
+        with self._lock:
+            scope_id = self._scope(scope)
+            matches = self.index.search(vector, scope_id, k) if scope_id is not None else []
+            for row, score in matches:
+                if score < threshold:
+                    break
+                if self.index.payloads[row]["keys"] == keys:
+                    self.index.touch(row)
+                    self._stats["hits"] += 1
+                    payload = dict(self.index.payloads[row], score=score)
+                    del payload["keys"]
+                    return payload
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, text: str, value: str, scope: str = ""):
+        vector = self.embedder(text)
+        with self._lock:
+            self.index.add(vector, self._scope(scope, create=True),
+                           {"text": text, "value": value, "created": time.time(),
+                            "keys": key_terms(text)})
+            if len(self._scope_ids) > len(self.index.scope_sizes):
+                # the last entry of some scope was evicted
+                self._scope_ids = {name: scope_id for name, scope_id in self._scope_ids.items()
+                                   if scope_id in self.index.scope_sizes}
+
+    def __len__(self) -> int:
+        return self.index.size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(self._stats, entries=self.index.size, capacity=self.index.capacity,
+                        evictions=self.index.evictions,
+                        hit_rate=self._stats["hits"] / lookups if lookups else 0.0)
@@ -0,0 +1,223 @@
+# Single Flight - Coalesces identical in-flight LLM calls across sessions
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+
+class _Flight:
+    # one running call: the chunks produced so far and how it ended
+    __slots__ = ("chunks", "done", "error", "waiters", "listeners", "cond")
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiters: List[Callable[[], None]] = []
+        # async stream followers, woken on every chunk and when it lands
+        self.listeners: List[Callable[[], None]] = []
+        self.cond = threading.Condition()
+
+    def result(self) -> str:
+        if self.error is not None:
+            raise self.error
+        return "".join(self.chunks)
+
+
+class SingleFlight:
+    """Runs each key's call once at a time; later callers share its output
+
+    A caller whose key is already in flight attaches to the running call
+    instead of starting its own: call/acall waiters get the same result
+    (or error), stream/astream subscribers replay the chunks so far and
+    then follow live. A flight is forgotten as soon as it ends, so pair this
+    with a ResponseCache to reuse outputs afterwards.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0}
+        # running astream pumps, kept so they are not garbage collected
+        self._pumps: Set[asyncio.Task] = set()
+
+    def _join(self, key: str) -> Tuple[_Flight, bool]:
+        # the flight for key and whether this caller has to run it
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats["followers"] += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self._stats["leaders"] += 1
+            return flight, True
+
+    def _publish(self, flight: _Flight, chunk: str):
+        with flight.cond:
+            flight.chunks.append(chunk)
+            flight.cond.notify_all()
+            listeners = list(flight.listeners)
+        for wake in listeners:
+            wake()
+
+    def _land(self, key: str, flight: _Flight, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.cond:
+            flight.done = True
+            flight.error = error
+            waiters, flight.waiters = flight.waiters + flight.listeners, []
+            flight.cond.notify_all()
+        for wake in waiters:
+            wake()
+
+    def _wait(self, flight: _Flight) -> str:
+        with flight.cond:
+            flight.cond.wait_for(lambda: flight.done)
+        return flight.result()
+
+    def call(self, key: str, fn: Callable[[], str],
+             on_follow: Optional[Callable[[], None]] = None) -> str:
+        """fn(), or the result of the identical call already running"""
+        flight, leader = self._join(key)
+        if not leader:
+            if on_follow:
+                on_follow()
+            return self._wait(flight)
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, flight, e)
+            raise
+        self._publish(flight, result)
+        self._land(key, flight)
+        return result
+
+    async def acall(self, key: str, fn: Callable[[], Any],
+                    on_follow: Optional[Callable[[], None]] = None) -> str:
+        """Like call, for a coroutine function; followers wait without blocking the loop"""
+        flight, leader = self._join(key)
+        if not leader:
+            if on_follow:
+                on_follow()
+            loop = asyncio.get_running_loop()
+            landed = loop.create_future()
+
+            def wake():
+                loop.call_soon_threadsafe(
+                    lambda: landed.done() or landed.set_result(None))
+
+            with flight.cond:
+                if not flight.done:
+                    flight.waiters.append(wake)
+                    wake = None
+            if wake is not None:
+                wake()
+            await landed
+            return flight.result()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._land(key, flight, e)
+            raise
+        self._publish(flight, result)
+        self._land(key, flight)
+        return result
+
+    def stream(self, key: str, start: Callable[[], Iterator[str]],
+               on_follow: Optional[Callable[[], None]] = None) -> Iterator[str]:
+        """Chunks of start(), shared with every caller streaming the same key
+
+        The shared stream runs on its own thread, so it finishes (and
+        fills any cache) even if the caller that started it stops reading.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            threading.Thread(target=self._pump, args=(key, flight, start),
+                             name="sapg-flight", daemon=True).start()
+        elif on_follow:
+            on_follow()
+        return self._follow(flight)
+
+    def _pump(self, key: str, flight: _Flight, start: Callable[[], Iterator[str]]):
+        try:
+            for chunk in start():
+                self._publish(flight, chunk)
+        except BaseException as e:
+            self._land(key, flight, e)
+            return
+        self._land(key, flight)
+
+    def _follow(self, flight: _Flight) -> Iterator[str]:
+        index = 0
+        while True:
+            with flight.cond:
+                flight.cond.wait_for(lambda: index < len(flight.chunks) or flight.done)
+                chunks = flight.chunks[index:]
+                done, error = flight.done, flight.error
+            index += len(chunks)
+            yield from chunks
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+    def astream(self, key: str, start: Callable[[], AsyncIterator[str]],
+                on_follow: Optional[Callable[[], None]] = None) -> AsyncIterator[str]:
+        """Like stream, for an async generator; the shared stream runs as its own task"""
+        flight, leader = self._join(key)
+        if leader:
+            pump = asyncio.ensure_future(self._apump(key, flight, start))
+            self._pumps.add(pump)
+            pump.add_done_callback(self._pumps.discard)
+        elif on_follow:
+            on_follow()
+        return self._afollow(flight)
+
+    async def _apump(self, key: str, flight: _Flight, start: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in start():
+                self._publish(flight, chunk)
+        except BaseException as e:
+            self._land(key, flight, e)
+            return
+        self._land(key, flight)
+
+    async def _afollow(self, flight: _Flight) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(changed.set)
+
+        with flight.cond:
+            flight.listeners.append(wake)
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    # a chunk published after this snapshot sets changed again
+                    changed.clear()
+                    chunks = flight.chunks[index:]
+                    done, error = flight.done, flight.error
+                index += len(chunks)
+                for chunk in chunks:
+                    yield chunk
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+                await changed.wait()
+        finally:
+            with flight.cond:
+                if wake in flight.listeners:
+                    flight.listeners.remove(wake)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
@@ -11,6 +11,16 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 
+@pytest.fixture(autouse=True)
+def clear_llm_pool():
+    """Start every test with an empty LLM client pool."""
+    from llm_factory import LLMFactory
+
+    LLMFactory.close_all()
+    yield
+    LLMFactory.close_all()
+
+
 @pytest.fixture
 def mock_llm():
     """Create a mock LLM for testing."""
@@ -21,6 +31,37 @@ def mock_llm():
     return llm
 
 
+@pytest.fixture
+def fake_stream_llm():
+    """Create a fake chat model that streams its response token by token."""
+    from fake_llm import FakeChatModel
+
+    return FakeChatModel(response="Step 1: plan. Step 2: build. Step 3: test.")
+
+
+@pytest.fixture
+def make_orchestrator(sample_protocol):
+    """Build orchestrators on fake models, given each phase's response.
+
+    A response is the reply text or a function of the prompt, as for
+    FakeChatModel; token_latency slows every phase's stream.
+    """
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+
+    def make(draft="the draft", critique="no issues", revision="the revision",
+             token_latency=0.0, early_exit=False):
+        def llm(response):
+            return FakeChatModel(response=response, token_latency=token_latency)
+
+        return SAPGOrchestrator(DraftAgent(llm(draft), sample_protocol),
+                                CritiqueAgent(llm(critique), sample_protocol),
+                                RevisionAgent(llm(revision), sample_protocol),
+                                early_exit=early_exit)
+
+    return make
+
+
 @pytest.fixture
 def sample_protocol():
     """Return sample protocol for testing."""
@@ -109,3 +109,233 @@ def test_orchestrator_execute():
     # This would require actual LLM
     # For now, just check the method exists
     assert hasattr(SAPGOrchestrator, 'execute')
+
+
+def test_draft_agent_generate_stream(fake_stream_llm, sample_protocol, sample_user_request):
+    """Test DraftAgent streams the draft in several chunks."""
+    from agents import DraftAgent
+
+    agent = DraftAgent(fake_stream_llm, sample_protocol)
+    chunks = list(agent.generate_stream(sample_user_request))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == fake_stream_llm.response
+
+
+def test_critique_agent_critique_stream(fake_stream_llm, sample_protocol,
+                                        sample_user_request, sample_draft_output):
+    """Test CritiqueAgent streams the same text critique() returns."""
+    from agents import CritiqueAgent
+
+    agent = CritiqueAgent(fake_stream_llm, sample_protocol)
+    streamed = "".join(agent.critique_stream(sample_user_request, sample_draft_output))
+
+    assert streamed == agent.critique(sample_user_request, sample_draft_output)
+
+
+def test_revision_agent_revise_stream(fake_stream_llm, sample_protocol, sample_user_request,
+                                      sample_draft_output, sample_critique_output):
+    """Test RevisionAgent streams the final output."""
+    from agents import RevisionAgent
+
+    agent = RevisionAgent(fake_stream_llm, sample_protocol)
+    stream = agent.revise_stream(
+        sample_user_request, sample_draft_output, sample_critique_output)
+
+    # first token arrives before the rest of the output
+    assert next(iter(stream)) == "Step"
+
+
+def test_agent_chain_is_built_once(fake_stream_llm, sample_protocol, sample_user_request):
+    """Test the template and chain are cached between calls."""
+    from agents import DraftAgent
+
+    agent = DraftAgent(fake_stream_llm, sample_protocol)
+    chain = agent.chain
+
+    agent.generate(sample_user_request)
+    agent.generate(sample_user_request)
+
+    assert agent.chain is chain
+    assert agent.template is agent.template
+
+
+def test_agent_chain_invalidated_on_llm_change(fake_stream_llm, sample_protocol,
+                                               sample_user_request):
+    """Test that swapping the LLM or protocol rebuilds the chain."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+
+    agent = DraftAgent(fake_stream_llm, sample_protocol)
+    old_chain = agent.chain
+
+    agent.llm = FakeChatModel(response="New model")
+    assert agent.chain is not old_chain
+    assert agent.generate(sample_user_request) == "New model"
+
+    old_template = agent.template
+    agent.protocol_template = "Other protocol"
+    assert agent.template is not old_template
+    assert "Other protocol" in agent.template.messages[0].content
+
+
+def test_generate_many_keeps_input_order(sample_protocol):
+    """Test a batched wave returns drafts in input order."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+
+    llm = FakeChatModel(response=lambda prompt: prompt.split("TASK:")[1].split()[0])
+    agent = DraftAgent(llm, sample_protocol)
+
+    requests = [f"request-{i} please" for i in range(12)]
+    assert agent.generate_many(requests, max_concurrency=4) == \
+        [f"request-{i}" for i in range(12)]
+
+
+def test_execute_many_isolates_failures(sample_protocol):
+    """Test one failing item does not abort the rest of the batch."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+
+    def respond(prompt):
+        if "REQUEST: bad" in prompt:
+            raise RuntimeError("rate limited")
+        return "ok"
+
+    llm = FakeChatModel(response=respond)
+    orchestrator = SAPGOrchestrator(DraftAgent(llm, sample_protocol),
+                                    CritiqueAgent(llm, sample_protocol),
+                                    RevisionAgent(llm, sample_protocol))
+
+    results = orchestrator.execute_many(["first", "bad", "last"], max_concurrency=2)
+
+    assert [r["user_request"] for r in results] == ["first", "bad", "last"]
+    assert results[0]["revision"] == "ok" and results[2]["revision"] == "ok"
+    assert results[1]["draft"] == "ok"
+    assert results[1]["error"] == "critique: rate limited"
+    assert "revision" not in results[1]
+
+
+def test_ainvoke_many_uses_abatch(sample_protocol):
+    """Test the async wave keeps order too."""
+    import asyncio
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+
+    llm = FakeChatModel(response=lambda prompt: prompt.split("TASK:")[1].split()[0])
+    agent = DraftAgent(llm, sample_protocol)
+
+    outputs = asyncio.run(agent.ainvoke_many(
+        [{"user_request": f"r{i}"} for i in range(5)], max_concurrency=2))
+    assert outputs == [f"r{i}" for i in range(5)]
+
+
+def test_protocol_prefix_is_identical_across_agents(sample_protocol, sample_user_request,
+                                                    sample_draft_output, sample_critique_output):
+    """Test every phase's prompt starts with the same system block."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent
+    from fake_llm import FakeChatModel
+
+    llm = FakeChatModel()
+    prompts = [
+        DraftAgent(llm, sample_protocol).template.format_messages(
+            user_request=sample_user_request),
+        CritiqueAgent(llm, sample_protocol).template.format_messages(
+            user_request=sample_user_request, draft_output=sample_draft_output),
+        RevisionAgent(llm, sample_protocol).template.format_messages(
+            user_request=sample_user_request, draft_output=sample_draft_output,
+            critique=sample_critique_output),
+    ]
+
+    prefixes = [messages[0].content.encode("utf-8") for messages in prompts]
+    assert prefixes[0] == prefixes[1] == prefixes[2]
+    assert all(messages[0].type == "system" for messages in prompts)
+    assert sample_protocol in prompts[0][0].content
+    # the per-phase role lives after the shared prefix
+    assert "Critique Agent" not in prompts[1][0].content
+
+
+def test_prompt_caching_marker(sample_protocol):
+    """Test opting in adds a cache_control breakpoint to the protocol block."""
+    from agents import CritiqueAgent
+    from fake_llm import FakeChatModel
+
+    agent = CritiqueAgent(FakeChatModel(), sample_protocol)
+    assert isinstance(agent.template.messages[0].content, str)
+
+    agent.prompt_caching = True
+    block = agent.template.messages[0].content[0]
+    assert block["cache_control"] == {"type": "ephemeral"}
+    assert block["text"].endswith(sample_protocol)
+
+
+def test_multi_critique_merges_findings(sample_protocol, sample_user_request):
+    """Test the focused critics' findings are merged into one parseable verdict."""
+    from agents import CRITIC_FOCUSES, MultiCritiqueAgent
+    from fake_llm import FakeChatModel
+
+    def respond(prompt):
+        if "Security Critic" in prompt:
+            return '```json\n{"issues": [{"severity": "critical", "issue": "SQL injection in login"}]}\n```'
+        return '```json\n{"issues": [{"severity": "major", "issue": "sql injection in the login"}]}\n```'
+
+    agent = MultiCritiqueAgent(FakeChatModel(response=respond), sample_protocol)
+    critique = agent.critique(sample_user_request, "1. Build the query")
+
+    assert len(agent.critics) == len(CRITIC_FOCUSES)
+    verdict = agent.verdict(critique)
+    assert verdict.issues == [{"severity": "critical", "issue": "SQL injection in login",
+                               "critic": "security"}]
+    assert critique.startswith("- [critical] SQL injection in login")
+
+
+def test_multi_critique_runs_critics_concurrently(sample_protocol, sample_user_request):
+    """Test the phase takes about as long as one critic, not the sum of them."""
+    import asyncio
+    import time
+    from agents import MultiCritiqueAgent
+    from fake_llm import FakeChatModel
+
+    agent = MultiCritiqueAgent(FakeChatModel(response="ok", prefill_latency=0.2), sample_protocol)
+
+    start = time.perf_counter()
+    agent.critique(sample_user_request, "draft")
+    assert time.perf_counter() - start < 0.2 * len(agent.critics) / 2
+
+    start = time.perf_counter()
+    asyncio.run(agent.acritique(sample_user_request, "draft"))
+    assert time.perf_counter() - start < 0.2 * len(agent.critics) / 2
+
+
+def test_multi_critique_reuses_critic_chains(sample_protocol, sample_user_request):
+    """Test pushing settings to the critics on each call keeps their chains."""
+    from agents import MultiCritiqueAgent
+    from fake_llm import FakeChatModel
+
+    agent = MultiCritiqueAgent(FakeChatModel(response="ok"), sample_protocol)
+    agent.prompt_caching = True
+    agent.critique(sample_user_request, "draft")
+    chains = [critic.chain for critic in agent.critics]
+
+    agent.critique(sample_user_request, "draft")
+    assert all(critic.chain is chain for critic, chain in zip(agent.critics, chains))
+
+    agent.prompt_caching = False
+    assert all(critic.chain is not chain for critic, chain in zip(agent.critics, chains))
+
+
+def test_multi_critique_in_orchestrator(sample_protocol, sample_user_request):
+    """Test the merged critique drives early exit and batched runs."""
+    from agents import DraftAgent, MultiCritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+
+    clean = FakeChatModel(response='```json\n{"issues": []}\n```')
+    orchestrator = SAPGOrchestrator(
+        DraftAgent(FakeChatModel(response="the draft"), sample_protocol),
+        MultiCritiqueAgent(clean, sample_protocol),
+        RevisionAgent(FakeChatModel(response="revised"), sample_protocol),
+        early_exit=True)
+
+    assert orchestrator.execute(sample_user_request)["revision_skipped"] is True
+    results = orchestrator.execute_many(["one", "two"])
+    assert [r["critique"].splitlines()[0] for r in results] == ["No issues found."] * 2
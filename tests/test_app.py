@@ -0,0 +1,80 @@
+"""
+Tests for the Streamlit app's run modes, driven through its sidebar
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on fake LLMs, with its cache and history files in tmp_path"""
+    testing = pytest.importorskip("streamlit.testing.v1")
+    import streamlit as st
+    from fake_llm import FakeChatModel
+    from llm_factory import LLMFactory
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(LLMFactory, "create_llm", staticmethod(
+        lambda provider, model=None, **settings: FakeChatModel(response="no issues")))
+    monkeypatch.setattr(LLMFactory, "warm_up", staticmethod(
+        lambda model, **kwargs: {"model": model, "seconds": 0.0, "load_seconds": 0.0,
+                                 "cold": False}))
+    st.cache_resource.clear()
+    at = testing.AppTest.from_file(APP, default_timeout=30)
+    at.run()
+    yield at
+    st.cache_resource.clear()
+
+
+def run_audit(at, request):
+    at.text_area[0].set_value(request)
+    next(button for button in at.button if "Execute" in button.label).click()
+    at.run()
+    deadline = time.monotonic() + 10
+    while at.session_state.results is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+        at.run()
+    return at.session_state.results
+
+
+def test_critique_rounds_switch_to_the_iterative_loop(app, monkeypatch):
+    """Test more than one critique round runs execute_iterative with the budgets."""
+    from agents import SAPGOrchestrator
+
+    calls = []
+
+    def execute_iterative(self, user_request, max_rounds, partial=None, progress=None,
+                          **budgets):
+        calls.append(dict(budgets, max_rounds=max_rounds))
+        return {"user_request": user_request, "draft": "d", "critique": "c",
+                "revision": "r", "rounds": [], "stop_reason": "no_issues"}
+
+    monkeypatch.setattr(SAPGOrchestrator, "execute_iterative", execute_iterative)
+    app.number_input(key="rounds").set_value(3)
+    app.run()
+    app.number_input(key="rounds_max_tokens").set_value(5000)
+    app.run()
+
+    results = run_audit(app, "Build a todo app")
+
+    assert calls == [{"max_rounds": 3, "similarity_threshold": 0.98, "max_seconds": None,
+                      "max_tokens": 5000}]
+    assert results["stop_reason"] == "no_issues"
+
+
+def test_one_round_is_a_single_pass(app, monkeypatch):
+    """Test the default single round never enters the iterative loop."""
+    from agents import SAPGOrchestrator
+
+    monkeypatch.setattr(SAPGOrchestrator, "execute_iterative",
+                        lambda *args, **kwargs: pytest.fail("iterative loop used"))
+
+    results = run_audit(app, "Build a todo app")
+
+    assert results["revision"] == "no issues"
+    assert "stop_reason" not in results
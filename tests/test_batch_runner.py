@@ -0,0 +1,108 @@
+"""
+Tests for the headless batch runner
+"""
+
+import json
+
+
+def agents(orchestrator):
+    return orchestrator.draft_agent, orchestrator.critique_agent, orchestrator.revision_agent
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_read_requests_jsonl_and_csv(tmp_path):
+    """Test requests are read from JSONL and CSV with ids."""
+    from batch_runner import read_requests
+
+    jsonl = tmp_path / "in.jsonl"
+    write_jsonl(jsonl, [{"id": "a", "request": "one"}, {"prompt": "two"}, {"other": 1}])
+    assert list(read_requests(str(jsonl))) == [
+        {"id": "a", "request": "one"}, {"id": "1", "request": "two"}]
+
+    csv_file = tmp_path / "in.csv"
+    csv_file.write_text("id,request\nx,first\ny,second\n")
+    assert [r["id"] for r in read_requests(str(csv_file))] == ["x", "y"]
+
+
+def test_run_batch_writes_results_and_report(tmp_path, make_orchestrator):
+    """Test every request gets a result line and the report counts them."""
+    from batch_runner import run_batch
+
+    output = tmp_path / "out.jsonl"
+    records = ({"id": str(i), "request": f"request {i}"} for i in range(10))
+
+    report = run_batch(records, *agents(make_orchestrator(revision="output")),
+                       str(output), workers=3)
+
+    results = read_jsonl(output)
+    assert sorted(r["id"] for r in results) == sorted(str(i) for i in range(10))
+    assert all(r["revision"] == "output" for r in results)
+    assert report["ok"] == 10
+    assert report["latency"]["draft"]["count"] == 10
+    assert report["requests_per_min"] > 0
+
+
+def test_run_batch_resumes_from_checkpoint(tmp_path, make_orchestrator):
+    """Test a rerun skips successful ids and retries failed ones."""
+    from batch_runner import run_batch
+
+    output = tmp_path / "out.jsonl"
+    write_jsonl(output, [{"id": "0", "revision": "done"}, {"id": "1", "error": "timeout"}])
+    output.write_text(output.read_text() + '{"id": "2", "rev')  # torn line
+
+    records = [{"id": str(i), "request": f"request {i}"} for i in range(3)]
+    report = run_batch(records, *agents(make_orchestrator()), str(output))
+
+    assert report["skipped"] == 1
+    assert report["ok"] == 2
+    lines = output.read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines[3:]] in (["1", "2"], ["2", "1"])
+
+
+def test_run_batch_isolates_failures(tmp_path, make_orchestrator):
+    """Test a failing request is recorded without stopping the batch."""
+    from batch_runner import run_batch
+
+    def respond(prompt):
+        if "explode" in prompt:
+            raise RuntimeError("provider error")
+        return "output"
+
+    output = tmp_path / "out.jsonl"
+    records = [{"id": "ok", "request": "fine"}, {"id": "bad", "request": "explode"}]
+    report = run_batch(records, *agents(make_orchestrator(respond, respond, respond)),
+                       str(output))
+
+    results = {r["id"]: r for r in read_jsonl(output)}
+    assert results["bad"]["error"] == "provider error"
+    assert "revision" in results["ok"]
+    assert report["failed"] == 1
+
+
+def test_checkpoint_keeps_last_result_per_id(tmp_path):
+    """Test success sticks, a later failure's partial wins, and torn lines are skipped."""
+    from batch_runner import Checkpoint
+
+    output = tmp_path / "out.jsonl"
+    write_jsonl(output, [{"id": "a", "error": "timeout", "partial": {"draft": "old"}},
+                         {"id": "b", "revision": "done"},
+                         {"id": "a", "error": "timeout", "partial": {"draft": "new"}},
+                         {"id": "b", "error": "timeout"},
+                         {"id": "c", "error": "timeout"}])
+    output.write_text(output.read_text() + '{"id": "d", "rev')
+
+    checkpoint = Checkpoint(str(output))
+    assert (checkpoint.done("a"), checkpoint.done("b"), checkpoint.done("d")) == (
+        False, True, False)
+    assert checkpoint.partial("a") == {"draft": "new"}
+    assert checkpoint.partial("b") is None
+    assert checkpoint.partial("c") == {}
+    assert checkpoint.partial("d") is None
+    checkpoint.close()
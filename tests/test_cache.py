@@ -0,0 +1,133 @@
+"""
+Tests for the response cache
+"""
+
+import time
+
+
+def test_make_key_changes_with_inputs():
+    """Test that every keyed field changes the cache key."""
+    from cache import make_key
+
+    base = make_key("ollama", "llama2", 0.3, "Draft Agent", "prompt", "1.0")
+    assert base == make_key("ollama", "llama2", 0.3, "Draft Agent", "prompt", "1.0")
+    assert base != make_key("openai", "llama2", 0.3, "Draft Agent", "prompt", "1.0")
+    assert base != make_key("ollama", "llama2", 0.7, "Draft Agent", "prompt", "1.0")
+    assert base != make_key("ollama", "llama2", 0.3, "Critique Agent", "prompt", "1.0")
+    assert base != make_key("ollama", "llama2", 0.3, "Draft Agent", "prompt", "1.1")
+
+
+def test_output_limits_change_the_key(sample_protocol):
+    """Test phases capped at different output lengths never share an entry."""
+    import pytest
+    pytest.importorskip("langchain_ollama")
+    from langchain_ollama import ChatOllama
+    from agents import CritiqueAgent
+
+    inputs = {"user_request": "request", "draft_output": "draft"}
+    uncapped = CritiqueAgent(ChatOllama(model="phi"), sample_protocol).cache_key(inputs)
+    capped = CritiqueAgent(ChatOllama(model="phi", num_predict=800),
+                           sample_protocol).cache_key(inputs)
+    short_context = CritiqueAgent(ChatOllama(model="phi", num_ctx=2048),
+                                  sample_protocol).cache_key(inputs)
+
+    assert len({uncapped, capped, short_context}) == 3
+    assert capped == CritiqueAgent(ChatOllama(model="phi", num_predict=800),
+                                   sample_protocol).cache_key(inputs)
+
+
+def test_memory_lru_eviction():
+    """Test the memory tier drops the least recently used entry."""
+    from cache import ResponseCache
+
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    """Test that expired entries count as misses."""
+    from cache import ResponseCache
+
+    cache = ResponseCache(ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Test that entries are read back from SQLite by a new cache."""
+    from cache import ResponseCache
+
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path=path)
+    cache.set("a", "draft text")
+    cache.close()
+
+    reopened = ResponseCache(path=path)
+    assert reopened.get("a") == "draft text"
+    assert reopened.stats()["disk_hits"] == 1
+    # second read is served from memory
+    assert reopened.get("a") == "draft text"
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_disk_tier_size_limit(tmp_path):
+    """Test the disk tier is trimmed to max_disk_entries."""
+    from cache import ResponseCache
+
+    cache = ResponseCache(max_entries=1, path=str(tmp_path / "c.sqlite"), max_disk_entries=2)
+    for key in "abc":
+        cache.set(key, key)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+
+
+def test_agents_reuse_cached_phases(sample_protocol, sample_user_request):
+    """Test a repeated run is served from the cache without calling the LLM."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from cache import ResponseCache
+    from fake_llm import FakeChatModel
+
+    calls = []
+
+    def respond(prompt):
+        calls.append(prompt)
+        return "output"
+
+    llm = FakeChatModel(response=respond)
+    cache = ResponseCache()
+    orchestrator = SAPGOrchestrator(
+        DraftAgent(llm, sample_protocol, cache),
+        CritiqueAgent(llm, sample_protocol, cache),
+        RevisionAgent(llm, sample_protocol, cache),
+    )
+
+    first = orchestrator.execute(sample_user_request)
+    second = orchestrator.execute(sample_user_request)
+
+    assert first == second
+    assert len(calls) == 3
+    assert cache.stats()["hits"] == 3
+
+
+def test_stream_uses_cache(fake_stream_llm, sample_protocol, sample_user_request):
+    """Test a streamed draft is stored and replayed from the cache."""
+    from agents import DraftAgent
+    from cache import ResponseCache
+
+    agent = DraftAgent(fake_stream_llm, sample_protocol, ResponseCache())
+    streamed = "".join(agent.generate_stream(sample_user_request))
+
+    assert agent.generate(sample_user_request) == streamed
+    assert agent.cache.stats()["hits"] == 1
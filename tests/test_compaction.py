@@ -0,0 +1,99 @@
+"""
+Tests for token-budget prompt compaction
+"""
+
+
+DRAFT = """Plan for a login system:
+1. Create the login form with username and password fields.
+2. Hash passwords with bcrypt before storing them.
+3. Add rate limiting to the login endpoint.
+4. Redirect to the dashboard after login."""
+
+
+def test_select_referenced_steps():
+    """Test only the steps named by the critique are kept."""
+    from compaction import select_referenced_steps
+
+    compacted = select_referenced_steps(DRAFT, "Step 2 uses weak salt. Step 3 lacks lockout.")
+
+    assert compacted.startswith("Plan for a login system:")
+    assert "2. Hash passwords" in compacted
+    assert "3. Add rate limiting" in compacted
+    assert "1. Create the login form" not in compacted
+    assert "[steps 1, 4 omitted" in compacted
+
+
+def test_select_referenced_steps_without_references():
+    """Test the draft is untouched when the critique names no steps."""
+    from compaction import select_referenced_steps
+
+    assert select_referenced_steps(DRAFT, "Looks fine overall.") == DRAFT
+
+
+def test_truncate_middle_fits_budget():
+    """Test truncation keeps the head and tail within the budget."""
+    from compaction import approx_tokens, truncate_middle
+
+    text = "start " + "filler " * 500 + "end"
+    trimmed = truncate_middle(text, 100)
+
+    assert trimmed.startswith("start")
+    assert trimmed.endswith("end")
+    assert "tokens omitted" in trimmed
+    assert approx_tokens(trimmed) <= 110
+
+
+def test_compactor_leaves_small_prompts_alone():
+    """Test prompts under budget pass through and are still recorded."""
+    from compaction import PromptCompactor
+
+    compactor = PromptCompactor(budget=1000)
+    inputs = {"user_request": "login", "draft_output": DRAFT, "critique": "Step 2 is weak"}
+
+    assert compactor.compact("Revision Agent", inputs) == inputs
+    assert compactor.stats("Revision Agent")["saved"] == 0
+
+
+def test_compactor_is_deterministic_and_within_budget():
+    """Test an oversized revision prompt is trimmed the same way every time."""
+    from compaction import PromptCompactor
+
+    compactor = PromptCompactor(budget=300)
+    inputs = {"user_request": "login",
+              "draft_output": DRAFT + "\n" + "\n".join(f"{i}. detail " * 20 for i in range(5, 30)),
+              "critique": "Step 2 uses weak salt. " * 40}
+
+    first = compactor.compact("Revision Agent", inputs, overhead=50)
+    second = compactor.compact("Revision Agent", inputs, overhead=50)
+
+    assert first == second
+    assert first["user_request"] == "login"
+    stats = compactor.stats("Revision Agent")
+    assert stats["calls"] == 2 and stats["compacted"] == 2
+    assert stats["tokens_after"] // 2 <= 320
+    assert stats["saved"] > 0
+
+
+def test_agent_applies_compactor(sample_protocol):
+    """Test the revision agent sends the compacted prompt to the LLM."""
+    from agents import RevisionAgent
+    from compaction import PromptCompactor
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+
+    prompts = []
+    agent = RevisionAgent(FakeChatModel(response=lambda p: prompts.append(p) or "ok"),
+                          sample_protocol)
+    agent.compactor = PromptCompactor(budget=250)
+    agent.metrics = MetricsRegistry()
+
+    agent.revise("login", DRAFT + "\n" + "padding " * 400, "Step 3 lacks lockout.")
+
+    assert "3. Add rate limiting" in prompts[0]
+    assert "1. Create the login form" not in prompts[0]
+    saved = agent.compactor.stats("revision")["saved"]
+    assert saved > 0
+    stats = agent.metrics.snapshot()["revision"]
+    assert stats["counters"]["compacted"] == 1
+    assert stats["counters"]["prompt_tokens_saved"] == saved
+    assert stats["prompt_tokens_after"]["mean"] <= 250 < stats["prompt_tokens_before"]["mean"]
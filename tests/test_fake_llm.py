@@ -0,0 +1,62 @@
+"""
+Tests for the fake chat model used by tests and benchmarks
+"""
+
+import time
+
+import pytest
+
+
+def test_output_tokens_sets_length():
+    """Test output_tokens repeats or cuts the response."""
+    from fake_llm import FakeChatModel, split_tokens
+
+    long = FakeChatModel(response="a b", output_tokens=5).invoke("hi").content
+    short = FakeChatModel(response="a b c d", output_tokens=2).invoke("hi").content
+
+    assert len(split_tokens(long)) == 5
+    assert short == "a b"
+
+
+def test_prefill_and_token_latency():
+    """Test the first streamed token waits for the prefill latency."""
+    from fake_llm import FakeChatModel
+
+    llm = FakeChatModel(response="a b c", prefill_latency=0.05, token_latency=0.01)
+
+    start = time.perf_counter()
+    stream = llm.stream("hi")
+    next(stream)
+    first_token = time.perf_counter() - start
+    list(stream)
+    total = time.perf_counter() - start
+
+    assert first_token >= 0.05
+    assert total >= 0.08
+
+
+def test_failure_rate_is_seeded():
+    """Test the same seed fails on the same calls."""
+    from fake_llm import FakeChatModel, FakeLLMError
+
+    def outcomes(seed):
+        llm = FakeChatModel(failure_rate=0.5, seed=seed)
+        results = []
+        for _ in range(20):
+            try:
+                llm.invoke("hi")
+                results.append(True)
+            except FakeLLMError:
+                results.append(False)
+        return results
+
+    assert outcomes(1) == outcomes(1)
+    assert 0 < outcomes(1).count(False) < 20
+
+
+def test_failure_rate_one_always_fails():
+    """Test failure_rate=1 always raises."""
+    from fake_llm import FakeChatModel, FakeLLMError
+
+    with pytest.raises(FakeLLMError):
+        FakeChatModel(failure_rate=1.0).invoke("hi")
@@ -0,0 +1,146 @@
+"""
+Tests for the durable run history
+"""
+
+import time
+
+import pytest
+
+
+def make_results(request, text="x"):
+    return {"user_request": request, "draft": text * 500, "critique": "no issues",
+            "revision": text * 500}
+
+
+@pytest.fixture
+def store(tmp_path):
+    from history import RunStore
+
+    store = RunStore(str(tmp_path / "runs.sqlite"))
+    yield store
+    store.close()
+
+
+def test_runs_round_trip_compressed_and_survive_reopening(tmp_path):
+    """Test a run reads back whole after reopening, with its phases compressed."""
+    from history import RunStore
+
+    path = str(tmp_path / "runs.sqlite")
+    store = RunStore(path)
+    run_id = store.add(make_results("Write a haiku"), "ollama", "mistral", seconds=4.2)
+    payload = store._db.execute("SELECT payload FROM runs").fetchone()[0]
+    assert store._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+    run = RunStore(path).get(run_id)
+    assert run["results"] == make_results("Write a haiku")
+    assert (run["provider"], run["model"], run["seconds"]) == ("ollama", "mistral", 4.2)
+    assert run["title"] == "Write a haiku"
+    assert len(payload) < 200
+
+
+def test_pages_and_filters(store):
+    """Test keyset pages cover every run once, newest first, and filters apply."""
+    now = time.time()
+    store.add_many([{"results": make_results(f"request {i % 3}"), "provider": "ollama",
+                     "model": "phi" if i % 2 else "mistral", "created": now + i}
+                    for i in range(45)])
+
+    seen, before = [], None
+    while True:
+        page = store.list(20, before=before)
+        if not page:
+            break
+        seen += [run["id"] for run in page]
+        before = page[-1]["id"]
+    assert seen == list(range(45, 0, -1))
+
+    assert {run["model"] for run in store.list(50, model="phi")} == {"phi"}
+    assert len(store.list(50, user_request="  request 1\n")) == 15
+    assert len(store.list(50, since=now + 40)) == 5
+    assert store.latest("request 2", "ollama", "phi")["id"] == 42
+    assert store.latest("never asked") is None
+    assert store.stats()["runs"] == 45
+
+
+def test_lookups_use_indexes(store):
+    """Test listing, filtering and opening never scan the whole table."""
+    queries = [
+        ("SELECT id FROM runs WHERE id < ? ORDER BY id DESC LIMIT 20", (100,)),
+        ("SELECT id FROM runs WHERE request_hash = ? AND id < ? ORDER BY id DESC LIMIT 20",
+         ("h", 100)),
+        ("SELECT id FROM runs WHERE provider = ? AND model = ? ORDER BY id DESC LIMIT 20",
+         ("ollama", "phi")),
+        ("SELECT id FROM runs WHERE created >= ? AND created < ? ORDER BY id DESC LIMIT 20",
+         (0.0, 3600.0)),
+        ("SELECT payload FROM runs WHERE id = ?", (1,)),
+    ]
+    for sql, params in queries:
+        plan = [row[-1] for row in store._db.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        # a time window sorts just the runs inside it
+        assert all(step.startswith(("SEARCH", "USE TEMP B-TREE")) for step in plan), (sql, plan)
+
+
+def test_time_window_includes_backfilled_runs(store):
+    """Test runs added with an older `created` than their neighbours stay in their window."""
+    now = time.time()
+    store.add_many([{"results": make_results(f"request {i}"), "created": now + i}
+                    for i in range(10)])
+    old = store.add(make_results("imported"), created=now - 3600)
+    store.add(make_results("newest"), created=now + 100)
+
+    assert [run["id"] for run in store.list(50, since=now - 3700, until=now - 3500)] == [old]
+    assert old not in [run["id"] for run in store.list(50, since=now)]
+    assert len(store.list(50, since=now + 5, until=now + 8)) == 3
+
+
+def test_recorded_job_saves_finished_runs(store, make_orchestrator):
+    """Test a recorded job saves its run with phase timings and returns the id."""
+    from jobs import JobExecutor, audit_job, recorded
+
+    orchestrator = make_orchestrator()
+    executor = JobExecutor(max_workers=1)
+    job_id = executor.submit(recorded(audit_job(orchestrator), store, provider="ollama",
+                                      model="mistral"), "request")
+    deadline = time.monotonic() + 5.0
+    while executor.get(job_id)["status"] != "done" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    result = executor.get(job_id)["result"]
+    run = store.get(result["run_id"])
+    assert run["results"]["draft"] == "the draft"
+    assert set(run["results"]["timings"]) == {"draft", "critique", "revision"}
+    assert run["model"] == "mistral" and run["seconds"] >= 0
+
+
+def test_runs_match_on_their_routes(store):
+    """Test "already audited" only matches a run made by the same model in every phase."""
+    same = {"draft": "ollama:mistral", "critique": "ollama:mistral", "revision": "ollama:mistral"}
+    mixed = dict(same, critique="openai:gpt-4o-mini")
+    first = store.add(make_results("request"), "ollama", "mistral", routes=same)
+    second = store.add(make_results("request"), "ollama", "mistral", routes=mixed)
+
+    assert store.latest("request", routes=same)["id"] == first
+    assert store.latest("request", routes=mixed)["id"] == second
+    assert store.get(second)["routes"] == mixed
+    assert store.latest("request", routes=dict(same, draft="ollama:phi")) is None
+
+
+def test_old_database_gains_routes_column(tmp_path):
+    """Test a history file from before routes were saved still opens and lists."""
+    import sqlite3
+    from history import RunStore, pack
+
+    path = str(tmp_path / "runs.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, "
+               "request_hash TEXT NOT NULL, title TEXT NOT NULL, provider TEXT, model TEXT, "
+               "status TEXT NOT NULL, seconds REAL, payload BLOB NOT NULL)")
+    db.execute("INSERT INTO runs (created, request_hash, title, status, payload) "
+               "VALUES (0, 'h', 'old run', 'done', ?)", (pack(make_results("old")),))
+    db.commit()
+    db.close()
+
+    store = RunStore(path)
+    assert store.list()[0]["routes"] is None
+    store.close()
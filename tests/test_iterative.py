@@ -0,0 +1,111 @@
+"""
+Tests for the bounded multi-round critique/revision loop
+"""
+
+BLOCKING = '```json\n{"issues": [{"severity": "major", "issue": "no retries"}]}\n```'
+CLEAN = '```json\n{"issues": []}\n```'
+DRAFT = "line one\nline two"
+
+
+def scripted(prompts, name, replies):
+    """Response that records each prompt under name and plays replies in turn."""
+    prompts.setdefault(name, [])
+
+    def respond(prompt):
+        prompts[name].append(prompt)
+        return replies[min(len(prompts[name]), len(replies)) - 1]
+    return respond
+
+
+def test_stops_when_critique_is_clean(make_orchestrator):
+    """Test the loop ends as soon as a follow-up critique finds nothing."""
+    prompts = {}
+    orchestrator = make_orchestrator(
+        draft=DRAFT, critique=scripted(prompts, "critique", [BLOCKING, CLEAN]),
+        revision=scripted(prompts, "revision", ["line one\nline two with retries"]))
+
+    results = orchestrator.execute_iterative("request", max_rounds=5)
+
+    assert results["stop_reason"] == "no_issues"
+    assert len(results["rounds"]) == 1
+    assert results["revision"] == "line one\nline two with retries"
+
+
+def test_followup_rounds_only_send_the_diff(make_orchestrator):
+    """Test later critiques get the diff and previous issues, not the history."""
+    prompts = {}
+    orchestrator = make_orchestrator(
+        draft=DRAFT, critique=scripted(prompts, "critique", [BLOCKING, BLOCKING, CLEAN]),
+        revision=scripted(prompts, "revision", ["line one\nline two with retries",
+                                                "line one\nline two with retries and backoff"]))
+
+    results = orchestrator.execute_iterative("request", max_rounds=5, similarity_threshold=1.0)
+
+    assert len(results["rounds"]) == 2
+    followup = prompts["critique"][1]
+    assert "+line two with retries" in followup
+    assert "-line two" in followup
+    assert "no retries" in followup
+    assert "DRAFT:" not in followup
+
+
+def test_stops_on_convergence(make_orchestrator):
+    """Test near-identical successive revisions end the loop."""
+    prompts = {}
+    orchestrator = make_orchestrator(
+        draft=DRAFT, critique=scripted(prompts, "critique", [BLOCKING]),
+        revision=scripted(prompts, "revision", ["line one\nline two."]))
+
+    results = orchestrator.execute_iterative("request", max_rounds=5, similarity_threshold=0.9)
+
+    assert results["stop_reason"] == "converged"
+    assert results["rounds"][0]["similarity"] >= 0.9
+
+
+def test_stops_at_max_rounds(make_orchestrator):
+    """Test the loop never runs more than max_rounds revisions."""
+    prompts = {}
+    orchestrator = make_orchestrator(
+        draft=DRAFT, critique=scripted(prompts, "critique", [BLOCKING]),
+        revision=scripted(prompts, "revision",
+                          [f"version {i}\n" + "x" * i * 10 for i in range(1, 10)]))
+
+    results = orchestrator.execute_iterative("request", max_rounds=3, similarity_threshold=1.0)
+
+    assert results["stop_reason"] == "max_rounds"
+    assert len(prompts["revision"]) == 3
+
+
+def test_token_and_time_budgets(make_orchestrator):
+    """Test budgets stop the loop before the next LLM call."""
+    prompts = {}
+    orchestrator = make_orchestrator(
+        draft=DRAFT, critique=scripted(prompts, "critique", [BLOCKING]),
+        revision=scripted(prompts, "revision", ["changed text"]))
+
+    results = orchestrator.execute_iterative("request", max_tokens=1)
+    assert results["stop_reason"] == "token_budget"
+    assert prompts["revision"] == []
+    assert results["revision"] == results["draft"]
+
+    results = orchestrator.execute_iterative("request", max_seconds=0)
+    assert results["stop_reason"] == "time_budget"
+
+
+def test_followup_agent_is_kept_between_runs(make_orchestrator):
+    """Test the follow-up critic keeps its chain and follows the critique agent's settings."""
+    prompts = {}
+    orchestrator = make_orchestrator(
+        draft=DRAFT, critique=scripted(prompts, "critique", [BLOCKING, CLEAN]),
+        revision=scripted(prompts, "revision", ["line one\nline two with retries"]))
+    orchestrator.critique_agent.prompt_caching = True
+
+    orchestrator.execute_iterative("request", max_rounds=5)
+    followup = orchestrator.followup_agent
+    chain = followup.chain
+    orchestrator.execute_iterative("another request", max_rounds=5)
+
+    assert orchestrator.followup_agent is followup
+    assert followup.chain is chain
+    assert followup.prompt_caching
+    assert followup.llm is orchestrator.critique_agent.llm
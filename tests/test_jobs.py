@@ -0,0 +1,132 @@
+"""
+Tests for running SAP audits as background jobs
+"""
+
+import threading
+import time
+
+import pytest
+
+
+def wait_for(executor, job_id, timeout=5.0):
+    """Poll a job until it leaves the queued/running states."""
+    from jobs import ACTIVE_STATES
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = executor.get(job_id)
+        if job["status"] not in ACTIVE_STATES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_audit_job_runs_every_phase(make_orchestrator):
+    """Test a submitted audit finishes with each phase in its outputs."""
+    from jobs import JobExecutor, audit_job
+
+    executor = JobExecutor(max_workers=2)
+    job_id = executor.submit(audit_job(make_orchestrator()), "request")
+    job = wait_for(executor, job_id)
+
+    assert job["status"] == "done"
+    assert job["result"]["revision"] == "the revision"
+    assert job["outputs"] == {"draft": "the draft", "critique": "no issues",
+                              "revision": "the revision"}
+    executor.shutdown()
+
+
+def test_failed_job_keeps_finished_phases(make_orchestrator):
+    """Test a failing phase leaves the earlier phases for a resume."""
+    from jobs import JobExecutor, audit_job
+
+    def broken(prompt):
+        raise RuntimeError("provider error")
+
+    executor = JobExecutor()
+    job_id = executor.submit(audit_job(make_orchestrator(critique=broken)),
+                             "request")
+    job = wait_for(executor, job_id)
+
+    assert job["status"] == "failed"
+    assert job["error"] == "provider error"
+    assert job["partial"]["draft"] == "the draft"
+    assert "critique" not in job["partial"]
+
+    resumed = executor.submit(audit_job(make_orchestrator(),
+                                        partial=job["partial"]), "request")
+    assert wait_for(executor, resumed)["result"]["critique"] == "no issues"
+    executor.shutdown()
+
+
+def test_cancel_stops_a_running_job(make_orchestrator):
+    """Test cancelling ends a job at its next streamed token."""
+    from jobs import JobExecutor, audit_job
+
+    executor = JobExecutor()
+    orchestrator = make_orchestrator(token_latency=0.05)
+    job_id = executor.submit(audit_job(orchestrator), "request")
+    while executor.get(job_id)["status"] != "running":
+        time.sleep(0.01)
+
+    assert executor.cancel(job_id)
+    job = wait_for(executor, job_id)
+
+    assert job["status"] == "cancelled"
+    assert "critique" not in job["outputs"]
+    assert not executor.cancel(job_id)
+    executor.shutdown()
+
+
+BLOCKING = '```json\n{"issues": [{"severity": "critical", "issue": "no retries"}]}\n```'
+
+
+@pytest.mark.parametrize("options", [{"pipelined": True}, {"max_rounds": 3}])
+def test_every_mode_reports_phases_and_can_be_cancelled(make_orchestrator, options):
+    """Test pipelined and multi-round jobs stream their phases and stop on cancel."""
+    from jobs import ACTIVE_STATES, JobExecutor, audit_job
+
+    def make(critique_latency):
+        return make_orchestrator(
+            draft="1. Build the service with retries and logs",
+            critique=lambda prompt: time.sleep(critique_latency) or BLOCKING)
+
+    executor = JobExecutor()
+    job = wait_for(executor, executor.submit(audit_job(make(0.0), **options), "request"))
+    assert job["status"] == "done"
+    assert set(job["outputs"]) == {"draft", "critique", "revision"}
+
+    job_id = executor.submit(audit_job(make(0.3), **options), "request")
+    while executor.get(job_id)["phase"] != "critique" and \
+            executor.get(job_id)["status"] in ACTIVE_STATES:
+        time.sleep(0.01)
+    executor.cancel(job_id)
+    job = wait_for(executor, job_id)
+
+    assert job["status"] == "cancelled"
+    assert "revision" not in job["outputs"]
+    executor.shutdown()
+
+
+def test_submit_does_not_block_and_old_jobs_are_evicted():
+    """Test submit returns at once and only max_finished finished jobs are kept."""
+    from jobs import JobExecutor
+
+    release = threading.Event()
+    executor = JobExecutor(max_workers=8, max_finished=3)
+
+    start = time.perf_counter()
+    job_ids = [executor.submit(lambda job: release.wait(5) and {"ok": True}, f"request {i}")
+               for i in range(8)]
+    assert time.perf_counter() - start < 0.5
+    assert executor.active_count() == 8
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while (executor.active_count() or len(executor.jobs()) > 3) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(executor.jobs()) == 3
+    assert executor.get(job_ids[0]) is None
+    assert executor.active_count() == 0
+    executor.shutdown()
@@ -92,3 +92,78 @@ def test_create_llm_with_invalid_provider():
 
     with pytest.raises(ValueError, match="Unknown provider"):
         LLMFactory.create_llm("invalid_provider")
+
+
+@patch('llm_factory.ChatOllama')
+def test_create_llm_reuses_pooled_client(mock_ollama_class):
+    """Test repeated create_llm calls with the same key share one client."""
+    from llm_factory import LLMFactory
+
+    mock_ollama_class.side_effect = lambda **kwargs: Mock()
+
+    first = LLMFactory.create_llm("ollama", "mistral")
+    second = LLMFactory.create_llm("ollama", "mistral")
+    other = LLMFactory.create_llm("ollama", "mistral", temperature=0.9)
+
+    assert first is second
+    assert other is not first
+    assert mock_ollama_class.call_count == 2
+    assert LLMFactory.pool_size() == 2
+
+
+@patch('llm_factory.ChatOllama')
+def test_create_llm_pool_is_thread_safe(mock_ollama_class):
+    """Test concurrent create_llm calls all get one client and spare builds are closed."""
+    from concurrent.futures import ThreadPoolExecutor
+    from llm_factory import LLMFactory
+
+    built = []
+    mock_ollama_class.side_effect = lambda **kwargs: built.append(Mock()) or built[-1]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: LLMFactory.create_llm("ollama", "phi"), range(32)))
+
+    assert all(client is clients[0] for client in clients)
+    assert all(client._client.close.called for client in built if client is not clients[0])
+    assert not clients[0]._client.close.called
+
+
+@patch('llm_factory.ChatOllama')
+def test_slow_build_does_not_block_the_pool(mock_ollama_class):
+    """Test a client that is slow to build never holds up lookups of other models."""
+    import threading
+    from llm_factory import LLMFactory
+
+    started, finish = threading.Event(), threading.Event()
+
+    def build(**kwargs):
+        if kwargs["model"] == "slow":
+            started.set()
+            finish.wait(5)
+        return Mock()
+
+    mock_ollama_class.side_effect = build
+    slow = threading.Thread(target=LLMFactory.create_llm, args=("ollama", "slow"))
+    slow.start()
+    assert started.wait(5)
+    try:
+        assert LLMFactory.create_llm("ollama", "phi") is not None
+        assert not finish.is_set()
+    finally:
+        finish.set()
+        slow.join()
+
+
+@patch('llm_factory.ChatOllama')
+def test_evict_closes_client(mock_ollama_class):
+    """Test evicting a pooled client closes it and builds a new one next time."""
+    from llm_factory import LLMFactory
+
+    mock_ollama_class.side_effect = lambda **kwargs: Mock()
+
+    first = LLMFactory.create_llm("ollama", "mistral")
+    assert LLMFactory.evict("ollama", "mistral") is True
+    first._client.close.assert_called_once()
+
+    assert LLMFactory.create_llm("ollama", "mistral") is not first
+    assert LLMFactory.evict("ollama", "missing") is False
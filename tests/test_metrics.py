@@ -0,0 +1,98 @@
+"""
+Tests for per-phase instrumentation
+"""
+
+import json
+
+
+def test_latency_stats_percentiles():
+    """Test percentiles and mean over recorded samples."""
+    from metrics import LatencyStats
+
+    stats = LatencyStats()
+    for value in range(1, 101):
+        stats.add(value)
+
+    summary = stats.summary()
+    assert summary["count"] == 100
+    assert summary["mean"] == 50.5
+    assert summary["p50"] == 51
+    assert summary["p99"] == 100
+
+
+def test_latency_stats_reservoir_is_bounded():
+    """Test the sample reservoir never grows past its size."""
+    from metrics import LatencyStats
+
+    stats = LatencyStats(size=10)
+    for value in range(1000):
+        stats.add(value)
+
+    assert len(stats.samples) == 10
+    assert stats.count == 1000
+
+
+def test_agent_records_phase_metrics(sample_protocol, sample_user_request):
+    """Test a streamed call records latency, first token and token counts."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+
+    agent = DraftAgent(FakeChatModel(response="a b c d", token_latency=0.005), sample_protocol)
+    agent.metrics = MetricsRegistry()
+
+    "".join(agent.generate_stream(sample_user_request))
+    agent.generate(sample_user_request)
+
+    draft = agent.metrics.snapshot()["draft"]
+    assert draft["counters"]["calls"] == 2
+    assert draft["latency_seconds"]["count"] == 2
+    # streamed call counts chunks, the plain call estimates from the text
+    assert draft["completion_tokens"]["p99"] == 4
+    assert draft["completion_tokens"]["mean"] == 3
+    assert draft["prompt_tokens"]["mean"] > 0
+    assert draft["ttft_seconds"]["p50"] < draft["latency_seconds"]["p95"]
+    assert draft["tokens_per_second"]["mean"] > 0
+
+
+def test_cache_hits_and_errors_are_counted(sample_protocol, sample_user_request):
+    """Test cache hits and failed calls show up as counters."""
+    import pytest
+    from agents import DraftAgent
+    from cache import ResponseCache
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    agent = DraftAgent(FakeChatModel(response="ok"), sample_protocol, ResponseCache())
+    agent.metrics = registry
+    agent.generate(sample_user_request)
+    agent.generate(sample_user_request)
+
+    def fail(prompt):
+        raise RuntimeError("down")
+
+    agent.cache = None
+    agent.llm = FakeChatModel(response=fail)
+    with pytest.raises(RuntimeError):
+        agent.generate(sample_user_request)
+
+    counters = registry.snapshot()["draft"]["counters"]
+    assert counters == {"calls": 1, "cache_hits": 1, "errors": 1}
+
+
+def test_exports():
+    """Test JSON and Prometheus text exports."""
+    from metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    registry.record("critique", latency_seconds=2.0, completion_tokens=100)
+    registry.increment("critique", "calls")
+
+    assert json.loads(registry.to_json())["critique"]["latency_seconds"]["count"] == 1
+
+    text = registry.to_prometheus()
+    assert "# TYPE sapg_latency_seconds summary" in text
+    assert 'sapg_latency_seconds{phase="critique",quantile="0.95"} 2.0' in text
+    assert 'sapg_completion_tokens_count{phase="critique"} 1' in text
+    assert 'sapg_calls_total{phase="critique"} 1' in text
@@ -0,0 +1,164 @@
+"""
+Tests for the overlapped SAP pipeline
+"""
+
+import time
+
+
+def test_split_sections_numbered_steps():
+    """Test that a stream is split before each numbered step."""
+    from pipeline import split_sections
+
+    text = "1. Create the login form with fields\n2. Hash passwords with bcrypt first\n"
+    chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+
+    sections = list(split_sections(chunks, min_chars=10))
+    assert sections == ["1. Create the login form with fields",
+                        "2. Hash passwords with bcrypt first"]
+
+
+def test_split_sections_merges_short_sections():
+    """Test that short headers are merged into the following section."""
+    from pipeline import split_sections
+
+    text = "Plan:\n\nFirst paragraph that is long enough.\n\nSecond one, also long enough."
+    sections = list(split_sections([text], min_chars=20))
+
+    assert sections == ["Plan:\nFirst paragraph that is long enough.",
+                        "Second one, also long enough."]
+
+
+def test_split_sections_empty_stream():
+    """Test that an empty stream yields nothing."""
+    from pipeline import split_sections
+
+    assert list(split_sections([])) == []
+
+
+def test_pipelined_execute_returns_all_phases(make_orchestrator, sample_user_request):
+    """Test the pipelined orchestrator returns every phase output."""
+    draft = ("1. Build the login form page with inputs\n\n"
+             "2. Add password hashing to the signup flow")
+    orchestrator = make_orchestrator(draft=draft, critique="No rate limit", revision="Fixed step")
+
+    results = orchestrator.execute(sample_user_request, pipelined=True)
+
+    assert results["draft"] == draft
+    assert results["critique"] == "No rate limit\n\nNo rate limit"
+    assert results["revision"] == "Fixed step\n\nFixed step"
+
+
+def test_pipelined_execute_honours_early_exit(make_orchestrator, sample_user_request):
+    """Test early_exit skips the revision of sections with no blocking issues."""
+    draft = ("1. Build the login form page with inputs\n\n"
+             "2. Add password hashing to the signup flow")
+    revisions = []
+    orchestrator = make_orchestrator(
+        draft=draft, critique='```json\n{"issues": []}\n```',
+        revision=lambda prompt: revisions.append(prompt) or "Fixed", early_exit=True)
+
+    results = orchestrator.execute(sample_user_request, pipelined=True)
+
+    assert results["revision"] == ("1. Build the login form page with inputs\n\n"
+                                   "2. Add password hashing to the signup flow")
+    assert results["revision_skipped"]
+    assert revisions == []
+
+
+def test_pipelined_execute_resumes_from_partial(make_orchestrator, sample_user_request):
+    """Test a resume keeps the finished phases instead of drafting again."""
+    calls = []
+    orchestrator = make_orchestrator(draft=lambda prompt: calls.append(prompt) or "new",
+                                     critique=lambda prompt: calls.append(prompt) or "new",
+                                     revision="Fixed")
+
+    results = orchestrator.execute(sample_user_request, pipelined=True,
+                                   partial={"draft": "old draft", "critique": "old critique"})
+
+    assert (results["draft"], results["critique"]) == ("old draft", "old critique")
+    assert results["revision"] == "Fixed"
+    assert calls == []
+
+
+def test_pipelined_overlaps_phases(make_orchestrator, sample_user_request):
+    """Test that pipelined mode beats the sequential path on a slow LLM."""
+    draft = "\n\n".join(f"{i}. STEP " + "word " * 10 for i in range(1, 5))
+    latency = 0.004
+
+    def per_step(word):
+        # output grows with the number of draft steps in the prompt
+        return lambda prompt: (word + " ") * 12 * prompt.count("STEP")
+
+    orchestrator = make_orchestrator(draft=draft, critique=per_step("issue"),
+                                     revision=per_step("fixed"), token_latency=latency)
+
+    start = time.perf_counter()
+    orchestrator.execute(sample_user_request)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    orchestrator.execute(sample_user_request, pipelined=True)
+    pipelined = time.perf_counter() - start
+
+    assert pipelined < sequential
+
+
+# every phase answers with the same five tokens
+FIVE_TOKENS = dict.fromkeys(("draft", "critique", "revision"), "one two three four five")
+
+
+def test_async_execute_returns_all_phases(make_orchestrator, sample_user_request):
+    """Test the async orchestrator returns every phase output."""
+    import asyncio
+
+    orchestrator = make_orchestrator(**FIVE_TOKENS)
+    results = asyncio.run(orchestrator.aexecute(sample_user_request))
+
+    assert results["user_request"] == sample_user_request
+    assert results["revision"] == "one two three four five"
+
+
+def test_async_runs_are_concurrent(make_orchestrator):
+    """Test N concurrent audits finish in about the time of one."""
+    import asyncio
+    from pipeline import ProviderLimits
+
+    orchestrator = make_orchestrator(token_latency=0.01, **FIVE_TOKENS)
+    limits = ProviderLimits({"fake-chat": 10})
+
+    start = time.perf_counter()
+    asyncio.run(orchestrator.aexecute("one request", limits))
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = asyncio.run(orchestrator.aexecute_many(
+        [f"request {i}" for i in range(10)], limits))
+    many = time.perf_counter() - start
+
+    assert [r["user_request"] for r in results] == [f"request {i}" for i in range(10)]
+    assert many < single * 3
+
+
+def test_provider_limit_bounds_concurrency(make_orchestrator):
+    """Test the per-provider semaphore caps in-flight calls."""
+    import asyncio
+    from pipeline import ProviderLimits
+
+    orchestrator = make_orchestrator(token_latency=0.01, **FIVE_TOKENS)
+    in_flight = []
+    peak = []
+    original = orchestrator.draft_agent.ainvoke
+
+    async def counting_ainvoke(inputs):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        try:
+            return await original(inputs)
+        finally:
+            in_flight.pop()
+
+    orchestrator.draft_agent.ainvoke = counting_ainvoke
+    asyncio.run(orchestrator.aexecute_many(
+        [f"request {i}" for i in range(6)], ProviderLimits({"fake-chat": 2})))
+
+    assert max(peak) == 2
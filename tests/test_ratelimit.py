@@ -0,0 +1,187 @@
+"""
+Tests for the per provider/model rate limiter and concurrency governor
+"""
+
+import asyncio
+import threading
+import time
+
+
+def governed_llm(governor, **kwargs):
+    """Fake chat model that counts how many calls run at once"""
+    from fake_llm import FakeChatModel
+
+    state = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def respond(prompt):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+        return "ok"
+
+    llm = FakeChatModel(response=respond, rate_limiter=governor, callbacks=[governor], **kwargs)
+    return llm, state
+
+
+def test_token_bucket_refills():
+    """Test the bucket drains, goes into debt and refills at its rate."""
+    from ratelimit import TokenBucket
+
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])
+    bucket.take(90)
+    assert bucket.wait_time(1) == 31.0
+    now[0] = 31.0
+    assert bucket.wait_time(1) == 0.0
+    now[0] = 1000.0
+    bucket.refill()
+    assert bucket.level == 60
+
+
+def test_max_in_flight_across_threads():
+    """Test no more than max_in_flight calls run at once and the rest queue."""
+    from concurrent.futures import ThreadPoolExecutor
+    from ratelimit import Governor
+
+    governor = Governor(max_in_flight=2)
+    llm, state = governed_llm(governor)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda i: llm.invoke(f"call {i}").content, range(6)))
+
+    assert results == ["ok"] * 6
+    assert state["peak"] == 2
+    assert governor.stats()["in_flight"] == 0
+    assert governor.waits.count == 6
+    assert governor.waits.percentile(99) > 0.05
+
+
+def test_max_in_flight_across_tasks():
+    """Test asyncio tasks share the same limit and record their queue wait."""
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+    from ratelimit import Governor
+
+    registry = MetricsRegistry()
+    governor = Governor(max_in_flight=2, name="fake:model", registry=registry)
+    llm = FakeChatModel(response="ok", prefill_latency=0.05,
+                        rate_limiter=governor, callbacks=[governor])
+
+    async def run_all():
+        return await asyncio.gather(*(llm.ainvoke(f"call {i}") for i in range(6)))
+
+    start = time.perf_counter()
+    assert [m.content for m in asyncio.run(run_all())] == ["ok"] * 6
+    assert time.perf_counter() - start >= 0.15  # three waves of two
+    snapshot = registry.snapshot()["fake:model"]
+    assert snapshot["limiter_wait_seconds"]["count"] == 6
+    assert snapshot["counters"]["throttled"] >= 4
+
+
+def test_requests_and_tokens_per_minute():
+    """Test the request and token budgets hold callers back when spent."""
+    from ratelimit import Governor
+
+    governor = Governor(rpm=3)
+    assert all(governor.acquire(blocking=False) for _ in range(3))
+    assert governor.acquire(blocking=False) is False
+
+    governor = Governor(tpm=100)
+    with governor.slot() as usage:
+        usage["tokens"] = 150  # a call that used more than the budget
+    assert governor.acquire(blocking=False) is False
+    assert governor.stats()["queued"] == 0
+
+
+def test_prompt_tokens_reserved_before_the_call():
+    """Test a call waits until the budget covers its prompt, and the estimate is settled after."""
+    from langchain_core.messages import HumanMessage
+    from ratelimit import Governor
+
+    now = [0.0]
+    governor = Governor(tpm=600, clock=lambda: now[0])
+    prompt = [[HumanMessage(content="x" * 2800)]]  # about 700 tokens
+
+    governor.on_chat_model_start({}, prompt, run_id="a")
+    assert governor.acquire(blocking=False)
+    assert governor.tokens.level == -100
+    governor.on_chat_model_start({}, prompt, run_id="b")
+    assert governor.acquire(blocking=False) is False
+
+    governor.on_llm_error(RuntimeError("failed"), run_id="a")  # nothing was used
+    assert governor.tokens.level == 600
+    assert governor.acquire(blocking=False)
+    assert governor.stats()["in_flight"] == 1
+
+    now[0] = 60.0
+    with governor.slot(tokens=500) as usage:
+        usage["tokens"] = 50
+    assert governor.tokens.level == 450  # refilled to 500, minus the 50 used
+
+
+def test_callers_admitted_in_arrival_order():
+    """Test queued callers get their turn first come, first served."""
+    from ratelimit import Governor
+
+    governor = Governor(max_in_flight=1)
+    order = []
+
+    def worker(i):
+        with governor.slot():
+            order.append(i)
+
+    threads = []
+    with governor.slot():
+        for i in range(5):
+            threads.append(threading.Thread(target=worker, args=(i,)))
+            threads[-1].start()
+            time.sleep(0.02)  # make the arrival order certain
+    for thread in threads:
+        thread.join()
+
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_calls_free_only_slots_they_hold():
+    """Test a call that never acquired (a cache hit) leaves other callers' slots alone."""
+    from langchain_core.caches import InMemoryCache
+    from fake_llm import FakeChatModel
+    from ratelimit import Governor
+
+    governor = Governor(max_in_flight=1)
+    llm = FakeChatModel(response="ok", rate_limiter=governor, callbacks=[governor],
+                        cache=InMemoryCache())
+    assert llm.invoke("hi").content == "ok"
+    assert governor.stats()["in_flight"] == 0
+
+    with governor.slot():
+        assert llm.invoke("hi").content == "ok"  # served from the cache
+        assert governor.stats()["in_flight"] == 1
+        assert governor.acquire(blocking=False) is False
+    assert governor.stats()["in_flight"] == 0
+
+
+def test_factory_clients_share_a_governor():
+    """Test pooled clients of one provider/model share its limiter."""
+    from unittest.mock import patch
+    from llm_factory import LLMFactory
+
+    LLMFactory.set_rate_limits("ollama", max_in_flight=1)
+    try:
+        with patch("llm_factory.ChatOllama", side_effect=lambda **kw: kw):
+            cold = LLMFactory.create_llm("ollama", "mistral", temperature=0.0)
+            warm = LLMFactory.create_llm("ollama", "mistral", temperature=0.5)
+            other = LLMFactory.create_llm("ollama", "phi")
+    finally:
+        LLMFactory._limits.clear()
+
+    assert cold["rate_limiter"] is warm["rate_limiter"] is LLMFactory.governor("ollama", "mistral")
+    assert cold["callbacks"] == [cold["rate_limiter"],
+                                 LLMFactory.first_token_tracker("ollama", "mistral")]
+    assert other["rate_limiter"] is not cold["rate_limiter"]
+    assert cold["rate_limiter"].max_in_flight == 1
+    assert set(LLMFactory.limiter_stats()) == {"ollama:mistral", "ollama:phi"}
@@ -0,0 +1,279 @@
+"""
+Tests for retries, backoff and circuit breakers around agent calls
+"""
+
+import asyncio
+
+import pytest
+
+
+class HTTPError(Exception):
+    """Provider error carrying a status code and headers, like the SDKs raise"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def flaky(failures, error=None):
+    """Response function that fails `failures` times, then answers"""
+    calls = {"count": 0}
+
+    def respond(prompt):
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            raise error or HTTPError(503)
+        return "output"
+    return respond, calls
+
+
+def test_is_retryable_and_retry_after():
+    """Test transient errors are recognised and Retry-After is read."""
+    from resilience import is_retryable, retry_after
+
+    assert is_retryable(HTTPError(429))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(HTTPError(400))
+    assert not is_retryable(ValueError("bad prompt"))
+    assert retry_after(HTTPError(429, {"retry-after": "7"})) == 7.0
+    assert retry_after(HTTPError(429)) is None
+
+
+def test_backoff_is_jittered_and_capped():
+    """Test delays stay under the exponential cap and honour Retry-After."""
+    from resilience import RetryPolicy
+
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, seed=1)
+    assert all(0 <= policy.delay(1) <= 1.0 for _ in range(50))
+    assert all(0 <= policy.delay(10) <= 5.0 for _ in range(50))
+    assert policy.delay(1, HTTPError(429, {"retry-after": "3"})) == 3.0
+
+
+def test_agent_retries_transient_errors(sample_protocol, sample_user_request):
+    """Test an agent call succeeds after transient failures and counts retries."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+    from resilience import RetryPolicy
+
+    respond, calls = flaky(2, HTTPError(429, {"retry-after": "0.25"}))
+    waits = []
+    agent = DraftAgent(FakeChatModel(response=respond), sample_protocol)
+    agent.retry = RetryPolicy(max_attempts=3, sleep=waits.append)
+    agent.metrics = MetricsRegistry()
+
+    assert agent.generate(sample_user_request) == "output"
+    assert waits == [0.25, 0.25]
+    assert agent.metrics.snapshot()["draft"]["counters"]["retries"] == 2
+
+    respond, calls = flaky(1)
+    agent.llm = FakeChatModel(response=respond)
+    assert "".join(agent.generate_stream(sample_user_request)) == "output"
+    assert asyncio.run(agent.agenerate("other request")) == "output"
+
+
+def test_non_retryable_errors_fail_fast(sample_protocol):
+    """Test a bad request is raised on the first attempt."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+    from resilience import RetryPolicy
+
+    respond, calls = flaky(5, HTTPError(400))
+    agent = DraftAgent(FakeChatModel(response=respond), sample_protocol)
+    agent.retry = RetryPolicy(sleep=lambda seconds: None)
+
+    with pytest.raises(HTTPError):
+        agent.generate("request")
+    assert calls["count"] == 1
+
+
+def test_batch_retries_only_failed_items(sample_protocol):
+    """Test a wave re-runs just the items that failed transiently."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+    from resilience import RetryPolicy
+
+    attempts = {}
+
+    def respond(prompt):
+        request = prompt.rsplit("TASK:", 1)[1].split()[0]
+        attempts[request] = attempts.get(request, 0) + 1
+        if request == "b" and attempts[request] == 1:
+            raise TimeoutError("slow")
+        return request
+
+    agent = DraftAgent(FakeChatModel(response=respond), sample_protocol)
+    agent.retry = RetryPolicy(sleep=lambda seconds: None)
+
+    assert agent.generate_many(["a", "b", "c"]) == ["a", "b", "c"]
+    assert attempts == {"a": 1, "b": 2, "c": 1}
+
+
+def test_batch_round_counts_once_toward_the_breaker():
+    """Test a round is one success or failure by its failure ratio, not one per item."""
+    from resilience import RetryPolicy
+
+    policy = RetryPolicy(max_attempts=2, failure_threshold=2, sleep=lambda seconds: None)
+    breaker = policy.breaker("fake")
+
+    def one_bad(inputs):
+        # item 0 times out on its first try only
+        first = len(inputs) > 1
+        return [TimeoutError("slow") if item == 0 and first else item for item in inputs]
+
+    assert policy.call_batch(one_bad, list(range(10)), "fake") == list(range(10))
+    assert breaker.failures == 0
+
+    policy.call_batch(lambda inputs: [TimeoutError("slow") for _ in inputs], list(range(10)),
+                      "fake")
+    assert breaker.failures == 2 and breaker.state == "open"
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test the breaker fails fast when open and closes after a good trial call."""
+    from resilience import CircuitBreaker
+
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()  # the single half-open trial
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_open_circuit_stops_calls(sample_protocol):
+    """Test calls to a provider with an open circuit are not made."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+    from resilience import CircuitOpenError, RetryPolicy
+
+    respond, calls = flaky(100)
+    agent = DraftAgent(FakeChatModel(response=respond), sample_protocol)
+    agent.retry = RetryPolicy(max_attempts=2, failure_threshold=2, sleep=lambda seconds: None)
+
+    with pytest.raises(HTTPError):
+        agent.generate("one")
+    with pytest.raises(CircuitOpenError):
+        agent.generate("two")
+    assert calls["count"] == 2
+    assert agent.retry.states() == {"fake-chat": "open"}
+
+
+def test_orchestrator_resumes_from_failed_phase(sample_protocol, sample_user_request):
+    """Test a failed critique keeps the draft and a rerun does not redo it."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+    from resilience import PhaseFailed
+
+    drafts = []
+
+    def draft(prompt):
+        drafts.append(prompt)
+        return "the draft"
+
+    respond, calls = flaky(1, ValueError("critique crashed"))
+    orchestrator = SAPGOrchestrator(
+        DraftAgent(FakeChatModel(response=draft), sample_protocol),
+        CritiqueAgent(FakeChatModel(response=respond), sample_protocol),
+        RevisionAgent(FakeChatModel(response="revised"), sample_protocol))
+
+    with pytest.raises(PhaseFailed) as failure:
+        orchestrator.execute(sample_user_request)
+    assert failure.value.phase == "critique"
+    assert failure.value.results["draft"] == "the draft"
+
+    results = orchestrator.execute(sample_user_request, partial=failure.value.results)
+    assert results["revision"] == "revised"
+    assert len(drafts) == 1
+
+    results = asyncio.run(orchestrator.aexecute(sample_user_request,
+                                                partial={"draft": "the draft"}))
+    assert results["critique"] == "output"
+    assert len(drafts) == 1
+
+
+def test_batch_runner_resumes_partial_results(tmp_path, sample_protocol):
+    """Test a rerun picks a failed request up from its last finished phase."""
+    import json
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent
+    from batch_runner import run_batch
+    from fake_llm import FakeChatModel
+
+    output = tmp_path / "out.jsonl"
+    output.write_text(json.dumps({"id": "1", "error": "timeout", "phase": "critique",
+                                  "partial": {"draft": "saved draft"}}) + "\n")
+    draft = DraftAgent(FakeChatModel(response="new draft"), sample_protocol)
+    llm = FakeChatModel(response="output")
+
+    run_batch([{"id": "1", "request": "r"}], draft, CritiqueAgent(llm, sample_protocol),
+              RevisionAgent(llm, sample_protocol), str(output))
+
+    result = json.loads(output.read_text().splitlines()[-1])
+    assert result["draft"] == "saved draft"
+    assert set(result["timings"]) == {"critique", "revision"}
+
+
+def test_pipelined_failure_keeps_finished_phases(sample_protocol, sample_user_request):
+    """Test a pipelined run that fails raises PhaseFailed with the draft and critique."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+    from resilience import PhaseFailed
+
+    draft = "1. Validate the input schema before loading.\n2. Retry failed batches later."
+    orchestrator = SAPGOrchestrator(
+        DraftAgent(FakeChatModel(response=draft), sample_protocol),
+        CritiqueAgent(FakeChatModel(response="no retries"), sample_protocol),
+        RevisionAgent(FakeChatModel(response="x", failure_rate=1.0), sample_protocol))
+
+    with pytest.raises(PhaseFailed) as failure:
+        orchestrator.execute(sample_user_request, pipelined=True)
+    assert failure.value.phase == "revision"
+    assert failure.value.results["draft"] == draft
+    assert failure.value.results["critique"] == "no retries\n\nno retries"
+
+    orchestrator.critique_agent.llm = FakeChatModel(response="x", failure_rate=1.0)
+    with pytest.raises(PhaseFailed) as failure:
+        orchestrator.execute(sample_user_request, pipelined=True)
+    assert failure.value.phase == "critique"
+    assert failure.value.results == {"user_request": sample_user_request, "draft": draft}
+
+
+def test_iterative_failure_keeps_rounds_and_resumes(sample_protocol):
+    """Test a failed revision round keeps earlier rounds, and a rerun continues from them."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+    from resilience import PhaseFailed
+
+    blocking = '```json\n{"issues": [{"severity": "major", "issue": "no retries"}]}\n```'
+    revisions = []
+
+    def revise(prompt):
+        revisions.append(prompt)
+        if len(revisions) == 2:
+            raise ValueError("revision crashed")
+        return f"version {len(revisions)}"
+
+    orchestrator = SAPGOrchestrator(
+        DraftAgent(FakeChatModel(response="the draft"), sample_protocol),
+        CritiqueAgent(FakeChatModel(response=blocking), sample_protocol),
+        RevisionAgent(FakeChatModel(response=revise), sample_protocol))
+
+    with pytest.raises(PhaseFailed) as failure:
+        orchestrator.execute("request", max_rounds=3)
+    kept = failure.value.results
+    assert failure.value.phase == "revision"
+    assert (kept["draft"], kept["critique"], kept["revision"]) == (
+        "the draft", blocking, "version 1")
+    assert len(kept["rounds"]) == 1
+
+    results = orchestrator.execute("request", max_rounds=3, partial=kept)
+    assert [done["revision"] for done in results["rounds"]] == [
+        "version 1", "version 3", "version 4"]
+    assert len(revisions) == 4
@@ -0,0 +1,152 @@
+"""
+Tests for provider failover and hedged requests
+"""
+
+import time
+
+import pytest
+
+
+def fake(response, **kwargs):
+    from fake_llm import FakeChatModel
+
+    return FakeChatModel(response=response, **kwargs)
+
+
+def test_fails_over_to_next_provider():
+    """Test an erroring provider is skipped and counted as a failure."""
+    from router import RoutedChatModel
+
+    routed = RoutedChatModel(providers=[("ollama", fake("local", failure_rate=1.0)),
+                                        ("openai", fake("hosted"))])
+
+    assert routed.invoke("hi").content == "hosted"
+    health = routed.health.snapshot()
+    assert health["ollama"]["failed"] == 1
+    assert health["openai"]["ok"] == 1
+
+
+def test_stalled_provider_times_out():
+    """Test a provider with no first token inside its timeout is abandoned."""
+    from router import RoutedChatModel
+
+    routed = RoutedChatModel(providers=[("ollama", fake("local", prefill_latency=2.0)),
+                                        ("openai", fake("hosted"))],
+                             timeouts={"ollama": 0.05})
+
+    start = time.perf_counter()
+    assert "".join(chunk.content for chunk in routed.stream("hi")) == "hosted"
+    assert time.perf_counter() - start < 0.5
+
+
+class StallingModel:
+    """Streams its first tokens, then goes quiet"""
+
+    def __init__(self, tokens, stall):
+        self.tokens, self.stall = tokens, stall
+
+    def stream(self, messages, stop=None, **kwargs):
+        from langchain_core.messages import AIMessageChunk
+
+        for token in self.tokens:
+            yield AIMessageChunk(content=token)
+        time.sleep(self.stall)
+        yield AIMessageChunk(content=" never sent")
+
+
+def test_stall_mid_answer_hands_over_to_next_provider():
+    """Test a winner that stops sending tokens is dropped and the next one continues."""
+    from router import RoutedChatModel
+
+    prompts = []
+    routed = RoutedChatModel(
+        providers=[("ollama", StallingModel(["Step 1.", " Step 2."], stall=2.0)),
+                   ("openai", fake(lambda prompt: prompts.append(prompt) or " Step 3."))],
+        chunk_timeout=0.05)
+
+    start = time.perf_counter()
+    assert "".join(chunk.content for chunk in routed.stream("plan")) == (
+        "Step 1. Step 2. Step 3.")
+    assert time.perf_counter() - start < 0.5
+    assert prompts == ["plan\nStep 1. Step 2."]
+    assert routed.health.snapshot()["ollama"]["failed"] == 1
+
+
+def test_hedged_request_beats_slow_primary():
+    """Test hedging starts the backup early and keeps the first answer."""
+    from router import RoutedChatModel
+
+    routed = RoutedChatModel(providers=[("ollama", fake("local", prefill_latency=0.5)),
+                                        ("openai", fake("hosted"))],
+                             hedge=True, hedge_after=0.05)
+
+    start = time.perf_counter()
+    assert routed.invoke("hi").content == "hosted"
+    assert time.perf_counter() - start < 0.3
+    assert routed.health.snapshot()["ollama"]["hedged"] == 1
+
+
+def test_hedge_delay_learned_from_p95():
+    """Test the hedge delay is the provider's p95 time to first token."""
+    from router import ProviderHealth, RoutedChatModel
+
+    health = ProviderHealth(min_samples=3)
+    routed = RoutedChatModel(providers=[("ollama", fake("local"))], hedge=True, health=health)
+    assert routed.hedge_delay("ollama") is None
+    for ttft in (0.1, 0.2, 0.3):
+        health.record_success("ollama", ttft)
+
+    assert routed.hedge_delay("ollama") == 0.3
+
+
+def test_unhealthy_provider_tried_last():
+    """Test a provider failing repeatedly is benched behind the others."""
+    from router import ProviderHealth
+
+    health = ProviderHealth(failure_threshold=2, cooldown=60)
+    health.record_failure("ollama")
+    assert health.order(["ollama", "openai"]) == ["ollama", "openai"]
+    health.record_failure("ollama")
+    assert health.order(["ollama", "openai"]) == ["openai", "ollama"]
+    health.record_success("ollama", 0.1)
+    assert health.order(["ollama", "openai"]) == ["ollama", "openai"]
+
+
+def test_all_providers_failed():
+    """Test the error names every provider when none can answer."""
+    from router import AllProvidersFailed, RoutedChatModel
+
+    routed = RoutedChatModel(providers=[("ollama", fake("a", failure_rate=1.0)),
+                                        ("openai", fake("b", failure_rate=1.0))])
+
+    with pytest.raises(AllProvidersFailed) as error:
+        routed.invoke("hi")
+    assert set(error.value.errors) == {"ollama", "openai"}
+
+
+def test_routed_llm_in_agent_chain(sample_protocol, sample_user_request):
+    """Test agents stream and batch through the router like any chat model."""
+    from agents import DraftAgent
+    from router import RoutedChatModel
+
+    routed = RoutedChatModel(providers=[("ollama", fake("down", failure_rate=1.0)),
+                                        ("openai", fake("Step 1: plan."))])
+    agent = DraftAgent(routed, sample_protocol)
+
+    assert "".join(agent.generate_stream(sample_user_request)) == "Step 1: plan."
+    assert agent.generate_many(["a", "b"]) == ["Step 1: plan.", "Step 1: plan."]
+
+
+def test_create_routed_skips_unavailable_providers(monkeypatch):
+    """Test the factory routes over the providers it can build, pooled."""
+    from unittest.mock import patch
+    from llm_factory import LLMFactory
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    with patch("llm_factory.ChatOllama", side_effect=lambda **kw: fake(kw["model"])):
+        routed = LLMFactory.create_routed(models={"ollama": "mistral"}, hedge=True)
+
+        assert [name for name, _ in routed.providers] == ["ollama"]
+        assert routed.timeout("ollama") == 120.0
+        assert LLMFactory.create_routed(models={"ollama": "mistral"}, hedge=True) is routed
@@ -0,0 +1,75 @@
+"""
+Tests for per-phase model routing and the cost report
+"""
+
+import json
+
+import pytest
+
+
+def test_max_tokens_uses_each_providers_setting():
+    """Test max_tokens becomes num_predict for Ollama and max_tokens elsewhere."""
+    from routing import PhaseModel
+
+    assert PhaseModel("ollama", "phi", 0.2, 500).settings() == {
+        "temperature": 0.2, "num_predict": 500}
+    assert PhaseModel("openai", "gpt-4", max_tokens=800).settings() == {"max_tokens": 800}
+    assert PhaseModel("anthropic").settings() == {}
+
+
+def test_load_routes_from_json_and_file(tmp_path):
+    """Test routes load from a JSON string or file and reject unknown phases."""
+    from routing import PhaseModel, complete_routes, load_routes
+
+    config = {"critique": {"provider": "ollama", "model": "phi", "max_tokens": 600}}
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(config))
+
+    assert load_routes(json.dumps(config)) == load_routes(str(path))
+    routes = complete_routes(load_routes(config), PhaseModel("ollama", "mistral"))
+    assert routes["critique"] == PhaseModel("ollama", "phi", max_tokens=600)
+    assert routes["draft"] == routes["revision"] == PhaseModel("ollama", "mistral")
+    with pytest.raises(ValueError, match="review"):
+        load_routes({"review": {"provider": "ollama"}})
+
+
+def test_factory_creates_and_pools_one_llm_per_route():
+    """Test each phase gets its own pooled client with its model and limits."""
+    from unittest.mock import patch
+    from llm_factory import LLMFactory
+    from routing import PhaseModel
+
+    routes = {"draft": PhaseModel("ollama", "mistral"),
+              "critique": PhaseModel("ollama", "phi", temperature=0.0, max_tokens=400),
+              "revision": PhaseModel("ollama", "mistral")}
+    with patch("llm_factory.ChatOllama", side_effect=lambda **kw: kw):
+        llms = LLMFactory.create_phase_llms(routes, {"ollama": {"num_ctx": 2048}})
+
+    assert llms["draft"] is llms["revision"]
+    assert llms["critique"]["model"] == "phi"
+    assert llms["critique"]["num_predict"] == 400
+    assert llms["critique"]["temperature"] == 0.0
+    assert llms["draft"]["num_ctx"] == llms["critique"]["num_ctx"] == 2048
+    assert LLMFactory.pool_size() == 2
+
+
+def test_cost_report_prices_each_phase_and_its_baseline():
+    """Test the report prices phase tokens on the routed and the baseline model."""
+    from metrics import MetricsRegistry
+    from routing import PhaseModel, cost_report
+
+    registry = MetricsRegistry()
+    for phase in ("critique", "revision"):
+        registry.record(phase, latency_seconds=1.0, prompt_tokens=1000, completion_tokens=500)
+        registry.increment(phase, "calls")
+    routes = {"critique": PhaseModel("openai", "gpt-3.5-turbo"),
+              "revision": PhaseModel("openai", "gpt-4"),
+              "draft": PhaseModel("ollama", "mistral")}
+
+    rows = {row["phase"]: row for row in cost_report(registry, routes, routes["revision"])}
+
+    assert set(rows) == {"critique", "revision"}
+    assert rows["critique"]["cost"] == pytest.approx((1000 * 0.5 + 500 * 1.5) / 1e6)
+    assert rows["critique"]["baseline_cost"] == pytest.approx((1000 * 30 + 500 * 60) / 1e6)
+    assert rows["revision"]["cost"] == rows["revision"]["baseline_cost"]
+    assert cost_report(registry, {"critique": PhaseModel("openai", "unknown")})[0]["cost"] is None
@@ -0,0 +1,130 @@
+"""
+Tests for the near-duplicate draft cache
+"""
+
+import numpy as np
+import pytest
+
+AUTH = "Build a secure auth system with rate limiting"
+AUTH_REWORDED = "Create a secure authentication system with rate limits"
+ETL = "Design a data pipeline for ETL from postgres"
+
+
+def test_reworded_request_scores_above_threshold():
+    """Test the hashed n-gram embedding matches rewordings, not other tasks."""
+    from semantic_cache import HashingEmbedder
+
+    embed = HashingEmbedder()
+
+    assert np.isclose(np.linalg.norm(embed(AUTH)), 1.0)
+    assert float(embed(AUTH) @ embed(AUTH_REWORDED)) >= 0.95
+    assert float(embed(AUTH) @ embed(ETL)) < 0.5
+
+
+def test_get_respects_threshold_and_scope():
+    """Test lookups only return close matches stored under the same scope."""
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache()
+    cache.set(AUTH, "auth draft", scope="ollama")
+
+    match = cache.get(AUTH_REWORDED, scope="ollama")
+    assert match["value"] == "auth draft"
+    assert match["text"] == AUTH
+    assert cache.get(AUTH_REWORDED, scope="openai") is None
+    assert cache.get(ETL, scope="ollama") is None
+    assert cache.get(AUTH + " and audit logs", scope="ollama") is None
+    assert cache.get(AUTH + " and audit logs", scope="ollama", threshold=0.8) is not None
+    assert cache.stats()["hits"] == 2
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Write a Python script that scrapes a website and stores the data",
+     "Write a Go script that scrapes a website and stores the data"),
+    ("Create an ETL pipeline with error handling", "Create an ETL pipeline without error handling"),
+    ("Build a login form in golang", "Build a login form in Rust"),
+])
+def test_near_misses_on_key_terms_never_match(stored, asked):
+    """Test another language or a negated requirement misses, however alike the wording."""
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache()
+    cache.set(stored, "draft")
+
+    assert cache.get(asked) is None
+    assert cache.get(asked, threshold=0.5) is None
+    assert cache.get(stored)["value"] == "draft"
+
+
+def test_search_returns_best_first():
+    """Test top-k search orders stored texts by similarity."""
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache()
+    for text in (ETL, AUTH, "Write a REST API for a todo app"):
+        cache.set(text, text.upper())
+
+    matches = cache.search(AUTH_REWORDED, k=2)
+
+    assert [match["text"] for match in matches][0] == AUTH
+    assert len(matches) == 2
+    assert matches[0]["score"] >= matches[1]["score"]
+
+
+def test_capacity_evicts_least_recently_used():
+    """Test a full index overwrites the entry used longest ago."""
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache(capacity=2)
+    cache.set(AUTH, "auth")
+    cache.set(ETL, "etl")
+    assert cache.get(AUTH)["value"] == "auth"
+    cache.set("Write a REST API for a todo app", "api")
+
+    assert len(cache) == 2
+    assert cache.get(ETL) is None
+    assert cache.get(AUTH_REWORDED)["value"] == "auth"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicted_scopes_are_forgotten():
+    """Test scope names go away with their last entry, and lookups never add one."""
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache(capacity=3)
+    for i in range(100):
+        cache.set(AUTH, "auth", scope=f"model-{i}")
+        assert cache.get(ETL, scope=f"unknown-{i}") is None
+
+    assert len(cache._scope_ids) == 3
+    assert cache.get(AUTH_REWORDED, scope="model-99")["value"] == "auth"
+    assert cache.get(AUTH, scope="model-0") is None
+
+
+def test_draft_agent_reuses_similar_draft(sample_protocol):
+    """Test a reworded request skips the llm, and another protocol does not."""
+    from agents import DraftAgent
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+    from semantic_cache import SemanticCache
+
+    prompts = []
+
+    def respond(prompt):
+        prompts.append(prompt)
+        return "1. Hash passwords\n2. Add a token bucket"
+
+    cache = SemanticCache()
+    agent = DraftAgent(FakeChatModel(response=respond), sample_protocol)
+    agent.semantic_cache = cache
+    agent.metrics = MetricsRegistry()
+
+    first = agent.generate(AUTH)
+    assert "".join(agent.generate_stream(AUTH_REWORDED)) == first
+    assert len(prompts) == 1
+    assert agent.metrics.snapshot()["draft"]["counters"]["semantic_hits"] == 1
+
+    other = DraftAgent(FakeChatModel(response=respond), sample_protocol + "\n- Be brief")
+    other.semantic_cache = cache
+    other.generate(AUTH_REWORDED)
+    assert len(prompts) == 2
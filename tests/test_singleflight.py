@@ -0,0 +1,191 @@
+"""
+Tests for coalescing identical in-flight LLM calls
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def counting_llm(calls, phase, response, latency=0.2):
+    """Fake model that counts its calls under the given phase name."""
+    from fake_llm import FakeChatModel
+
+    def respond(prompt):
+        calls[phase] += 1
+        return response
+
+    return FakeChatModel(response=respond, prefill_latency=latency, token_latency=0.001)
+
+
+def make_session_factory(protocol, flights):
+    """Build orchestrators the way each UI session does: own agents, shared llms."""
+    from agents import DraftAgent, CritiqueAgent, RevisionAgent, SAPGOrchestrator
+
+    calls = Counter()
+    llms = (counting_llm(calls, "draft", "step one\nstep two"),
+            counting_llm(calls, "critique", "major: no rollback"),
+            counting_llm(calls, "revision", "step one\nstep two\nrollback"))
+
+    def session():
+        agents = (DraftAgent(llms[0], protocol), CritiqueAgent(llms[1], protocol),
+                  RevisionAgent(llms[2], protocol))
+        for agent in agents:
+            agent.flights = flights
+        return SAPGOrchestrator(*agents)
+
+    return session, calls
+
+
+def test_concurrent_identical_audits_run_each_phase_once(sample_protocol):
+    """Test N simultaneous identical requests make one llm call per phase."""
+    from jobs import audit_job
+    from metrics import MetricsRegistry
+    from singleflight import SingleFlight
+
+    flights = SingleFlight()
+    session, calls = make_session_factory(sample_protocol, flights)
+    registry = MetricsRegistry()
+    barrier = threading.Barrier(8)
+
+    def run(index):
+        orchestrator = session()
+        for agent in (orchestrator.draft_agent, orchestrator.critique_agent):
+            agent.metrics = registry
+        barrier.wait()
+        if index % 2:
+            return orchestrator.execute("deploy the service")
+
+        class Job:
+            user_request = "deploy the service"
+            cancelled = False
+            start_phase = put = append = lambda *args: None
+        return audit_job(orchestrator)(Job())
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, range(8)))
+
+    assert calls == {"draft": 1, "critique": 1, "revision": 1}
+    assert {result["revision"] for result in results} == {"step one\nstep two\nrollback"}
+    assert registry.snapshot()["draft"]["counters"]["coalesced"] == 7
+    assert flights.stats() == {"leaders": 3, "followers": 21, "in_flight": 0}
+
+
+def test_subscribers_share_the_same_tokens():
+    """Test a late subscriber replays earlier chunks, then follows live."""
+    from singleflight import SingleFlight
+
+    flights = SingleFlight()
+    gate = threading.Event()
+    starts = []
+
+    def start():
+        starts.append(1)
+        yield "a"
+        gate.wait(2)
+        yield "b"
+        yield "c"
+
+    first = flights.stream("key", start)
+    assert next(first) == "a"
+    second = flights.stream("key", start)
+    gate.set()
+
+    assert list(first) == ["b", "c"]
+    assert list(second) == ["a", "b", "c"]
+    assert len(starts) == 1
+    assert flights.in_flight() == 0
+
+
+def test_stream_finishes_when_its_starter_stops_reading():
+    """Test other subscribers still get the whole output if the first one leaves."""
+    from singleflight import SingleFlight
+
+    flights = SingleFlight()
+    gate = threading.Event()
+
+    def start():
+        yield "a"
+        gate.wait(2)
+        yield "b"
+
+    first = flights.stream("key", start)
+    next(first)
+    second = flights.stream("key", start)
+    first.close()
+    gate.set()
+
+    assert "".join(second) == "ab"
+
+
+def test_error_is_shared_and_not_remembered():
+    """Test followers get the leader's error and the next call runs again."""
+    import pytest
+    from singleflight import SingleFlight
+
+    flights = SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+
+    def fail():
+        entered.set()
+        release.wait(2)
+        raise RuntimeError("provider error")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.call, "key", fail)
+        entered.wait(2)
+        follower = pool.submit(flights.call, "key", lambda: "unused")
+        while flights.stats()["followers"] == 0:
+            time.sleep(0.001)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="provider error"):
+                future.result()
+
+    assert flights.call("key", lambda: "fresh") == "fresh"
+
+
+def test_async_callers_coalesce(sample_protocol):
+    """Test concurrent ainvoke calls for one prompt share a single llm call."""
+    from agents import DraftAgent
+    from singleflight import SingleFlight
+
+    calls = Counter()
+    agent = DraftAgent(counting_llm(calls, "draft", "the draft", latency=0.05),
+                       sample_protocol)
+    agent.flights = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(*(agent.agenerate("request") for _ in range(5)))
+
+    assert asyncio.run(main()) == ["the draft"] * 5
+    assert calls["draft"] == 1
+
+
+def test_async_streams_coalesce(sample_protocol):
+    """Test concurrent async streams of one prompt share a single llm call."""
+    from agents import DraftAgent
+    from metrics import MetricsRegistry
+    from singleflight import SingleFlight
+
+    calls = Counter()
+    agent = DraftAgent(counting_llm(calls, "draft", "step one\nstep two", latency=0.05),
+                       sample_protocol)
+    agent.flights = SingleFlight()
+    agent.metrics = MetricsRegistry()
+
+    async def read(stream):
+        return [chunk async for chunk in stream]
+
+    async def main():
+        return await asyncio.gather(*(read(agent.agenerate_stream("request"))
+                                      for _ in range(4)))
+
+    streams = asyncio.run(main())
+    assert {"".join(chunks) for chunks in streams} == {"step one\nstep two"}
+    assert all(len(chunks) > 1 for chunks in streams)
+    assert calls["draft"] == 1
+    assert agent.metrics.snapshot()["draft"]["counters"]["coalesced"] == 3
+    assert agent.flights.in_flight() == 0
@@ -0,0 +1,145 @@
+"""
+Tests for speculative drafting with a fast and a configured model
+"""
+
+import asyncio
+import time
+
+
+def make_agent(protocol, slow_latency, **kwargs):
+    from agents import SpeculativeDraftAgent
+    from fake_llm import FakeChatModel
+
+    return SpeculativeDraftAgent(
+        FakeChatModel(response="slow careful draft", prefill_latency=slow_latency),
+        FakeChatModel(response="fast draft"), protocol, **kwargs)
+
+
+def test_slow_draft_wins_within_deadline(sample_protocol):
+    """Test the configured model's draft is used when it beats the deadline."""
+    agent = make_agent(sample_protocol, 0.05, deadline=1.0)
+    tokens = []
+
+    result = agent.race("request", on_fast_token=tokens.append)
+
+    assert result["draft"] == "slow careful draft"
+    assert result["source"] == "slow"
+    assert "".join(tokens) == "fast draft"
+    assert result["fast_seconds"] <= result["slow_seconds"]
+
+
+def test_fast_draft_used_after_deadline(sample_protocol):
+    """Test the fast draft is returned once the deadline passes."""
+    agent = make_agent(sample_protocol, 0.5, deadline=0.05)
+
+    start = time.perf_counter()
+    result = agent.race("request")
+
+    assert result["draft"] == "fast draft"
+    assert result["reason"] == "deadline"
+    assert time.perf_counter() - start < 0.4
+    assert asyncio.run(agent.agenerate("request")) == "fast draft"
+
+
+def test_slow_draft_cached_after_losing(sample_protocol):
+    """Test a slow draft that misses the deadline still fills the cache."""
+    from cache import ResponseCache
+
+    agent = make_agent(sample_protocol, 0.1, deadline=0.0, cache=ResponseCache())
+    assert agent.generate("request") == "fast draft"
+
+    key = agent.cache_key({"user_request": "request"})
+    deadline = time.monotonic() + 5.0
+    while agent.cache.get(key) != "slow careful draft" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    agent.deadline = None
+    start = time.perf_counter()
+    assert agent.generate("request") == "slow careful draft"
+    assert time.perf_counter() - start < 0.1
+
+
+def test_fast_agent_chain_is_reused(sample_protocol):
+    """Test syncing settings to the fast agent before each race keeps its chain."""
+    agent = make_agent(sample_protocol, 0.0, deadline=1.0)
+    agent.prompt_caching = True
+    agent.race("request")
+    chain = agent.fast_agent.chain
+
+    agent.race("another request")
+
+    assert agent.fast_agent.chain is chain
+    assert agent.fast_agent.prompt_caching
+
+
+def test_critique_policy_accepts_clean_fast_draft(sample_protocol):
+    """Test the issue-count policy keeps a fast draft with no blocking issues."""
+    from agents import CritiqueAgent, critique_policy
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+
+    critic = CritiqueAgent(FakeChatModel(response='```json\n{"issues": []}\n```'),
+                           sample_protocol)
+    agent = make_agent(sample_protocol, 0.5, accept_fast=critique_policy(critic))
+    agent.metrics = MetricsRegistry()
+
+    result = agent.race("request")
+
+    assert result["reason"] == "accepted"
+    assert agent.metrics.snapshot()["draft"]["counters"] == {"speculative_fast": 1}
+
+
+def test_create_speculative_pair_is_pooled():
+    """Test the factory hands out the configured and the fast model from the pool."""
+    from unittest.mock import patch
+    from llm_factory import LLMFactory
+
+    with patch("llm_factory.ChatOllama", side_effect=lambda **kw: kw["model"]):
+        llm, fast = LLMFactory.create_speculative_pair("ollama", "llama2")
+        assert (llm, fast) == ("llama2", "phi")
+        assert LLMFactory.create_speculative_pair("ollama", "llama2", "phi") == (llm, fast)
+        assert LLMFactory.pool_size() == 2
+
+
+def test_async_race_records_the_draft_source(sample_protocol):
+    """Test run_sap counts the speculative source and keeps it in the results."""
+    from agents import CritiqueAgent, RevisionAgent
+    from fake_llm import FakeChatModel
+    from metrics import MetricsRegistry
+    from pipeline import run_sap
+
+    agent = make_agent(sample_protocol, 0.5, deadline=0.05)
+    agent.metrics = MetricsRegistry()
+    critic = CritiqueAgent(FakeChatModel(response="looks fine"), sample_protocol)
+    reviser = RevisionAgent(FakeChatModel(response="final"), sample_protocol)
+
+    results = asyncio.run(run_sap(agent, critic, reviser, "request"))
+
+    assert results["draft"] == "fast draft"
+    assert results["draft_source"] == "fast"
+    assert agent.metrics.snapshot()["draft"]["counters"] == {"speculative_fast": 1}
+
+
+def test_fast_draft_is_saved_under_the_fast_model(sample_protocol, tmp_path, monkeypatch):
+    """Test a recorded run credits its draft to the model that actually wrote it."""
+    from agents import CritiqueAgent, RevisionAgent, SAPGOrchestrator
+    from fake_llm import FakeChatModel
+    from history import RunStore
+    from jobs import Job, audit_job, recorded
+
+    agent = make_agent(sample_protocol, 0.5, deadline=0.05)
+    # both fake models describe themselves alike, so label them by identity
+    monkeypatch.setattr("jobs.llm_label",
+                        lambda llm: "fast" if llm is agent.fast_agent.llm else "configured")
+    critic = CritiqueAgent(FakeChatModel(response="looks fine"), sample_protocol)
+    orchestrator = SAPGOrchestrator(agent, critic,
+                                    RevisionAgent(FakeChatModel(response="final"), sample_protocol))
+    store = RunStore(str(tmp_path / "runs.sqlite"))
+
+    result = recorded(audit_job(orchestrator), store, provider="ollama", model="mistral")(
+        Job("job", "request", {}))
+
+    run = store.get(result["run_id"])
+    assert run["results"]["draft_source"] == "fast"
+    assert run["routes"] == {"draft": "fast", "critique": "configured",
+                             "revision": "configured"}
+    store.close()
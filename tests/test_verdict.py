@@ -0,0 +1,141 @@
+"""
+Tests for the structured critique verdict and early exit
+"""
+
+
+CLEAN = """The draft looks solid.
+
+```json
+{"issues": []}
+```"""
+
+MINOR_ONLY = """1. Variable names could be clearer.
+
+```json
+{"issues": [{"severity": "minor", "issue": "naming", "fix": "rename"}]}
+```"""
+
+BLOCKING = """Passwords are stored in plain text.
+
+```json
+{"issues": [{"severity": "Critical", "issue": "plain text passwords", "fix": "hash"},
+            {"severity": "minor", "issue": "naming", "fix": "rename"}]}
+```"""
+
+
+def test_parse_clean_verdict():
+    """Test an empty issue list means no revision is needed."""
+    from verdict import VerdictParser
+
+    verdict = VerdictParser().parse(CLEAN)
+    assert verdict.parsed
+    assert verdict.issues == []
+    assert not verdict.needs_revision()
+
+
+def test_minor_issues_do_not_block():
+    """Test minor issues alone do not trigger a revision."""
+    from verdict import VerdictParser
+
+    assert not VerdictParser().parse(MINOR_ONLY).needs_revision()
+
+
+def test_blocking_issue_needs_revision():
+    """Test severities are normalised and critical issues block."""
+    from verdict import VerdictParser
+
+    verdict = VerdictParser().parse(BLOCKING)
+    assert [i["severity"] for i in verdict.blocking_issues()] == ["critical"]
+    assert verdict.needs_revision()
+
+
+def test_unparseable_verdict_always_revises():
+    """Test a critique without JSON falls back to revising."""
+    from verdict import VerdictParser
+
+    verdict = VerdictParser().parse("1. Missing error handling\n{not json")
+    assert not verdict.parsed
+    assert verdict.needs_revision()
+
+
+def test_bare_json_verdict():
+    """Test a verdict without a code fence is still found."""
+    from verdict import VerdictParser
+
+    verdict = VerdictParser().parse('Fine.\n{"issues": [{"severity": "major", "issue": "x"}]}')
+    assert verdict.needs_revision()
+
+
+def test_execute_skips_revision_when_clean(make_orchestrator, sample_user_request):
+    """Test a clean critique returns the draft without a revision call."""
+    from metrics import MetricsRegistry
+
+    calls = []
+    orchestrator = make_orchestrator(critique=CLEAN, early_exit=True,
+                                     revision=lambda prompt: calls.append(prompt) or "revised")
+    orchestrator.revision_agent.metrics = MetricsRegistry()
+
+    results = orchestrator.execute(sample_user_request)
+
+    assert results["revision"] == "the draft"
+    assert results["revision_skipped"] is True
+    assert calls == []
+    counters = orchestrator.revision_agent.metrics.snapshot()["revision"]["counters"]
+    assert counters == {"early_exit_checks": 1, "skipped": 1}
+
+
+def test_execute_revises_blocking_issues(make_orchestrator, sample_user_request):
+    """Test a blocking critique still runs the revision."""
+    calls = []
+    orchestrator = make_orchestrator(critique=BLOCKING, early_exit=True,
+                                     revision=lambda prompt: calls.append(prompt) or "revised")
+
+    results = orchestrator.execute(sample_user_request)
+
+    assert results["revision"] == "revised"
+    assert "revision_skipped" not in results
+    assert len(calls) == 1
+
+
+def test_early_exit_off_by_default(make_orchestrator, sample_user_request):
+    """Test the revision always runs unless early exit is enabled."""
+    orchestrator = make_orchestrator(critique=CLEAN, revision="revised")
+
+    assert orchestrator.execute(sample_user_request)["revision"] == "revised"
+
+
+def test_async_and_batched_early_exit(make_orchestrator):
+    """Test the async and batched paths skip the revision too."""
+    import asyncio
+
+    calls = []
+    orchestrator = make_orchestrator(critique=CLEAN, early_exit=True,
+                                     revision=lambda prompt: calls.append(prompt) or "revised")
+
+    assert asyncio.run(orchestrator.aexecute("one"))["revision_skipped"] is True
+    results = orchestrator.execute_many(["two", "three"])
+    assert all(r["revision"] == "the draft" for r in results)
+    assert calls == []
+
+
+def test_merge_verdicts_drops_duplicates():
+    """Test near-identical issues from two critics are kept once, at the worse severity."""
+    from verdict import Verdict, merge_verdicts
+
+    merged = merge_verdicts([
+        Verdict([{"severity": "minor", "issue": "No input validation on user id"}]),
+        Verdict([{"severity": "critical", "issue": "no input validation on the user id"},
+                 {"severity": "minor", "issue": "loop never exits"}]),
+    ])
+
+    assert merged.parsed is True
+    assert [issue["severity"] for issue in merged.issues] == ["critical", "minor"]
+
+
+def test_merge_verdicts_unparsed_forces_revision():
+    """Test one unreadable critic makes the merged verdict unparsed."""
+    from verdict import Verdict, merge_verdicts
+
+    merged = merge_verdicts([Verdict([]), Verdict(parsed=False)])
+
+    assert merged.needs_revision() is True
@@ -0,0 +1,145 @@
+"""
+Tests for Ollama warm-up, keep-alive and runtime options against a stub server
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+LOAD_SECONDS = 0.3
+
+
+class StubOllama(ThreadingHTTPServer):
+    """Speaks enough of the Ollama API for ChatOllama and warm_up
+
+    The first request for a model sleeps LOAD_SECONDS to mimic loading it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []
+        self.loaded = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def load(self, model):
+        with self.lock:
+            cold = model not in self.loaded
+            self.loaded.add(model)
+        if cold:
+            time.sleep(LOAD_SECONDS)
+        return int((LOAD_SECONDS if cold else 0.001) * 1e9)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, body))
+        load = self.server.load(body["model"])
+        stamp = "2024-01-01T00:00:00Z"
+        if self.path == "/api/generate":
+            lines = [{"model": body["model"], "created_at": stamp, "response": "",
+                      "done": True, "done_reason": "load", "load_duration": load}]
+        else:
+            lines = [{"model": body["model"], "created_at": stamp, "done": False,
+                      "message": {"role": "assistant", "content": token}}
+                     for token in ("Step", " one")]
+            lines.append({"model": body["model"], "created_at": stamp, "done": True,
+                          "done_reason": "stop", "message": {"role": "assistant", "content": ""},
+                          "load_duration": load, "prompt_eval_duration": 1000000,
+                          "prompt_eval_count": 5, "eval_count": 2, "eval_duration": 1000000})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in lines:
+            self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+@pytest.fixture
+def stub_ollama(monkeypatch):
+    pytest.importorskip("langchain_ollama")
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1,localhost")
+    server = StubOllama()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_warm_up_loads_model_with_keep_alive(stub_ollama):
+    """Test warm_up sends an empty generate request and times the load."""
+    from llm_factory import LLMFactory
+
+    first = LLMFactory.warm_up("mistral", base_url=stub_ollama.url, keep_alive="1h")
+    second = LLMFactory.warm_up("mistral", base_url=stub_ollama.url)
+
+    assert stub_ollama.requests[0] == ("/api/generate", {
+        "model": "mistral", "keep_alive": "1h", "options": {"num_ctx": 4096}})
+    assert first["cold"] and not second["cold"]
+    assert first["load_seconds"] == pytest.approx(LOAD_SECONDS)
+    assert LLMFactory.first_token_tracker("ollama", "mistral").stats()["load_seconds"]["count"] == 2
+
+
+def test_ollama_options_reach_the_server(stub_ollama):
+    """Test keep_alive and num_ctx/num_predict/num_thread are sent with each chat."""
+    from llm_factory import LLMFactory
+
+    llm = LLMFactory.create_llm("ollama", "mistral", base_url=stub_ollama.url,
+                                num_predict=256, num_thread=4)
+    assert llm.invoke("hi").content == "Step one"
+
+    path, body = stub_ollama.requests[-1]
+    assert path == "/api/chat"
+    assert body["keep_alive"] == "30m"
+    assert body["options"]["num_ctx"] == 4096
+    assert body["options"]["num_predict"] == 256
+    assert body["options"]["num_thread"] == 4
+
+
+def test_warm_up_and_client_share_runtime_options(stub_ollama):
+    """Test warm-up loads with the client's options, and None leaves one to Ollama."""
+    from llm_factory import LLMFactory
+
+    settings = {"num_ctx": None, "num_thread": 2}
+    LLMFactory.warm_up("phi", base_url=stub_ollama.url, **settings)
+    llm = LLMFactory.create_llm("ollama", "phi", base_url=stub_ollama.url, **settings)
+    llm.invoke("hi")
+
+    (_, warm), (_, chat) = stub_ollama.requests
+    assert warm["options"] == {"num_thread": 2}
+    assert {name: chat["options"].get(name) for name in ("num_ctx", "num_thread")} == {
+        "num_ctx": None, "num_thread": 2}
+
+
+def test_cold_and_warm_first_tokens_are_recorded(stub_ollama):
+    """Test the first call after a load counts as cold and later ones as warm."""
+    from llm_factory import LLMFactory
+    from metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    LLMFactory.use_metrics(registry)
+    try:
+        llm = LLMFactory.create_llm("ollama", "phi", base_url=stub_ollama.url)
+        "".join(chunk.content for chunk in llm.stream("hi"))
+        llm.invoke("hi again")
+    finally:
+        LLMFactory.use_metrics(None)
+
+    stats = registry.snapshot()["ollama:phi"]
+    assert stats["cold_ttft_seconds"]["count"] == 1
+    assert stats["warm_ttft_seconds"]["count"] == 1
+    assert stats["cold_ttft_seconds"]["mean"] >= LOAD_SECONDS
+    assert stats["warm_ttft_seconds"]["mean"] < LOAD_SECONDS
@@ -0,0 +1,109 @@
+# Critique Verdict - Structured, severity-tagged issue list parsed from a critique
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.output_parsers import BaseOutputParser
+
+SEVERITIES = ("critical", "major", "minor")
+SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITIES)}
+BLOCKING_SEVERITIES = ("critical", "major")
+
+# appended to the critique prompt; braces are doubled for the prompt template
+VERDICT_INSTRUCTIONS = """Finish with a JSON verdict in a ```json block:
+{{"issues": [{{"severity": "critical|major|minor", "issue": "...", "fix": "..."}}]}}
+Use an empty list if the draft has no issues."""
+
+JSON_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+@dataclass
+class Verdict:
+    """Issues found by the critique; parsed=False means no usable JSON was found"""
+
+    issues: List[Dict[str, str]] = field(default_factory=list)
+    parsed: bool = True
+
+    def blocking_issues(self, severities: Sequence[str] = BLOCKING_SEVERITIES) -> List[Dict]:
+        return [issue for issue in self.issues if issue.get("severity") in severities]
+
+    def needs_revision(self, severities: Sequence[str] = BLOCKING_SEVERITIES) -> bool:
+        # an unreadable verdict never skips the revision
+        return not self.parsed or bool(self.blocking_issues(severities))
+
+
+def _load_issues(candidate: str) -> Optional[List[Dict[str, str]]]:
+    try:
+        data = json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+    issues = data.get("issues") if isinstance(data, dict) else None
+    if not isinstance(issues, list):
+        return None
+
+    cleaned = []
+    for issue in issues:
+        if not isinstance(issue, dict):
+            continue
+        severity = str(issue.get("severity", "major")).lower()
+        # unknown severities count as major so they still block
+        issue = dict(issue, severity=severity if severity in SEVERITIES else "major")
+        cleaned.append(issue)
+    return cleaned
+
+
+class VerdictParser(BaseOutputParser[Verdict]):
+    """Parses the last JSON verdict block out of a critique"""
+
+    def parse(self, text: str) -> Verdict:
+        candidates = JSON_BLOCK.findall(text)
+        if not candidates:
+            # fall back to a bare object at the end of the text
+            start = text.rfind('{"issues"')
+            candidates = [text[start:text.rfind("}") + 1]] if start != -1 else []
+
+        for candidate in reversed(candidates):
+            issues = _load_issues(candidate)
+            if issues is not None:
+                return Verdict(issues)
+        return Verdict(parsed=False)
+
+    @property
+    def _type(self) -> str:
+        return "sapg_verdict"
+
+
+def _issue_words(issue: Dict[str, str]) -> frozenset:
+    return frozenset(WORD.findall(str(issue.get("issue", "")).lower()))
+
+
+def merge_verdicts(verdicts: Sequence[Verdict], overlap: float = 0.8) -> Verdict:
+    """Combine several critics' verdicts into one without repeated issues
+
+    Two issues are the same when their words overlap by at least `overlap`
+    (Jaccard); the more severe copy is kept. The result is unparsed if any
+    input was, so an unreadable critic still forces a revision.
+    """
+    merged: List[Dict[str, str]] = []
+    seen: List[frozenset] = []
+    for verdict in verdicts:
+        for issue in verdict.issues:
+            words = _issue_words(issue)
+            for index, other in enumerate(seen):
+                if words == other or (words | other and
+                                      len(words & other) / len(words | other) >= overlap):
+                    if SEVERITY_RANK[issue["severity"]] < SEVERITY_RANK[merged[index]["severity"]]:
+                        merged[index] = issue
+                    break
+            else:
+                merged.append(issue)
+                seen.append(words)
+    return Verdict(merged, parsed=all(verdict.parsed for verdict in verdicts))
+
+
+def render_verdict(verdict: Verdict) -> str:
+    """The verdict as a ```json block that VerdictParser reads back"""
+    return "```json\n" + json.dumps({"issues": verdict.issues}, indent=2) + "\n```"
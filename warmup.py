@@ -0,0 +1,153 @@
+# Model Warm-up - Preloads Ollama models and tracks cold vs warm first tokens
+
+import json
+import os
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import LatencyStats, MetricsRegistry
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+# how long Ollama keeps a model in memory after its last request
+DEFAULT_KEEP_ALIVE = "30m"
+# a load_duration above this means the model was not in memory yet
+COLD_LOAD_SECONDS = 0.25
+
+
+def ollama_url(base_url: Optional[str] = None) -> str:
+    url = base_url or os.getenv("OLLAMA_HOST") or DEFAULT_OLLAMA_URL
+    if "://" not in url:
+        url = "http://" + url
+    return url.rstrip("/")
+
+
+def parse_keep_alive(value):
+    """Ollama takes seconds as a number and durations ("30m") as strings"""
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    return value
+
+
+def warm_up(model: str, base_url: Optional[str] = None,
+            keep_alive: Optional[str] = DEFAULT_KEEP_ALIVE,
+            timeout: float = 300.0, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Load a model into Ollama's memory without generating anything
+
+    A generate request with no prompt only loads the model, so the first
+    real request does not pay for it. Ollama reloads a model whose runner
+    options (num_ctx, num_thread, ...) change, so pass the options the
+    real requests will use. Returns the wall time and Ollama's own
+    load_duration, both in seconds.
+    """
+    payload = {"model": model}
+    if keep_alive is not None:
+        payload["keep_alive"] = parse_keep_alive(keep_alive)
+    options = {name: value for name, value in (options or {}).items() if value is not None}
+    if options:
+        payload["options"] = options
+    request = urllib.request.Request(
+        ollama_url(base_url) + "/api/generate", data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST")
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = json.loads(response.read().decode("utf-8") or "{}")
+    seconds = time.perf_counter() - started
+    load = body.get("load_duration")
+    return {"model": model, "seconds": seconds,
+            "load_seconds": load / 1e9 if load is not None else None,
+            "cold": (load / 1e9 if load is not None else seconds) >= COLD_LOAD_SECONDS}
+
+
+def unload(model: str, base_url: Optional[str] = None, timeout: float = 30.0):
+    """Ask Ollama to drop a model from memory now"""
+    warm_up(model, base_url, keep_alive=0, timeout=timeout)
+
+
+def _generation_info(response) -> Dict[str, Any]:
+    for batch in response.generations:
+        for generation in batch:
+            info = dict(generation.generation_info or {})
+            message = getattr(generation, "message", None)
+            info.update(getattr(message, "response_metadata", None) or {})
+            if info:
+                return info
+    return {}
+
+
+class FirstTokenTracker(BaseCallbackHandler):
+    """Time to first token per model, split into cold and warm starts
+
+    A call is cold when Ollama reports loading the model for it (a
+    load_duration of COLD_LOAD_SECONDS or more). Streamed calls are timed
+    to their first token; others use Ollama's load + prompt-eval time.
+    """
+
+    run_inline = True
+
+    def __init__(self, name: str, registry: Optional[MetricsRegistry] = None):
+        self.name = name
+        self.registry = registry
+        self.cold = LatencyStats(1000)
+        self.warm = LatencyStats(1000)
+        self.loads = LatencyStats(1000)
+        self._started: Dict[Any, float] = {}
+        self._first: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id=None, **kwargs):
+        with self._lock:
+            if run_id in self._started and run_id not in self._first:
+                self._first[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        ended = time.perf_counter()
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            first = self._first.pop(run_id, None)
+        if started is None:
+            return
+        info = _generation_info(response)
+        load = info.get("load_duration")
+        load = load / 1e9 if load is not None else None
+        if first is not None:
+            ttft = first - started
+        elif load is not None and info.get("prompt_eval_duration") is not None:
+            ttft = load + info["prompt_eval_duration"] / 1e9
+        else:
+            ttft = ended - started
+        self.record(ttft, cold=load is not None and load >= COLD_LOAD_SECONDS, load=load)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        with self._lock:
+            self._started.pop(run_id, None)
+            self._first.pop(run_id, None)
+
+    def record(self, ttft: float, cold: bool, load: Optional[float] = None):
+        with self._lock:
+            (self.cold if cold else self.warm).add(ttft)
+            if load is not None:
+                self.loads.add(load)
+        if self.registry is not None:
+            field = "cold_ttft_seconds" if cold else "warm_ttft_seconds"
+            self.registry.record(self.name, **{field: ttft, "load_seconds": load})
+
+    def record_load(self, seconds: float):
+        """A model load outside any call, e.g. from warm_up"""
+        with self._lock:
+            self.loads.add(seconds)
+        if self.registry is not None:
+            self.registry.record(self.name, load_seconds=seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cold_ttft_seconds": self.cold.summary(),
+                    "warm_ttft_seconds": self.warm.summary(),
+                    "load_seconds": self.loads.summary()}